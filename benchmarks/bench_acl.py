@@ -0,0 +1,53 @@
+"""Time to parse ACL strings and diff them against the ACLs to set.
+
+Parses ACL strings as returned by get_access_control, and compares each
+with the ACLs of a node, as set-acl does for every directory. There are
+--distinct different ACL strings, with entries for principals from a pool
+of --principals OIDs. Run from the repository root:
+
+    python benchmarks/bench_acl.py --strings 200000 --distinct 100
+"""
+
+import argparse
+import time
+
+from adls_acl.nodes import Acl
+from adls_acl.processing import acls_differ, parse_acls
+
+
+def _acl_string(i, principals):
+    oids = [f"{(i + j) % principals:08x}-0000-0000-0000-000000000000" for j in range(8)]
+    entries = ["user::rwx", "group::r-x", "mask::rwx", "other::---"]
+    entries += [f"user:{oid}:r-x" for oid in oids[:4]]
+    entries += [f"group:{oid}:rwx" for oid in oids[4:]]
+    entries += [f"default:{x}" for x in entries]
+    return ",".join(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strings", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=100)
+    parser.add_argument("--principals", type=int, default=1000)
+    args = parser.parse_args()
+
+    acl_strings = [
+        _acl_string(i % args.distinct, args.principals) for i in range(args.strings)
+    ]
+    new_acls = set([Acl.from_str(x) for x in _acl_string(0, 8).split(",")])
+
+    start = time.perf_counter()
+    parsed = [parse_acls(acl_string) for acl_string in acl_strings]
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    changed = sum([acls_differ(current, new_acls) for current in parsed])
+    diff_time = time.perf_counter() - start
+
+    n_entries = sum([len(acls) for acls in parsed])
+    print(f"strings: {args.strings}, entries: {n_entries}, changed: {changed}")
+    print(f"parse: {parse_time:.2f} s, diff: {diff_time:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
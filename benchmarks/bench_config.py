@@ -0,0 +1,58 @@
+"""Time to load, validate and build trees from large input files.
+
+Generates input files with 1k, 10k and 100k folders (or --folders), and
+times reading them as set-acl does: config_from_yaml, then
+config_to_trees. Run from the repository root:
+
+    python benchmarks/bench_config.py --folders 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import yaml
+
+from adls_acl.input_parser import config_from_yaml, config_to_trees
+
+
+def _config_str(n_folders, fan_out=10):
+    acls = [
+        {"oid": f"{i:08x}-0000-0000-0000-000000000000", "type": "group", "acl": "r-x"}
+        for i in range(3)
+    ]
+    root = {"name": "container", "acls": acls, "folders": []}
+    queue, count = [root], 0
+    while count < n_folders:
+        parent = queue.pop(0)
+        parent.setdefault("folders", [])
+        for i in range(fan_out):
+            if count == n_folders:
+                break
+            folder = {"name": f"dir{i}", "acls": [dict(x) for x in acls]}
+            parent["folders"].append(folder)
+            queue.append(folder)
+            count += 1
+
+    return yaml.dump({"account": "account", "containers": [root]}, sort_keys=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--folders", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    for n_folders in args.folders:
+        config_str = _config_str(n_folders)
+        start = time.perf_counter()
+        config = config_from_yaml(config_str)
+        loaded = time.perf_counter()
+        config_to_trees(config)
+        built = time.perf_counter()
+        print(
+            f"folders: {n_folders:>7}, load and validate: {loaded - start:.2f} s, "
+            f"build: {built - loaded:.2f} s, total: {built - start:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
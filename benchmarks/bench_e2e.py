@@ -0,0 +1,170 @@
+"""End-to-end time, requests and memory of set-acl and get-acl.
+
+Runs Orchestrator.process_tree (or AsyncOrchestrator.process_tree with
+--engine async) and Orchestrator.read_account against an in-memory account
+(see fake_adls.py), on generated trees with 1k, 10k and 100k folders (or
+--nodes). The root of the container has default ACLs, pushed down to every
+folder, and top-level folders have a recursive ACL. For each size, reports:
+
+ - set-acl on an empty account: every directory created,
+ - set-acl again, nothing changed,
+ - get-acl of the account,
+
+with wall time, requests by type and throttled requests. Peak memory is
+measured in a second run under tracemalloc (skip it with --no-memory), it
+includes the state of the fake account. Run from the repository root:
+
+    python benchmarks/bench_e2e.py --nodes 1000 10000 --concurrency 16 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import time
+import tracemalloc
+from unittest import mock
+
+from fake_adls import FakeAccount
+
+from adls_acl.input_parser import config_to_trees
+from adls_acl.orchestrator import Orchestrator
+from adls_acl.throttle import ThrottleOptions
+
+OIDS = [f"{i:08x}-0000-0000-0000-000000000000" for i in range(4)]
+
+
+def _config(n_nodes, fan_out):
+    acls = [{"oid": OIDS[0], "type": "group", "acl": "r-x"}]
+    root = {
+        "name": "container",
+        "acls": acls
+        + [
+            {"oid": oid, "type": "group", "acl": "r-x", "scope": "default"}
+            for oid in OIDS[:2]
+        ],
+    }
+    queue, count = [root], 1
+    while count < n_nodes:
+        parent = queue.pop(0)
+        parent["folders"] = []
+        for i in range(fan_out):
+            if count == n_nodes:
+                break
+            folder = {"name": f"dir{i}", "acls": [dict(x) for x in acls]}
+            if parent is root:
+                folder["acls"].append(
+                    {"oid": OIDS[3], "type": "user", "acl": "r-x", "recursive": True}
+                )
+            parent["folders"].append(folder)
+            queue.append(folder)
+            count += 1
+
+    return {"account": "account", "containers": [root]}
+
+
+def _set_acl(account, config, args):
+    roots = config_to_trees(config)
+    if args.engine == "async":
+        from adls_acl.aio import AsyncOrchestrator
+
+        with mock.patch(
+            "adls_acl.aio.get_async_service_client", account.async_service_client
+        ):
+            o = AsyncOrchestrator("account", concurrency=args.concurrency)
+
+        async def run_async():
+            async with o:
+                for root in roots:
+                    assert await o.process_tree(root) == {}
+
+        return lambda: asyncio.run(run_async())
+
+    with mock.patch("adls_acl.orchestrator.get_service_client", account.service_client):
+        o = Orchestrator(
+            "account", throttle_options=ThrottleOptions(adaptive=args.adaptive)
+        )
+
+    def run():
+        for root in roots:
+            assert o.process_tree(root, args.concurrency) == {}
+
+    return run
+
+
+def _get_acl(account, config, args):
+    with mock.patch("adls_acl.orchestrator.get_service_client", account.service_client):
+        o = Orchestrator(
+            "account", throttle_options=ThrottleOptions(adaptive=args.adaptive)
+        )
+
+    def run():
+        n_dirs = sum([1 for _ in o.walk_account(concurrency=args.concurrency)])
+        assert n_dirs == account.directories()
+
+    return run
+
+
+PHASES = [
+    ("set-acl, new", _set_acl),
+    ("set-acl, again", _set_acl),
+    ("get-acl", _get_acl),
+]
+
+
+def _run_phases(n_nodes, args, traced):
+    """Runs all phases on a new account, returns (time, requests, throttled,
+    peak memory) of each"""
+    account = FakeAccount(latency=args.latency, max_tps=args.max_tps)
+    config = _config(n_nodes, args.fan_out)
+    results = []
+    for _, phase in PHASES:
+        run = phase(account, config, args)
+        calls, throttled = account.calls.copy(), account.throttled
+        gc.collect()
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        peak = None
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append(
+            (elapsed, account.calls - calls, account.throttled - throttled, peak)
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--max-tps", type=float, default=None)
+    parser.add_argument("--no-adaptive", dest="adaptive", action="store_false")
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    for n_nodes in args.nodes:
+        results = _run_phases(n_nodes, args, traced=False)
+        if args.memory:
+            peaks = [x[3] for x in _run_phases(n_nodes, args, traced=True)]
+        else:
+            peaks = [None] * len(results)
+        print(f"nodes: {n_nodes}, engine: {args.engine}")
+        for (name, _), (elapsed, calls, throttled, _), peak in zip(
+            PHASES, results, peaks
+        ):
+            memory = f", peak: {peak / 2**20:.1f} MiB" if peak is not None else ""
+            print(f"  {name:<15} {elapsed:8.2f} s{memory}, throttled: {throttled}")
+            for op, count in sorted(calls.items()):
+                print(f"    {op:<32} {count:>8}")
+
+
+if __name__ == "__main__":
+    main()
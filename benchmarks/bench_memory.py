@@ -0,0 +1,66 @@
+"""Memory footprint of a tree of nodes, per node.
+
+Builds a tree from a config with default ACLs on the root, pushes the default
+ACLs down to every node (as set-acl does), and reports the memory allocated
+per node. Run from the repository root:
+
+    python benchmarks/bench_memory.py --fan-out 10 --depth 5
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from adls_acl.nodes import (
+    acls_to_pushdown,
+    bfs,
+    container_config_to_tree,
+    pushdown_acls,
+)
+
+OIDS = [f"{i:08x}-0000-0000-0000-000000000000" for i in range(4)]
+
+
+def _folder(name, fan_out, depth):
+    folder = {
+        "name": name,
+        "acls": [{"oid": OIDS[depth % 4], "type": "user", "acl": "r-x"}],
+    }
+    if depth > 0:
+        folder["folders"] = [
+            _folder(f"dir{i}", fan_out, depth - 1) for i in range(fan_out)
+        ]
+    return folder
+
+
+def _config(fan_out, depth):
+    config = _folder("container", fan_out, depth)
+    config["acls"] = [
+        {"oid": oid, "type": "group", "acl": "r-x", "scope": "default"} for oid in OIDS
+    ] + [{"oid": oid, "type": "group", "acl": "r-x"} for oid in OIDS]
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=5)
+    args = parser.parse_args()
+
+    config = _config(args.fan_out, args.depth)
+    gc.collect()
+    tracemalloc.start()
+    root = container_config_to_tree(config)
+    for node in bfs(root):
+        pushdown_acls(node, acls_to_pushdown(node))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_nodes = sum(1 for _ in bfs(root))
+    print(f"nodes: {n_nodes}")
+    print(f"memory: {size / 2**20:.1f} MiB, {size / n_nodes:.0f} B/node")
+
+
+if __name__ == "__main__":
+    main()
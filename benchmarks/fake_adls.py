@@ -0,0 +1,430 @@
+"""In-memory stand-in for an ADLS Gen2 account and its clients.
+
+FakeAccount holds containers and directories (no files) with their ACL
+strings. FakeAccount.service_client and FakeAccount.async_service_client have
+the signatures of get_service_client and get_async_service_client, patch them
+in to run the orchestrators against the fake:
+
+    account = FakeAccount(latency=0.005, max_tps=2000)
+    with mock.patch("adls_acl.orchestrator.get_service_client", account.service_client):
+        Orchestrator("account").process_tree(root)
+    print(account.calls)
+
+Only what adls-acl uses is covered: creating containers and directories,
+get/set access control, get_paths and recursive ACL updates. Semantics follow
+the service where it matters to adls-acl: parent directories are created
+implicitly, new directories inherit default ACLs of their parent, recursive
+updates merge entries and run in batches.
+
+Every request sleeps latency seconds. With max_tps, requests over max_tps in
+a second are throttled, then retried after retry_delay seconds, as the SDK
+would. A throttle passed in with a ThrottledTransport sees every attempt.
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter, namedtuple
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.filedatalake import (
+    AccessControlChangeCounters,
+    AccessControlChangeResult,
+    AccessControlChanges,
+)
+
+# ACL of a new container, and of new directories without default ACLs
+BASE_ACL = "user::rwx,group::r-x,other::---"
+# The service default
+RECURSIVE_BATCH_SIZE = 2000
+
+Item = namedtuple("Item", ["name", "is_directory"])
+
+
+class _Container:
+    def __init__(self):
+        self.acls: Dict[str, str] = {"": BASE_ACL}
+        self.children: Dict[str, List[str]] = {"": []}
+
+    def create(self, path: str) -> bool:
+        """Creates the directory and missing parents. Returns False if it
+        exists."""
+        if path in self.acls:
+            return False
+        parent = path.rpartition("/")[0]
+        self.create(parent)
+        defaults = [x for x in self.acls[parent].split(",") if x.startswith("default:")]
+        if defaults:
+            acl = ",".join([x[len("default:") :] for x in defaults] + defaults)
+        else:
+            acl = BASE_ACL
+        self.acls[path] = acl
+        self.children[path] = []
+        self.children[parent].append(path)
+        return True
+
+    def acl(self, path: str) -> str:
+        if path not in self.acls:
+            raise ResourceNotFoundError(f"The specified path does not exist: {path}")
+        return self.acls[path]
+
+    def walk(self, path: str, recursive: bool) -> Iterator[str]:
+        """Yields paths under the directory, sorted, in depth-first order"""
+        self.acl(path)
+        for child in sorted(self.children[path]):
+            yield child
+            if recursive:
+                yield from self.walk(child, recursive)
+
+
+def _merge_acl(acl: str, update: str) -> str:
+    """Entries of update replace entries of acl with the same scope, type and
+    id, others are added"""
+    entries = {x.rpartition(":")[0]: x for x in acl.split(",")}
+    for entry in update.split(","):
+        entries[entry.rpartition(":")[0]] = entry
+    return ",".join(entries.values())
+
+
+class FakeAccount:
+    def __init__(
+        self,
+        name: str = "account",
+        latency: float = 0.0,
+        max_tps: Optional[float] = None,
+        retry_delay: float = 0.05,
+    ):
+        self.name = name
+        self.latency = latency
+        self.max_tps = max_tps
+        self.retry_delay = retry_delay
+        self.containers: Dict[str, _Container] = {}
+        self.calls = Counter()  # requests by type, retries excluded
+        self.throttled = 0  # throttled attempts
+        self._lock = threading.Lock()
+        self._window = None
+        self._window_count = 0
+
+    def service_client(
+        self,
+        account_name,
+        auth_method="default",
+        credential=None,
+        transport=None,
+        **kwargs,
+    ) -> "FakeServiceClient":
+        return FakeServiceClient(self, getattr(transport, "throttle", None))
+
+    def async_service_client(
+        self, account_name, auth_method="default", **kwargs
+    ) -> "AsyncFakeServiceClient":
+        return AsyncFakeServiceClient(self)
+
+    def container(self, name: str) -> _Container:
+        if name not in self.containers:
+            raise ResourceNotFoundError(
+                f"The specified container does not exist: {name}"
+            )
+        return self.containers[name]
+
+    def directories(self) -> int:
+        return sum([len(x.acls) for x in self.containers.values()])
+
+    def request(self, op: str, throttle=None) -> None:
+        """Waits for the response to a request, retried while throttled"""
+        self._count(op)
+        while True:
+            if throttle is not None:
+                throttle.acquire()
+            start = time.monotonic()
+            if self.latency > 0:
+                time.sleep(self.latency)
+            admitted = self._admit()
+            if throttle is not None:
+                throttle.release(200 if admitted else 429, time.monotonic() - start)
+            if admitted:
+                return
+            time.sleep(self.retry_delay)
+
+    async def request_async(self, op: str) -> None:
+        self._count(op)
+        while True:
+            if self.latency > 0:
+                await asyncio.sleep(self.latency)
+            if self._admit():
+                return
+            await asyncio.sleep(self.retry_delay)
+
+    def _count(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] += 1
+
+    def _admit(self) -> bool:
+        """Checks if the request fits in max_tps of the current second"""
+        if self.max_tps is None:
+            return True
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._window_count = window, 0
+            if self._window_count >= self.max_tps:
+                self.throttled += 1
+                return False
+            self._window_count += 1
+            return True
+
+    # Operations on the state, requests are made by the clients
+
+    def create_container(self, name: str) -> None:
+        with self._lock:
+            if name in self.containers:
+                raise ResourceExistsError(
+                    f"The specified container already exists: {name}"
+                )
+            self.containers[name] = _Container()
+
+    def create_directory(self, container: str, path: str, match_condition) -> None:
+        with self._lock:
+            created = self.container(container).create(path)
+        if not created and match_condition == MatchConditions.IfMissing:
+            raise ResourceExistsError(f"The specified path already exists: {path}")
+
+    def get_acl(self, container: str, path: str) -> Dict[str, str]:
+        with self._lock:
+            return {"acl": self.container(container).acl(path)}
+
+    def set_acl(self, container: str, path: str, acl: str) -> None:
+        with self._lock:
+            self.container(container).acl(path)
+            self.container(container).acls[path] = acl
+
+    def list_paths(
+        self, container: str, path: Optional[str], recursive: bool
+    ) -> List[Item]:
+        with self._lock:
+            return [
+                Item(x, True)
+                for x in self.container(container).walk(path or "", recursive)
+            ]
+
+    def update_batch(
+        self, container: str, path: str, acl: str, start: int, batch_size: int
+    ) -> Tuple[int, Optional[str]]:
+        """Merges acl into a batch of directories of the subtree from start,
+        in depth-first order. Returns the size of the batch and the
+        continuation, None when done."""
+        with self._lock:
+            c = self.container(container)
+            paths = [path] + list(c.walk(path, recursive=True))
+            batch = paths[start : start + batch_size]
+            for x in batch:
+                c.acls[x] = _merge_acl(c.acls[x], acl)
+        end = start + len(batch)
+        return len(batch), str(end) if end < len(paths) else None
+
+
+def _changes(
+    count: int, total: int, continuation: Optional[str]
+) -> AccessControlChanges:
+    return AccessControlChanges(
+        batch_counters=AccessControlChangeCounters(count, 0, 0),
+        aggregate_counters=AccessControlChangeCounters(total, 0, 0),
+        batch_failures=[],
+        continuation=continuation,
+    )
+
+
+class FakeServiceClient:
+    def __init__(self, account: FakeAccount, throttle=None):
+        self.account = account
+        self.account_name = account.name
+        self.throttle = throttle
+
+    def _request(self, op: str) -> None:
+        self.account.request(op, self.throttle)
+
+    def list_file_systems(self) -> List[Item]:
+        self._request("list_file_systems")
+        return [Item(name, False) for name in sorted(self.account.containers)]
+
+    def create_file_system(self, name: str) -> None:
+        self._request("create_file_system")
+        self.account.create_container(name)
+
+    def get_file_system_client(self, file_system: str) -> "FakeFileSystemClient":
+        return FakeFileSystemClient(self, file_system)
+
+
+class FakeFileSystemClient:
+    def __init__(self, sc: FakeServiceClient, container: str):
+        self.sc = sc
+        self.container = container
+
+    def exists(self) -> bool:
+        self.sc._request("get_file_system_properties")
+        return self.container in self.sc.account.containers
+
+    def get_paths(
+        self, path: Optional[str] = None, recursive: bool = True
+    ) -> List[Item]:
+        # A single page, whatever the number of paths
+        self.sc._request("get_paths")
+        return self.sc.account.list_paths(self.container, path, recursive)
+
+    def _get_root_directory_client(self) -> "FakeDirectoryClient":
+        return FakeDirectoryClient(self.sc, self.container, "")
+
+    def get_directory_client(self, path: str) -> "FakeDirectoryClient":
+        return FakeDirectoryClient(self.sc, self.container, path)
+
+
+class FakeDirectoryClient:
+    def __init__(self, sc: FakeServiceClient, container: str, path: str):
+        self.sc = sc
+        self.account_name = sc.account_name
+        self.container = container
+        self.path = path
+
+    def exists(self) -> bool:
+        self.sc._request("get_directory_properties")
+        try:
+            self.sc.account.get_acl(self.container, self.path)
+            return True
+        except ResourceNotFoundError:
+            return False
+
+    def create_directory(self, match_condition=None, **kwargs) -> None:
+        self.sc._request("create_directory")
+        self.sc.account.create_directory(self.container, self.path, match_condition)
+
+    def get_access_control(self) -> Dict[str, str]:
+        self.sc._request("get_access_control")
+        return self.sc.account.get_acl(self.container, self.path)
+
+    def set_access_control(self, acl: str) -> None:
+        self.sc._request("set_access_control")
+        self.sc.account.set_acl(self.container, self.path, acl)
+
+    def update_access_control_recursive(
+        self,
+        acl: str,
+        continuation_token: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_batches: Optional[int] = None,
+        progress_hook=None,
+        **kwargs,
+    ) -> AccessControlChangeResult:
+        start = total = int(continuation_token or 0)
+        batches, continuation = 0, None
+        while max_batches is None or batches < max_batches:
+            self.sc._request("update_access_control_recursive")
+            count, continuation = self.sc.account.update_batch(
+                self.container,
+                self.path,
+                acl,
+                total,
+                batch_size or RECURSIVE_BATCH_SIZE,
+            )
+            total += count
+            batches += 1
+            if progress_hook is not None:
+                progress_hook(_changes(count, total - start, continuation))
+            if continuation is None:
+                break
+        return AccessControlChangeResult(
+            counters=AccessControlChangeCounters(total - start, 0, 0),
+            continuation=continuation,
+        )
+
+
+class AsyncFakeServiceClient(FakeServiceClient):
+    """The async counterpart, requests wait on the event loop"""
+
+    def __init__(self, account: FakeAccount):
+        super().__init__(account)
+        self.credential = self
+
+    async def _request(self, op: str) -> None:
+        await self.account.request_async(op)
+
+    async def close(self) -> None:
+        pass
+
+    async def create_file_system(self, name: str) -> None:
+        await self._request("create_file_system")
+        self.account.create_container(name)
+
+    def get_file_system_client(self, file_system: str) -> "AsyncFakeFileSystemClient":
+        return AsyncFakeFileSystemClient(self, file_system)
+
+
+class AsyncFakeFileSystemClient(FakeFileSystemClient):
+    async def exists(self) -> bool:
+        await self.sc._request("get_file_system_properties")
+        return self.container in self.sc.account.containers
+
+    async def get_paths(self, path: Optional[str] = None, recursive: bool = True):
+        await self.sc._request("get_paths")
+        for item in self.sc.account.list_paths(self.container, path, recursive):
+            yield item
+
+    def _get_root_directory_client(self) -> "AsyncFakeDirectoryClient":
+        return AsyncFakeDirectoryClient(self.sc, self.container, "")
+
+    def get_directory_client(self, path: str) -> "AsyncFakeDirectoryClient":
+        return AsyncFakeDirectoryClient(self.sc, self.container, path)
+
+
+class AsyncFakeDirectoryClient(FakeDirectoryClient):
+    async def exists(self) -> bool:
+        await self.sc._request("get_directory_properties")
+        try:
+            self.sc.account.get_acl(self.container, self.path)
+            return True
+        except ResourceNotFoundError:
+            return False
+
+    async def create_directory(self, match_condition=None, **kwargs) -> None:
+        await self.sc._request("create_directory")
+        self.sc.account.create_directory(self.container, self.path, match_condition)
+
+    async def get_access_control(self) -> Dict[str, str]:
+        await self.sc._request("get_access_control")
+        return self.sc.account.get_acl(self.container, self.path)
+
+    async def set_access_control(self, acl: str) -> None:
+        await self.sc._request("set_access_control")
+        self.sc.account.set_acl(self.container, self.path, acl)
+
+    async def update_access_control_recursive(
+        self,
+        acl: str,
+        continuation_token: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_batches: Optional[int] = None,
+        progress_hook=None,
+        **kwargs,
+    ) -> AccessControlChangeResult:
+        start = total = int(continuation_token or 0)
+        batches, continuation = 0, None
+        while max_batches is None or batches < max_batches:
+            await self.sc._request("update_access_control_recursive")
+            count, continuation = self.sc.account.update_batch(
+                self.container,
+                self.path,
+                acl,
+                total,
+                batch_size or RECURSIVE_BATCH_SIZE,
+            )
+            total += count
+            batches += 1
+            if progress_hook is not None:
+                await progress_hook(_changes(count, total - start, continuation))
+            if continuation is None:
+                break
+        return AccessControlChangeResult(
+            counters=AccessControlChangeCounters(total - start, 0, 0),
+            continuation=continuation,
+        )
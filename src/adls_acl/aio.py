@@ -0,0 +1,422 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Dict, List, Optional, Set
+
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.filedatalake import AccessControlChanges
+from azure.storage.filedatalake.aio import DataLakeDirectoryClient
+
+from .auth import get_async_service_client
+from .clients import ClientCache, node_location
+from .executor import run_tree_async
+from .journal import FIRST_PASS, RECURSIVE_PASS
+from .metrics import Metrics
+from .nodes import Acl, Node, acls_to_pushdown, acls_to_str, pushdown_acls
+from .plan import Action, Plan
+from .processing import (
+    acls_to_write,
+    create_request,
+    exists_request,
+    folders_to_list,
+    is_created_in_plan,
+    known_unchanged,
+    listed_directories,
+    log_action,
+    node_action,
+    parse_acls,
+    prefetch_targets,
+    pushdown_unread,
+    record_existing,
+    recursive_acls_to_apply,
+)
+from .recursive import (
+    RecursiveCoverage,
+    RecursiveOptions,
+    RecursivePlan,
+    RecursiveUpdate,
+    plan_recursive,
+)
+from .state import StateCache, StateTracker
+from .tracing import span
+
+log = logging.getLogger(__name__)
+
+
+class AsyncOrchestrator:
+    """Orchestrator running on the asyncio version of the Azure SDK.
+    At most concurrency directories are being processed at a time."""
+
+    def __init__(
+        self,
+        account_name: str,
+        auth_method: str = "default",
+        concurrency: int = 100,
+        dry_run: bool = False,
+        state: Optional[StateCache] = None,
+        assume_no_drift: bool = False,
+        recursive_options: Optional[RecursiveOptions] = None,
+        prefetch: bool = True,
+        lazy_recursive: bool = False,
+        metrics: Optional[Metrics] = None,
+        **auth_kwargs: Any,
+    ):
+        self.sc = get_async_service_client(account_name, auth_method, **auth_kwargs)
+        self.metrics = metrics
+        if metrics is not None:
+            self.sc = metrics.instrument(self.sc, account_name)
+        self.clients = ClientCache(self.sc)
+        self.account_name = account_name
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.dry_run = dry_run
+        self.plan = Plan()
+        self.state = state
+        self.assume_no_drift = assume_no_drift
+        self.recursive_options = recursive_options or RecursiveOptions()
+        self.prefetch = prefetch
+        self.lazy_recursive = lazy_recursive
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self) -> None:
+        await self.sc.close()
+        await self.sc.credential.close()
+
+    async def process_tree(self, root: Node) -> Dict[str, Exception]:
+        """Async counterpart of Orchestrator.process_tree"""
+        with span("process_tree", container=root.name):
+            tracker = None
+            if self.state is not None:
+                tracker = self.state.tracker(self.account_name, root)
+
+            if self.prefetch:
+                with self._measure(root.name, "prefetch"), span("prefetch"):
+                    await self.prefetch_existing(root, tracker)
+
+            # First pass to set non-recursive ACLs and materialzie new nodes
+            # in the account
+            coverage = RecursiveCoverage() if self.lazy_recursive else None
+            process_node = partial(
+                self._process_node, tracker=tracker, coverage=coverage
+            )
+            with self._measure(root.name, FIRST_PASS), span("first_pass"):
+                failures = await run_tree_async(root, process_node)
+
+            # Second pass to set recursive ACLs
+            recursive_plan = plan_recursive(root)
+            self.plan.add_recursive_saved(recursive_plan.saved)
+            prune = set(failures).union(self.plan.actions[Action.skip])
+            if coverage is not None:
+                for path in failures:
+                    coverage.mark(path)
+            process_node_recursive = partial(
+                self._process_node_recursive,
+                recursive_plan=recursive_plan,
+                coverage=coverage,
+            )
+            with self._measure(root.name, RECURSIVE_PASS), span("recursive_pass"):
+                failures.update(
+                    await run_tree_async(root, process_node_recursive, prune=prune)
+                )
+
+            if tracker is not None and not self.dry_run:
+                tracker.commit(failures)
+                self.state.save()
+
+            return failures
+
+    def _measure(self, container: str, name: str):
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.measure_pass(self.account_name, container, name)
+
+    async def prefetch_existing(self, root: Node, tracker: StateTracker = None) -> None:
+        """Async counterpart of Orchestrator.prefetch_existing"""
+        if tracker is not None and tracker.is_unchanged(root):
+            return
+        paths, folders = prefetch_targets(root, tracker)
+        fs_client = self.clients.file_system_client(root.name)
+        top_level = await self._list_existing(fs_client, None, paths, recursive=False)
+        if top_level is None:
+            return  # the container does not exist
+
+        existing = list(top_level)
+        folders = folders_to_list(folders, top_level)
+        for listed in await asyncio.gather(
+            *[self._list_existing(fs_client, folder, paths) for folder in folders]
+        ):
+            existing.extend(listed or [])
+        record_existing(self.clients, root, existing, paths)
+
+    async def _list_existing(
+        self,
+        fs_client: Any,
+        folder: Optional[str],
+        paths: Set[str],
+        recursive: bool = True,
+    ) -> Optional[List[str]]:
+        """Async counterpart of orchestrator._list_existing"""
+        async with self._semaphore:
+            try:
+                listing = fs_client.get_paths(path=folder, recursive=recursive)
+                # Files are dropped as they are listed
+                directories = [path async for path in listing if path.is_directory]
+            except ResourceNotFoundError:
+                return None
+        return listed_directories(directories, paths)
+
+    async def _process_node(
+        self,
+        node: Node,
+        tracker: StateTracker = None,
+        coverage: Optional[RecursiveCoverage] = None,
+    ) -> bool:
+        async with self._semaphore:
+            with span("process_node", path=node.path):
+                start = time.perf_counter()
+                log.debug("Processing %s", node)
+                processor = processor_selector(node)
+                if tracker is not None and await self._is_unchanged(
+                    node, processor, tracker
+                ):
+                    # The whole subtree is skipped
+                    self._done(Action.skip, node, start)
+                    return False
+
+                if not self.dry_run:
+                    with span("create"):
+                        created = await processor.create(node, self.clients)
+                elif is_created_in_plan(self.plan, node):
+                    created = True
+                else:
+                    created = not await processor.exists(node, self.clients)
+
+                if created and self.dry_run:
+                    # Nothing to compare with, all ACLs from the input would be set
+                    pushdown_unread(node, coverage)
+                    self._done(Action.create, node, start)
+                    return True
+
+                with span("get_client"):
+                    dc = processor.get_dir_client(node, self.clients)
+                changed = await processor.set_acls(node, dc, self.dry_run, coverage)
+                self._done(node_action(created, changed), node, start)
+                if tracker is not None:
+                    tracker.applied(node)
+
+                return True
+
+    def _done(self, action: Action, node: Node, start: float) -> None:
+        self.plan.add(action, node)
+        log_action(action, node, start)
+
+    async def _is_unchanged(
+        self, node: Node, processor: "AsyncProcessor", tracker: StateTracker
+    ) -> bool:
+        """Async counterpart of Orchestrator._is_unchanged"""
+        unchanged = known_unchanged(node, tracker, self.assume_no_drift)
+        if unchanged is not None:
+            return unchanged
+
+        dc = processor.get_dir_client(node, self.clients)
+        try:
+            current_acls = await _get_current_acls(dc)
+        except ResourceNotFoundError:
+            return False
+
+        return not tracker.is_drifted(node, current_acls)
+
+    async def _process_node_recursive(
+        self,
+        node: Node,
+        recursive_plan: RecursivePlan,
+        coverage: Optional[RecursiveCoverage] = None,
+    ) -> None:
+        recursive_acls = recursive_acls_to_apply(node, recursive_plan, coverage)
+        if len(recursive_acls) > 0:
+            async with self._semaphore:
+                start = time.perf_counter()
+                if not self.dry_run:
+                    processor = processor_selector(node)
+                    with span("update_recursive", path=node.path):
+                        dc = processor.get_dir_client(node, self.clients)
+                        await processor.update_acls_recursive(
+                            node, dc, recursive_acls, self.recursive_options
+                        )
+                self._done(Action.recursive, node, start)
+
+
+async def _get_current_acls(
+    client: DataLakeDirectoryClient, omit_special: bool = False
+) -> Set[Acl]:
+    """Returns a set of ACLs currently set on the directory."""
+    current_acls_str = (await client.get_access_control())["acl"]
+    return parse_acls(current_acls_str, omit_special)
+
+
+async def _set_acls(client: DataLakeDirectoryClient, acls: Set[Acl]) -> None:
+    """Set ACLs from the set on the node, in a single request"""
+    acl = acls_to_str(acls)
+    log.debug("Setting ACLs: %s", acl)
+    await client.set_access_control(acl=acl)
+
+
+async def _update_access_control_recursive(
+    client: DataLakeDirectoryClient,
+    acls: Set[Acl],
+    options: RecursiveOptions,
+    key: str,
+) -> None:
+    """Async counterpart of orchestrator._update_access_control_recursive"""
+    update = RecursiveUpdate(acls_to_str(acls), options, key)
+
+    async def progress_hook(changes: AccessControlChanges):
+        update.progress(changes)
+
+    while not update.done:
+        change_result = await client.update_access_control_recursive(
+            **update.kwargs(), progress_hook=progress_hook
+        )
+        update.advance(change_result)
+
+
+class AsyncProcessor(ABC):
+    @staticmethod
+    @abstractmethod
+    async def set_acls(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        dry_run: bool = False,
+        coverage: Optional[RecursiveCoverage] = None,
+    ) -> bool:
+        with span("read_acls"):
+            current_acls = await _get_current_acls(client)
+        default_acls = acls_to_pushdown(node)
+        new_acls, changed = acls_to_write(node, current_acls, coverage)
+        if changed and not dry_run:
+            with span("write_acls"):
+                await _set_acls(client, new_acls)
+        with span("pushdown"):
+            pushdown_acls(node, default_acls)
+
+        return changed
+
+    @staticmethod
+    @abstractmethod
+    def get_dir_client() -> DataLakeDirectoryClient: ...
+
+    @staticmethod
+    async def create(node: Node, clients: ClientCache) -> bool:
+        """Async counterpart of Processor.create"""
+        request = create_request(node, clients)
+        if request is None:
+            return False
+
+        try:
+            await request()
+            created = True
+        except ResourceExistsError:
+            created = False
+        clients.mark_existing(*node_location(node))
+
+        return created
+
+    @staticmethod
+    async def exists(node: Node, clients: ClientCache) -> bool:
+        request = exists_request(node, clients)
+        if request is None:
+            return True
+
+        exists = await request()
+        if exists:
+            clients.mark_existing(*node_location(node))
+
+        return exists
+
+    @staticmethod
+    @abstractmethod
+    async def update_acls_recursive(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        recursive_acls: Set[Acl],
+        options: RecursiveOptions,
+    ) -> None:
+        key = f"{client.account_name}/{node.path}"
+        await _update_access_control_recursive(client, recursive_acls, options, key)
+
+
+class AsyncProcessorRoot(AsyncProcessor):
+
+    @staticmethod
+    def get_dir_client(node: Node, clients: ClientCache):
+        """Returns a file client to the root directory of a container."""
+        if node.is_root == False:
+            raise ValueError("Node is not the root!")
+
+        return clients.directory_client(*node_location(node))
+
+    @staticmethod
+    async def set_acls(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        dry_run: bool = False,
+        coverage: Optional[RecursiveCoverage] = None,
+    ):
+        return await super(AsyncProcessorRoot, AsyncProcessorRoot).set_acls(
+            node, client, dry_run, coverage
+        )
+
+    @staticmethod
+    async def update_acls_recursive(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        recursive_acls: Set[Acl],
+        options: RecursiveOptions,
+    ):
+        await super(AsyncProcessorRoot, AsyncProcessorRoot).update_acls_recursive(
+            node, client, recursive_acls, options
+        )
+
+
+class AsyncProcessorDir(AsyncProcessor):
+
+    @staticmethod
+    def get_dir_client(node: Node, clients: ClientCache):
+        """Returns a directory client."""
+        return clients.directory_client(*node_location(node))
+
+    @staticmethod
+    async def set_acls(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        dry_run: bool = False,
+        coverage: Optional[RecursiveCoverage] = None,
+    ):
+        return await super(AsyncProcessorDir, AsyncProcessorDir).set_acls(
+            node, client, dry_run, coverage
+        )
+
+    @staticmethod
+    async def update_acls_recursive(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        recursive_acls: Set[Acl],
+        options: RecursiveOptions,
+    ):
+        await super(AsyncProcessorDir, AsyncProcessorDir).update_acls_recursive(
+            node, client, recursive_acls, options
+        )
+
+
+def processor_selector(node):
+    if node.is_root:
+        return AsyncProcessorRoot()
+    else:
+        return AsyncProcessorDir()
@@ -1,16 +1,21 @@
-from azure.identity import (
-    DefaultAzureCredential,
-    AzureCliCredential,
-    EnvironmentCredential,
-    WorkloadIdentityCredential,
-    ManagedIdentityCredential,
-    AzurePowerShellCredential,
-    AzureDeveloperCliCredential,
-)
-from azure.core.credentials import AccessToken
-from azure.storage.filedatalake import DataLakeServiceClient
 from abc import ABC, abstractmethod
-from typing import Any
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# The Azure SDK takes most of the startup time, it is imported only when a
+# credential or a client is created
+if TYPE_CHECKING:
+    from azure.core.credentials import AccessToken
+    from azure.storage.filedatalake import DataLakeServiceClient
+    from azure.storage.filedatalake import aio as datalake_aio
+
+log = logging.getLogger(__name__)
 
 AUTH_SUPPORTED_OPTIONS = [
     "default",
@@ -22,6 +27,20 @@ AUTH_SUPPORTED_OPTIONS = [
     "azuredevcli",
 ]
 
+# Environment variables selecting the identity of EnvironmentCredential,
+# WorkloadIdentityCredential and ManagedIdentityCredential (also in
+# DefaultAzureCredential). Secrets are left out, they don't change it
+_IDENTITY_VARIABLES = [
+    "AZURE_AUTHORITY_HOST",
+    "AZURE_TENANT_ID",
+    "AZURE_CLIENT_ID",
+    "AZURE_CLIENT_CERTIFICATE_PATH",
+    "AZURE_USERNAME",
+    "AZURE_FEDERATED_TOKEN_FILE",
+]
+# Auth methods using the account logged in with the Azure CLI
+_CLI_METHODS = ["default", "azurecli"]
+
 
 class Credential(ABC):
     @staticmethod
@@ -31,16 +50,231 @@ class Credential(ABC):
 
     @staticmethod
     @abstractmethod
-    def get_token() -> AccessToken:
+    def get_token() -> "AccessToken":
         pass
 
 
+class CachedCredential(Credential):
+    """Wraps a credential. Tokens are cached in memory and, if cache_path is
+    given, in a file shared by runs. Tokens are refreshed by a background
+    thread refresh_margin seconds before they expire, so requests don't wait
+    for a token during long runs. The wrapped credential is only created
+    when a token has to be acquired."""
+
+    # Minimum wait between background refresh attempts, in seconds
+    min_refresh_interval = 30
+    # Tokens closer to their expiry are not returned, in seconds. Until then,
+    # a token due for refresh is returned while the refresh is in progress
+    min_validity = 60
+
+    def __init__(
+        self,
+        credential_factory: Callable[[], Credential],
+        cache_path: Optional[str] = None,
+        cache_key: str = "",
+        refresh_margin: int = 600,
+    ):
+        self._factory = credential_factory
+        self._credential = None
+        self.cache_path = cache_path
+        self.cache_key = cache_key
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[str, "AccessToken"] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        if cache_path is not None:
+            self._tokens.update(self._load())
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> "AccessToken":
+        key = json.dumps([scopes, sorted(kwargs.items())])
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None or token.expires_on - time.time() < self.min_validity:
+                token = self._acquire(self._get_credential(), key)
+                self._store(key, token)
+            if self._refresher is None:
+                self._refresher = threading.Thread(
+                    target=self._refresh_loop, name="token-refresh", daemon=True
+                )
+                self._refresher.start()
+            return token
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        if self._credential is not None:
+            self._credential.close()
+
+    def _get_credential(self) -> Credential:
+        """Returns the wrapped credential, the lock must be held"""
+        if self._credential is None:
+            self._credential = self._factory()
+        return self._credential
+
+    @staticmethod
+    def _acquire(credential: Credential, key: str) -> "AccessToken":
+        """Acquires a token from the wrapped credential, a request"""
+        scopes, kwargs = json.loads(key)
+        return credential.get_token(*scopes, **dict(kwargs))
+
+    def _store(self, key: str, token: "AccessToken") -> None:
+        """Caches the token, the lock must be held"""
+        self._tokens[key] = token
+        if self.cache_path is not None:
+            self._save()
+
+    def _is_expiring(self, token: "AccessToken") -> bool:
+        return token.expires_on - time.time() < self.refresh_margin
+
+    def _refresh_loop(self) -> None:
+        while True:
+            with self._lock:
+                refresh_at = min(
+                    [t.expires_on - self.refresh_margin for t in self._tokens.values()]
+                )
+            wait = max(refresh_at - time.time(), self.min_refresh_interval)
+            if self._stop.wait(wait):
+                return
+            with self._lock:
+                credential = self._get_credential()
+                expiring = [
+                    key
+                    for key, token in self._tokens.items()
+                    if self._is_expiring(token)
+                ]
+            # Tokens are acquired without the lock, get_token doesn't wait for
+            # them while the current ones are still valid
+            for key in expiring:
+                try:
+                    token = self._acquire(credential, key)
+                except Exception as e:
+                    log.warning("Failed to refresh a token: %s", e)
+                    continue
+                with self._lock:
+                    self._store(key, token)
+
+    def _load(self) -> Dict[str, "AccessToken"]:
+        """Returns unexpired tokens of the cache key from the cache file"""
+        from azure.core.credentials import AccessToken
+
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get(self.cache_key, {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring the token cache %s: %s", self.cache_path, e)
+            return {}
+
+        tokens = {}
+        for key, (token, expires_on) in entries.items():
+            if expires_on > time.time():
+                tokens[key] = AccessToken(token, expires_on)
+        return tokens
+
+    def _save(self) -> None:
+        """Writes tokens to the cache file, readable only by the user. Tokens
+        of other cache keys in the file are kept."""
+        data = {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            pass
+        data[self.cache_key] = {
+            key: [token.token, token.expires_on] for key, token in self._tokens.items()
+        }
+
+        tmp_path = f"{self.cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+def get_credential(
+    auth_method: str, token_cache: Optional[str] = None, **auth_kwargs: Any
+) -> Credential:
+    """Returns a credential, to be shared by service clients of many accounts.
+    Tokens are cached across runs in the token_cache file, if given, per
+    auth method, options and identity, see _cache_key."""
+    factory = partial(token_credential_strategy(auth_method), **auth_kwargs)
+    return CachedCredential(
+        factory,
+        cache_path=token_cache,
+        cache_key=_cache_key(auth_method, auth_kwargs),
+    )
+
+
+def _cache_key(auth_method: str, auth_kwargs: Dict[str, Any]) -> str:
+    """Returns the key of cached tokens: the auth method and options, and the
+    identity they resolve to, as far as it is known without a request: the
+    identity environment variables and, for the Azure CLI, its logged in
+    account. Options may contain secrets, only their hash is stored."""
+    identity = [(name, os.environ.get(name)) for name in _IDENTITY_VARIABLES]
+    if auth_method in _CLI_METHODS:
+        identity.append(("cli", _cli_account()))
+    options = json.dumps(
+        [auth_method, sorted(auth_kwargs.items()), identity], default=str
+    )
+    return hashlib.sha256(options.encode("utf-8")).hexdigest()
+
+
+def _cli_account() -> Optional[List[str]]:
+    """Returns [tenant id, user name] of the default subscription of the
+    Azure CLI, read from its profile, None if it is not logged in"""
+    config_dir = os.environ.get(
+        "AZURE_CONFIG_DIR", os.path.join(os.path.expanduser("~"), ".azure")
+    )
+    try:
+        # Written with a byte order mark
+        path = os.path.join(config_dir, "azureProfile.json")
+        with open(path, "r", encoding="utf-8-sig") as f:
+            subscriptions = json.load(f).get("subscriptions", [])
+    except (OSError, ValueError, AttributeError):
+        return None
+
+    for subscription in subscriptions:
+        if subscription.get("isDefault"):
+            user = subscription.get("user") or {}
+            return [subscription.get("tenantId"), user.get("name")]
+    return None
+
+
 def get_service_client(
+    account_name: str,
+    auth_method: str,
+    credential: Optional[Credential] = None,
+    transport: Optional[Any] = None,
+    **auth_kwargs: Any,
+) -> "DataLakeServiceClient":
+    """Returns a service client of the account. A new credential is created
+    unless one is given. Requests are sent through transport, if given."""
+    from azure.storage.filedatalake import DataLakeServiceClient
+
+    account_url = f"https://{account_name}.dfs.core.windows.net"
+    if credential is None:
+        credential = get_credential(auth_method, **auth_kwargs)
+    client_kwargs = {} if transport is None else {"transport": transport}
+    service_client = DataLakeServiceClient(
+        account_url, credential=credential, **client_kwargs
+    )
+
+    return service_client
+
+
+def get_async_service_client(
     account_name: str, auth_method: str, **auth_kwargs: Any
-) -> DataLakeServiceClient:
+) -> "datalake_aio.DataLakeServiceClient":
+    from azure.storage.filedatalake import aio as datalake_aio
+
     account_url = f"https://{account_name}.dfs.core.windows.net"
-    token_credential = token_credential_strategy(auth_method)(**auth_kwargs)
-    service_client = DataLakeServiceClient(account_url, credential=token_credential)
+    token_credential = async_token_credential_strategy(auth_method)(**auth_kwargs)
+    service_client = datalake_aio.DataLakeServiceClient(
+        account_url, credential=token_credential
+    )
 
     return service_client
 
@@ -49,6 +283,16 @@ def token_credential_strategy(auth_method: str) -> Credential:
     if auth_method not in AUTH_SUPPORTED_OPTIONS:
         raise ValueError(f"Method {auth_method} not supported")
 
+    from azure.identity import (
+        DefaultAzureCredential,
+        AzureCliCredential,
+        EnvironmentCredential,
+        WorkloadIdentityCredential,
+        ManagedIdentityCredential,
+        AzurePowerShellCredential,
+        AzureDeveloperCliCredential,
+    )
+
     strats = {}
     strats["default"] = DefaultAzureCredential
     strats["environment"] = EnvironmentCredential
@@ -59,3 +303,21 @@ def token_credential_strategy(auth_method: str) -> Credential:
     strats["azuredevcli"] = AzureDeveloperCliCredential
 
     return strats[auth_method]
+
+
+def async_token_credential_strategy(auth_method: str) -> Credential:
+    if auth_method not in AUTH_SUPPORTED_OPTIONS:
+        raise ValueError(f"Method {auth_method} not supported")
+
+    from azure.identity import aio as identity_aio
+
+    strats = {}
+    strats["default"] = identity_aio.DefaultAzureCredential
+    strats["environment"] = identity_aio.EnvironmentCredential
+    strats["workload"] = identity_aio.WorkloadIdentityCredential
+    strats["managedid"] = identity_aio.ManagedIdentityCredential
+    strats["azurecli"] = identity_aio.AzureCliCredential
+    strats["azureps"] = identity_aio.AzurePowerShellCredential
+    strats["azuredevcli"] = identity_aio.AzureDeveloperCliCredential
+
+    return strats[auth_method]
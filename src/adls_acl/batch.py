@@ -0,0 +1,80 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+from .auth import Credential
+from .executor import map_ordered
+from .input_parser import config_to_trees
+from .orchestrator import Orchestrator
+from .plan import Plan
+
+log = logging.getLogger(__name__)
+
+CONFIG_EXTENSIONS = (".yml", ".yaml")
+
+
+@dataclass
+class AccountResult:
+    plan: Plan
+    failures: Dict[str, Exception]
+
+
+def config_paths(paths: Iterable[str]) -> List[str]:
+    """Returns config files: the files given, and YAML files in the
+    directories given (not in their subdirectories), sorted by name."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            files.extend(
+                [
+                    os.path.join(path, name)
+                    for name in names
+                    if name.endswith(CONFIG_EXTENSIONS)
+                    and os.path.isfile(os.path.join(path, name))
+                ]
+            )
+        else:
+            files.append(path)
+
+    return files
+
+
+def run_batch(
+    configs: Iterable[Dict],
+    credential: Credential,
+    workers: int = 1,
+    concurrency: int = 1,
+    **orchestrator_kwargs: Any,
+) -> Dict[str, AccountResult]:
+    """Sets ACLs from many configs, of one or more accounts. All service
+    clients share the credential. Up to workers containers (of any account)
+    are processed in parallel, each with up to concurrency directories in
+    parallel. All configs are validated before anything is processed.
+    Returns results per account."""
+    accounts = [(config["account"], config_to_trees(config)) for config in configs]
+    orchestrators = {}
+    jobs = []
+    for account_name, trees in accounts:
+        if account_name not in orchestrators:
+            orchestrators[account_name] = Orchestrator(
+                account_name, credential=credential, **orchestrator_kwargs
+            )
+        for tree_root in trees:
+            jobs.append((account_name, tree_root))
+
+    def run(job):
+        account_name, tree_root = job
+        log.info("Processing container %s/%s", account_name, tree_root.name)
+        failures = orchestrators[account_name].process_tree(tree_root, concurrency)
+        return account_name, failures
+
+    failures = {account_name: {} for account_name in orchestrators}
+    for account_name, container_failures in map_ordered(run, jobs, workers):
+        failures[account_name].update(container_failures)
+
+    return {
+        account_name: AccountResult(o.plan, failures[account_name])
+        for account_name, o in orchestrators.items()
+    }
@@ -6,26 +6,335 @@
 # https://learn.microsoft.com/en-us/azure/storage/blobs/data-lake-storage-access-control#permissions-inheritance
 # default permissions have been set on the parent items before the child items have been created.
 #
+import contextlib
 import logging
+from functools import partial
 
 import click
-import yaml
+import yamale
 
-from .input_parser import config_from_yaml
+from .input_parser import config_from_yaml, config_to_trees
+from .journal import Journal
 from .logger import configure_logger
-from .nodes import container_config_to_tree
-from .orchestrator import Orchestrator
-from .auth import AUTH_SUPPORTED_OPTIONS
+from .nodes import ConfigError
+from .recursive import RecursiveCheckpoint, RecursiveOptions
+from .state import StateCache
+from .tracing import OpenTelemetryTracer, SpanRecorder, set_tracer
+from .writer import dump_account
+from .auth import AUTH_SUPPORTED_OPTIONS, get_credential
 
 root_logger = logging.getLogger()  # Root Logger
 
 
+def _auth_options(f):
+    """Authentication options, shared by all commands"""
+    options = [
+        click.option(
+            "--auth-method",
+            type=click.Choice(AUTH_SUPPORTED_OPTIONS, case_sensitive=False),
+            default="default",
+            help="Azure AD Authentication method",
+        ),
+        click.option(
+            "--auth-opt",
+            type=click.Tuple([str, str]),
+            multiple=True,
+            help="Keyword arguments to pass to Azure SDK credential constructor",
+        ),
+        click.option(
+            "--token-cache",
+            type=click.Path(dir_okay=False),
+            default=None,
+            help="Cache access tokens in a file, reuse them in later runs.",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _run_options(f):
+    """Options of a set-acl run, shared by set-acl and batch"""
+    options = [
+        click.option(
+            "--plan",
+            "dry_run",
+            is_flag=True,
+            help="Only print directories to create and ACLs to update, change nothing.",
+        ),
+        click.option(
+            "--state-file",
+            type=click.Path(dir_okay=False),
+            default=None,
+            help="Record the applied state in a file, skip subtrees unchanged since.",
+        ),
+        click.option(
+            "--assume-no-drift",
+            is_flag=True,
+            help="Skip unchanged subtrees without reading their ACLs from the account.",
+        ),
+        _recursive_options,
+        click.option(
+            "--lazy-recursive",
+            is_flag=True,
+            help="Skip recursive ACL updates whose entries all directories in the input already have.",
+        ),
+        click.option(
+            "--prefetch/--no-prefetch",
+            default=True,
+            show_default=True,
+            help="List existing directories of a container before creating missing ones.",
+        ),
+        _throttle_options,
+        click.option(
+            "--journal",
+            type=click.Path(dir_okay=False),
+            default=None,
+            help="Record completed directories in a file, to resume the run from.",
+        ),
+        click.option(
+            "--resume",
+            is_flag=True,
+            help="Skip directories completed by an interrupted run, see --journal.",
+        ),
+        _metrics_option,
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _throttle_options(f):
+    """Options of requests to an account, shared by all commands"""
+    options = [
+        click.option(
+            "--adaptive/--no-adaptive",
+            default=True,
+            show_default=True,
+            help="Lower the number of requests in flight while the account throttles.",
+        ),
+        click.option(
+            "--max-tps",
+            type=click.FloatRange(min=0, min_open=True),
+            default=None,
+            help="Maximum number of requests per second to an account.",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+_metrics_option = click.option(
+    "--metrics-out",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Write counts and latencies of Azure operations to a file (JSON, or "
+    "Prometheus text for a .prom file).",
+)
+
+
+def _recursive_options(f):
+    """Options of recursive ACL updates, shared by set-acl, batch and execute"""
+    options = [
+        click.option(
+            "--batch-size",
+            type=click.IntRange(min=1, max=2000),
+            default=None,
+            help="Number of paths per batch of a recursive ACL update (max 2000).",
+        ),
+        click.option(
+            "--max-batches",
+            type=click.IntRange(min=1),
+            default=None,
+            help="Number of batches per request of a recursive ACL update.",
+        ),
+        click.option(
+            "--checkpoint-file",
+            type=click.Path(dir_okay=False),
+            default=None,
+            help="Save progress of recursive ACL updates in a file, resume from it.",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _run_opts(
+    dry_run,
+    state_file,
+    assume_no_drift,
+    batch_size,
+    max_batches,
+    checkpoint_file,
+    lazy_recursive,
+    prefetch,
+    journal,
+    resume,
+    adaptive,
+    max_tps,
+):
+    """Returns keyword arguments of an orchestrator from the run options"""
+    if assume_no_drift and state_file is None:
+        raise click.UsageError("--assume-no-drift requires --state-file")
+    if resume and journal is None:
+        raise click.UsageError("--resume requires --journal")
+    state = StateCache(state_file) if state_file is not None else None
+    # Nothing is journaled in a dry run, the journal of an interrupted run is
+    # left as it is to resume from
+    if journal is not None and not dry_run:
+        journal = Journal(journal, resume=resume)
+    else:
+        journal = None
+
+    return dict(
+        dry_run=dry_run,
+        state=state,
+        assume_no_drift=assume_no_drift,
+        recursive_options=_recursive_opts(batch_size, max_batches, checkpoint_file),
+        lazy_recursive=lazy_recursive,
+        prefetch=prefetch,
+        journal=journal,
+        throttle_options=_throttle_opts(adaptive, max_tps),
+    )
+
+
+def _throttle_opts(adaptive, max_tps):
+    from .throttle import ThrottleOptions
+
+    return ThrottleOptions(adaptive=adaptive, max_tps=max_tps)
+
+
+def _recursive_opts(batch_size, max_batches, checkpoint_file):
+    return RecursiveOptions(
+        batch_size=batch_size,
+        max_batches=max_batches,
+        checkpoint=(
+            RecursiveCheckpoint(checkpoint_file)
+            if checkpoint_file is not None
+            else None
+        ),
+    )
+
+
+def _parse_shard(ctx, param, value):
+    """Parses a shard I/N, I from 1 to N"""
+    if value is None:
+        return None
+    try:
+        i, n = [int(x) for x in value.split("/")]
+    except ValueError:
+        raise click.BadParameter("expected I/N, e.g. 1/4")
+    if not 1 <= i <= n:
+        raise click.BadParameter("I must be from 1 to N")
+    return i, n
+
+
+@contextlib.contextmanager
+def _metrics(path):
+    """Yields metrics to collect, or None without a path. They are written to
+    the path at the end, also if the run failed."""
+    if path is None:
+        yield None
+        return
+    from .metrics import Metrics
+
+    metrics = Metrics()
+    try:
+        yield metrics
+    finally:
+        metrics.save(path)
+        root_logger.info("Metrics written to %s", path)
+
+
+@contextlib.contextmanager
+def _config_errors(source):
+    """Reports invalid configs as usage errors, the details are logged"""
+    try:
+        yield
+    except (ConfigError, yamale.YamaleError) as e:
+        raise click.ClickException(f"{source}: {e}")
+
+
 @click.group()
 @click.option("--debug", is_flag=True, help="Enable debug messages.")
 @click.option("--silent", is_flag=True, help="Suppress logs to stdout.")
 @click.option("--log-file", "log_file", default=None, help="Redirect logs to a file.")
-def cli(debug, silent, log_file, root_logger=root_logger):
-    root_logger = configure_logger(root_logger, debug, silent, log_file)
+@click.option(
+    "--log-format",
+    type=click.Choice(["text", "json"], case_sensitive=False),
+    default="text",
+    show_default=True,
+    help="Format of logs: text, or a JSON object per line.",
+)
+@click.option(
+    "--trace-file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Write timings of the phases of the run to a file, a span per line.",
+)
+@click.option(
+    "--otel",
+    is_flag=True,
+    help="Send timings of the phases of the run to OpenTelemetry.",
+)
+@click.option(
+    "--profile",
+    "profile_file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Run the command under cProfile, write the stats to a file.",
+)
+@click.pass_context
+def cli(
+    ctx,
+    debug,
+    silent,
+    log_file,
+    log_format,
+    trace_file,
+    otel,
+    profile_file,
+    root_logger=root_logger,
+):
+    ctx.call_on_close(
+        configure_logger(root_logger, debug, silent, log_file, log_format == "json")
+    )
+    if trace_file is not None and otel:
+        raise click.UsageError("--trace-file and --otel are mutually exclusive")
+    if trace_file is not None:
+        recorder = SpanRecorder(trace_file)
+        set_tracer(recorder)
+        ctx.call_on_close(recorder.close)
+        ctx.call_on_close(partial(set_tracer, None))
+    elif otel:
+        try:
+            set_tracer(OpenTelemetryTracer())
+        except ImportError as e:
+            raise click.UsageError(
+                f"--otel requires OpenTelemetry ({e}). "
+                "Install it with: pip install adls-acl[otel]"
+            )
+        ctx.call_on_close(partial(set_tracer, None))
+    if profile_file is not None:
+        ctx.call_on_close(_start_profile(profile_file))
+
+
+def _start_profile(path):
+    """Profiles the current thread with cProfile. Returns a function stopping
+    the profile and writing the stats to path."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(path)
+        root_logger.info("Profile written to %s, see: python -m pstats %s", path, path)
+
+    return stop
 
 
 @cli.command()
@@ -33,30 +342,326 @@ def cli(debug, silent, log_file, root_logger=root_logger):
     "file",
     type=click.File(mode="r", encoding="utf-8", lazy=True),
 )
+@_auth_options
 @click.option(
-    "--auth-method",
-    type=click.Choice(AUTH_SUPPORTED_OPTIONS, case_sensitive=False),
-    default="default",
-    help="Azure AD Authentication method",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of directories processed in parallel.  [default: 1, 100 with "
+    "--engine async]",
 )
 @click.option(
-    "--auth-opt",
-    type=click.Tuple([str, str]),
-    multiple=True,
-    help="Keyword arguments to pass to Azure SDK credential constructor",
+    "--engine",
+    type=click.Choice(["thread", "async"], case_sensitive=False),
+    default="thread",
+    show_default=True,
+    help="Execution engine: a thread pool or asyncio (requires aiohttp).",
 )
-def set_acl(file, auth_method, auth_opt):
+@_run_options
+def set_acl(
+    file,
+    auth_method,
+    auth_opt,
+    token_cache,
+    concurrency,
+    engine,
+    dry_run,
+    state_file,
+    assume_no_drift,
+    batch_size,
+    max_batches,
+    checkpoint_file,
+    lazy_recursive,
+    prefetch,
+    journal,
+    resume,
+    adaptive,
+    max_tps,
+    metrics_out,
+):
     """Read and set direcotry structure and ACLs from a YAML file."""
     auth_opt = {x[0]: x[1] for x in auth_opt}
     config_str = file.read()
-    acls_config = config_from_yaml(config_str)
-    o = Orchestrator(
-        acls_config["account"], auth_method=auth_method, auth_kwargs=auth_opt
+    with _config_errors(file.name):
+        acls_config = config_from_yaml(config_str)
+        trees = config_to_trees(acls_config)
+    run_opts = _run_opts(
+        dry_run,
+        state_file,
+        assume_no_drift,
+        batch_size,
+        max_batches,
+        checkpoint_file,
+        lazy_recursive,
+        prefetch,
+        journal,
+        resume,
+        adaptive,
+        max_tps,
     )
 
-    for container in acls_config["containers"]:
-        tree_root = container_config_to_tree(container)
-        o.process_tree(tree_root)
+    if engine == "async":
+        if token_cache is not None:
+            raise click.UsageError("--token-cache is not supported by the async engine")
+        if journal is not None:
+            raise click.UsageError("--journal is not supported by the async engine")
+        if max_tps is not None:
+            raise click.UsageError("--max-tps is not supported by the async engine")
+        del run_opts["journal"]
+        del run_opts["throttle_options"]
+        import asyncio
+
+        with _metrics(metrics_out) as metrics:
+            failures, plan = asyncio.run(
+                _set_acl_async(
+                    acls_config["account"],
+                    trees,
+                    auth_method,
+                    auth_opt,
+                    concurrency,
+                    dict(run_opts, metrics=metrics),
+                )
+            )
+    else:
+        from .orchestrator import Orchestrator
+
+        with _metrics(metrics_out) as metrics:
+            o = Orchestrator(
+                acls_config["account"],
+                auth_method=auth_method,
+                **run_opts,
+                metrics=metrics,
+                token_cache=token_cache,
+                **auth_opt,
+            )
+            failures = {}
+            for tree_root in trees:
+                failures.update(o.process_tree(tree_root, concurrency=concurrency or 1))
+        plan = o.plan
+
+    if dry_run:
+        click.echo(plan.report())
+    else:
+        root_logger.info("Done. %s", plan.summary())
+
+    if failures:
+        for path, e in failures.items():
+            root_logger.error("FAILED: %s: %s", path, e)
+        raise click.ClickException(f"Failed to process {len(failures)} node(s).")
+
+
+async def _set_acl_async(
+    account_name, trees, auth_method, auth_opt, concurrency, run_opts
+):
+    try:
+        from .aio import AsyncOrchestrator
+
+        # Without --concurrency, the default of the orchestrator
+        if concurrency is not None:
+            run_opts = dict(run_opts, concurrency=concurrency)
+        o = AsyncOrchestrator(
+            account_name, auth_method=auth_method, **run_opts, **auth_opt
+        )
+    except ImportError as e:
+        raise click.ClickException(
+            f"The async engine is not available ({e}). "
+            "Install it with: pip install adls-acl[aio]"
+        )
+
+    failures = {}
+    async with o:
+        for tree_root in trees:
+            failures.update(await o.process_tree(tree_root))
+
+    return failures, o.plan
+
+
+@cli.command()
+@click.argument(
+    "paths",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True),
+)
+@_auth_options
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of containers (of any account) processed in parallel.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of directories of a container processed in parallel.",
+)
+@_run_options
+def batch(
+    paths,
+    auth_method,
+    auth_opt,
+    token_cache,
+    workers,
+    concurrency,
+    dry_run,
+    state_file,
+    assume_no_drift,
+    batch_size,
+    max_batches,
+    checkpoint_file,
+    lazy_recursive,
+    prefetch,
+    journal,
+    resume,
+    adaptive,
+    max_tps,
+    metrics_out,
+):
+    """Set directory structure and ACLs from many YAML files (or directories
+    of them), of one or more accounts, authenticating once."""
+    auth_opt = {x[0]: x[1] for x in auth_opt}
+    from .batch import config_paths, run_batch
+
+    files = config_paths(paths)
+    if len(files) == 0:
+        raise click.UsageError("No config files found")
+    configs = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f, _config_errors(path):
+            configs.append(config_from_yaml(f.read()))
+    run_opts = _run_opts(
+        dry_run,
+        state_file,
+        assume_no_drift,
+        batch_size,
+        max_batches,
+        checkpoint_file,
+        lazy_recursive,
+        prefetch,
+        journal,
+        resume,
+        adaptive,
+        max_tps,
+    )
+
+    credential = get_credential(auth_method, token_cache=token_cache, **auth_opt)
+    try:
+        with _config_errors("config"), _metrics(metrics_out) as metrics:
+            results = run_batch(
+                configs, credential, workers, concurrency, metrics=metrics, **run_opts
+            )
+    finally:
+        credential.close()
+
+    n_failures = 0
+    for account_name, result in results.items():
+        if dry_run:
+            click.echo(f"Account {account_name}:")
+            click.echo(result.plan.report())
+        else:
+            root_logger.info("Done %s. %s", account_name, result.plan.summary())
+        for path, e in result.failures.items():
+            root_logger.error("FAILED: %s: %s: %s", account_name, path, e)
+        n_failures += len(result.failures)
+
+    if n_failures > 0:
+        raise click.ClickException(f"Failed to process {n_failures} node(s).")
+
+
+@cli.command(name="compile")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.argument(
+    "outfile",
+    type=click.File("w", encoding="utf-8", lazy=True),
+)
+def compile_plan(file, outfile):
+    """Compile a YAML file into an execution plan, without connecting to the
+    account. Run the plan with execute, in shards if needed."""
+    from .compiler import compile_trees, dump_plan
+
+    with _config_errors(file.name):
+        acls_config = config_from_yaml(file.read())
+        trees = config_to_trees(acls_config)
+    plan = compile_trees(acls_config["account"], trees)
+    dump_plan(outfile, plan)
+    root_logger.info("Compiled %d operation(s)", len(plan.operations))
+
+
+@cli.command()
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@_auth_options
+@click.option(
+    "--shard",
+    callback=_parse_shard,
+    default=None,
+    metavar="I/N",
+    help="Run shard I of N, shards can run at the same time on different machines.",
+)
+@click.option(
+    "--final",
+    is_flag=True,
+    help="Run the operations that span all shards, once all shards are done.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of top-level folders processed in parallel.",
+)
+@_recursive_options
+@_throttle_options
+@_metrics_option
+def execute(
+    file,
+    auth_method,
+    auth_opt,
+    token_cache,
+    shard,
+    final,
+    concurrency,
+    batch_size,
+    max_batches,
+    checkpoint_file,
+    adaptive,
+    max_tps,
+    metrics_out,
+):
+    """Run an execution plan made by compile: all of it, a shard, or the
+    final operations after all shards."""
+    from .compiler import load_plan
+    from .orchestrator import Orchestrator
+
+    if shard is not None and final:
+        raise click.UsageError("--shard and --final are mutually exclusive")
+    try:
+        plan = load_plan(file)
+    except (ValueError, KeyError) as e:
+        raise click.ClickException(f"{file.name}: invalid plan: {e}")
+    stages = plan.stages(shard, final)
+    root_logger.info("Running %d of %d operation(s)", len(stages), len(plan.operations))
+
+    auth_opt = {x[0]: x[1] for x in auth_opt}
+    with _metrics(metrics_out) as metrics:
+        o = Orchestrator(
+            plan.account,
+            auth_method=auth_method,
+            recursive_options=_recursive_opts(batch_size, max_batches, checkpoint_file),
+            throttle_options=_throttle_opts(adaptive, max_tps),
+            metrics=metrics,
+            token_cache=token_cache,
+            **auth_opt,
+        )
+        failures = o.execute(plan, stages, concurrency)
+    root_logger.info("Done. %s", o.plan.summary())
+
+    if failures:
+        for path, e in failures.items():
+            root_logger.error("FAILED: %s: %s", path, e)
+        raise click.ClickException(f"Failed {len(failures)} operation(s).")
 
 
 @cli.command()
@@ -71,24 +676,53 @@ def set_acl(file, auth_method, auth_opt):
     is_flag=True,
     help="Omit special ACLs when reading the account.",
 )
+@_auth_options
 @click.option(
-    "--auth-method",
-    type=click.Choice(AUTH_SUPPORTED_OPTIONS, case_sensitive=False),
-    default="default",
-    help="Azure AD Authentication method",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of directories whose ACLs are read in parallel.",
 )
 @click.option(
-    "--auth-opt",
-    type=click.Tuple([str, str]),
-    multiple=True,
-    help="Keyword arguments to pass to Azure SDK credential constructor",
+    "--list-per-directory",
+    is_flag=True,
+    help="List each directory on its own instead of each container at once.",
 )
-def get_acl(account_name, outfile, omit_special, auth_method, auth_opt):
+@_throttle_options
+@_metrics_option
+def get_acl(
+    account_name,
+    outfile,
+    omit_special,
+    auth_method,
+    auth_opt,
+    token_cache,
+    concurrency,
+    list_per_directory,
+    adaptive,
+    max_tps,
+    metrics_out,
+):
     """Read the current fs and acls on dirs."""
-    data = Orchestrator(
-        account_name, auth_method=auth_method, auth_kwargs=auth_opt
-    ).read_account(omit_special=omit_special)
-    yaml.dump(data, outfile, sort_keys=False, indent=2)
+    from .orchestrator import Orchestrator
+
+    auth_opt = {x[0]: x[1] for x in auth_opt}
+    with _metrics(metrics_out) as metrics:
+        o = Orchestrator(
+            account_name,
+            auth_method=auth_method,
+            throttle_options=_throttle_opts(adaptive, max_tps),
+            metrics=metrics,
+            token_cache=token_cache,
+            **auth_opt,
+        )
+        directories = o.walk_account(
+            omit_special=omit_special,
+            concurrency=concurrency,
+            list_per_directory=list_per_directory,
+        )
+        dump_account(outfile, account_name, directories)
 
 
 if __name__ == "__main__":
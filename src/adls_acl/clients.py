@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Tuple
+
+
+class ClientCache:
+    """Per-run cache of clients derived from a service client (sync or async),
+    and of paths created or confirmed to exist during the run.
+
+    File system clients are kept for the whole run. Directory clients take
+    tens of kB each, only the max_dir_clients most recently used are kept.
+    The root directory of a container has an empty path."""
+
+    def __init__(self, service_client: Any, max_dir_clients: int = 1024):
+        self.sc = service_client
+        self.max_dir_clients = max_dir_clients
+        self._fs_clients = {}
+        self._dir_clients = OrderedDict()
+        self._existing = set()
+        self._lock = threading.Lock()
+
+    def file_system_client(self, container: str) -> Any:
+        with self._lock:
+            fs_client = self._fs_clients.get(container)
+            if fs_client is None:
+                fs_client = self.sc.get_file_system_client(file_system=container)
+                self._fs_clients[container] = fs_client
+            return fs_client
+
+    def directory_client(self, container: str, path: str) -> Any:
+        key = (container, path)
+        with self._lock:
+            dir_client = self._dir_clients.get(key)
+            if dir_client is not None:
+                self._dir_clients.move_to_end(key)
+                return dir_client
+
+        fs_client = self.file_system_client(container)
+        if path == "":
+            dir_client = fs_client._get_root_directory_client()
+        else:
+            dir_client = fs_client.get_directory_client(path)
+
+        with self._lock:
+            self._dir_clients[key] = dir_client
+            if len(self._dir_clients) > self.max_dir_clients:
+                self._dir_clients.popitem(last=False)
+        return dir_client
+
+    def is_existing(self, container: str, path: str) -> bool:
+        """Checks if the path was created or confirmed to exist in this run"""
+        return (container, path) in self._existing
+
+    def mark_existing(self, container: str, path: str) -> None:
+        with self._lock:
+            self._existing.add((container, path))
+
+
+def node_location(node) -> Tuple[str, str]:
+    """Returns (container, path in the container) of the node"""
+    if node.is_root:
+        return node.name, ""
+    return node.get_root().name, node.path_in_file_system
@@ -0,0 +1,229 @@
+import json
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+from .nodes import (
+    Acl,
+    Node,
+    Tree,
+    acls_from_str,
+    acls_to_pushdown,
+    acls_to_str,
+    dfs,
+    intern_acls,
+    pushdown_acls,
+)
+from .recursive import _key, plan_recursive
+
+PLAN_VERSION = 1
+
+
+class OpType(Enum):
+    create = "create"  # the container, or a directory
+    set_acl = "set-acl"  # ACLs of the directory, special ACLs are preserved
+    recursive = "recursive"  # a recursive update of the subtree
+
+
+@dataclass
+class Operation:
+    """An operation on a directory. The root directory of a container has an
+    empty path. deps are ids of operations which must be done first."""
+
+    id: int
+    op: OpType
+    container: str
+    path: str
+    acl: Optional[str] = None
+    deps: List[int] = field(default_factory=list)
+
+    @property
+    def unit(self) -> Tuple[str, str]:
+        """The subtree the operation belongs to: (container, top-level folder),
+        the folder is empty for operations on the root directory"""
+        return self.container, self.path.partition("/")[0]
+
+    def to_json(self) -> Dict:
+        data = {"id": self.id, "op": self.op.value, "container": self.container}
+        data["path"] = self.path
+        if self.acl is not None:
+            data["acl"] = self.acl
+        data["deps"] = self.deps
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "Operation":
+        return cls(
+            data["id"],
+            OpType(data["op"]),
+            data["container"],
+            data["path"],
+            data.get("acl"),
+            data["deps"],
+        )
+
+
+@dataclass
+class Stages:
+    """Operations to run, in order: the shared ones, then the units (subtrees
+    independent of each other), then the final ones"""
+
+    shared: List[Operation]
+    units: List[List[Operation]]
+    final: List[Operation]
+
+    def __len__(self) -> int:
+        return len(self.shared) + sum(map(len, self.units)) + len(self.final)
+
+
+@dataclass
+class ExecutionPlan:
+    """Operations to materialize the config of an account, in an order that
+    satisfies their dependencies.
+
+    Top-level folders of the containers are independent units, spread over
+    shards which can run at the same time. Creating the containers and setting
+    ACLs on their root directories is needed by all shards, and safe to
+    repeat, it is done by every shard. Recursive updates of root directories
+    (and updates which must follow them) span all shards, they are final:
+    run once, after all shards."""
+
+    account: str
+    operations: List[Operation]
+
+    @cached_property
+    def trees(self) -> Dict[str, Tree]:
+        """Trees of the containers, with ACLs to set on the nodes. Entries of
+        recursive updates are flagged recursive on their node, so that
+        subdirectories keep them when their ACLs are set, as in set-acl."""
+        trees = {}
+        for op in self.operations:
+            if op.op == OpType.create:
+                if op.path == "":
+                    trees[op.container] = Tree(Node(op.container))
+                else:
+                    trees[op.container].add(op.path)
+            elif op.op == OpType.set_acl:
+                trees[op.container].get(op.path).acls = acls_from_str(op.acl)
+            elif op.op == OpType.recursive:
+                node = trees[op.container].get(op.path)
+                recursive = set([_recursive(acl) for acl in acls_from_str(op.acl)])
+                node.acls = intern_acls((node.acls - recursive) | recursive)
+        return trees
+
+    def node(self, op: Operation) -> Node:
+        return self.trees[op.container].get(op.path)
+
+    def stages(
+        self, shard: Optional[Tuple[int, int]] = None, final: bool = False
+    ) -> Stages:
+        """Returns operations of shard (i, n), i from 1 to n, or only the final
+        ones. By default, all operations."""
+        final_ids = set()
+        shared, units, final_ops = [], {}, []
+        for op in self.operations:
+            is_root = op.path == ""
+            if (is_root and op.op == OpType.recursive) or any(
+                [dep in final_ids for dep in op.deps]
+            ):
+                final_ids.add(op.id)
+                final_ops.append(op)
+            elif is_root:
+                shared.append(op)
+            else:
+                units.setdefault(op.unit, []).append(op)
+
+        if final:
+            return Stages([], [], final_ops)
+        if shard is None:
+            return Stages(shared, list(units.values()), final_ops)
+
+        i, n = shard
+        assigned = shard_units(units, n)
+        units = [ops for unit, ops in units.items() if assigned[unit] == i]
+        return Stages(shared, units, [])
+
+
+def _recursive(acl: Acl) -> Acl:
+    return Acl(acl.p_type, acl.oid, acl.permissions, acl.scope, recursive=True)
+
+
+def shard_units(
+    units: Dict[Tuple[str, str], List[Operation]], n: int
+) -> Dict[Tuple[str, str], int]:
+    """Assigns units to n shards (from 1), the largest units first, each to the
+    shard with the fewest operations so far. Deterministic for a plan."""
+    loads = [0] * n
+    assigned = {}
+    for unit in sorted(units, key=lambda unit: (-len(units[unit]), unit)):
+        shard = loads.index(min(loads))
+        assigned[unit] = shard + 1
+        loads[shard] += len(units[unit])
+    return assigned
+
+
+def compile_trees(account: str, roots: Iterable[Node]) -> ExecutionPlan:
+    """Compiles trees into an execution plan. Default ACLs are pushed down as
+    in a run, recursive updates are planned with plan_recursive. Per
+    container: create and set ACLs of every node, parents first, then the
+    recursive updates. A recursive update runs after the ACLs of its subtree
+    are set by the order of the plan (in a unit, or in the final stage), it
+    only depends on the ACLs of its directory."""
+    operations = []
+
+    def add(op_type, node, acl=None, deps=()):
+        root = node.get_root()
+        path = "" if node.is_root else node.path_in_file_system
+        op = Operation(len(operations), op_type, root.name, path, acl, list(deps))
+        operations.append(op)
+        return op.id
+
+    for root in roots:
+        created, set_acl = {}, {}
+        for node in dfs(root):
+            pushdown_acls(node, acls_to_pushdown(node))
+            parent = [] if node.is_root else [created[node.parent.path]]
+            created[node.path] = add(OpType.create, node, deps=parent)
+            set_acl[node.path] = add(
+                OpType.set_acl, node, node.acl_str, [created[node.path]]
+            )
+
+        recursive_plan = plan_recursive(root)
+        nodes = {node.path: node for node in dfs(root)}
+        recursive = {}
+        for path, acls in recursive_plan.operations.items():
+            node = nodes[path]
+            # After recursive updates of ancestors on the same entries, which
+            # are overridden
+            deps = [set_acl[path]]
+            keys = set([_key(acl) for acl in acls])
+            ancestor = node.parent
+            while ancestor is not None:
+                ancestor_acls = recursive_plan.operations.get(ancestor.path, ())
+                if any([_key(acl) in keys for acl in ancestor_acls]):
+                    deps.append(recursive[ancestor.path])
+                ancestor = ancestor.parent
+            recursive[path] = add(
+                OpType.recursive, node, acls_to_str(acls), sorted(deps)
+            )
+
+    return ExecutionPlan(account, operations)
+
+
+def dump_plan(out: TextIO, plan: ExecutionPlan) -> None:
+    """Writes the plan as JSON, one operation per line"""
+    out.write(f'{{"version": {PLAN_VERSION}, "account": {json.dumps(plan.account)},')
+    out.write(' "operations": [\n')
+    for i, op in enumerate(plan.operations):
+        separator = ",\n" if i < len(plan.operations) - 1 else "\n"
+        out.write(json.dumps(op.to_json()) + separator)
+    out.write("]}\n")
+
+
+def load_plan(f: TextIO) -> ExecutionPlan:
+    data = json.load(f)
+    if data.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version: {data.get('version')}")
+    operations = [Operation.from_json(op) for op in data["operations"]]
+    return ExecutionPlan(data["account"], operations)
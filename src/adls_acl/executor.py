@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import logging
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+from .nodes import Node
+
+log = logging.getLogger(__name__)
+
+
+def run_tree(
+    root: Node,
+    fn: Callable[[Node], Any],
+    concurrency: int = 1,
+    prune: Iterable[str] = (),
+) -> Dict[str, Exception]:
+    """Calls fn on every node of the tree. A node is started only after its
+    parent has finished, siblings may run in parallel (up to concurrency).
+
+    If fn raises on a node, the exception is collected and the descendants
+    of that node are skipped. If fn returns False, the descendants are skipped
+    as well. Nodes with a path in prune are skipped together with their
+    descendants. Returns a dict of failures: {node.path: exception}.
+    """
+    prune = set(prune)
+    if concurrency > 1:
+        return _run_tree_threaded(root, fn, concurrency, prune)
+
+    failures = {}
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        if node.path in prune:
+            continue
+        try:
+            descend = fn(node)
+        except Exception as e:
+            _record_failure(failures, node, e)
+            continue
+        if descend is not False:
+            queue.extend(node.children)
+
+    return failures
+
+
+def _run_tree_threaded(
+    root: Node, fn: Callable[[Node], Any], concurrency: int, prune: set
+) -> Dict[str, Exception]:
+    failures = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+
+        def submit(node):
+            if node.path not in prune:
+                pending[_submit(executor, fn, node)] = node
+
+        submit(root)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = pending.pop(future)
+                e = future.exception()
+                if e is not None:
+                    _record_failure(failures, node, e)
+                    continue
+                if future.result() is False:
+                    continue
+                for child_node in node.children:
+                    submit(child_node)
+
+    return failures
+
+
+async def run_tree_async(
+    root: Node,
+    coro_fn: Callable[[Node], Awaitable[Any]],
+    prune: Iterable[str] = (),
+) -> Dict[str, Exception]:
+    """Awaits coro_fn on every node of the tree. A node is started only after
+    its parent has finished, all children of a node are started at once.
+    Limiting the number of in-flight requests is up to coro_fn.
+
+    Failures and prune are handled as in run_tree."""
+    prune = set(prune)
+    failures = {}
+
+    async def visit(node):
+        if node.path in prune:
+            return
+        try:
+            descend = await coro_fn(node)
+        except Exception as e:
+            _record_failure(failures, node, e)
+            return
+        if descend is False:
+            return
+        await asyncio.gather(*[visit(child_node) for child_node in node.children])
+
+    await visit(root)
+
+    return failures
+
+
+def map_ordered(
+    fn: Callable[[Any], Any],
+    iterable: Iterable,
+    concurrency: int = 1,
+    executor: Optional[Executor] = None,
+) -> Iterator:
+    """Lazy map(fn, iterable) running up to concurrency calls in parallel.
+    Results are yielded in the order of the input. The iterable is consumed
+    while the calls run, but at most 2 * concurrency items are read ahead
+    of the results that have been yielded. The calls run on the executor if
+    given, otherwise on a new pool of concurrency threads."""
+    if concurrency <= 1:
+        yield from map(fn, iterable)
+        return
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            yield from map_ordered(fn, iterable, concurrency, executor)
+        return
+
+    window = deque()
+    for item in iterable:
+        window.append(_submit(executor, fn, item))
+        if len(window) >= 2 * concurrency:
+            yield window.popleft().result()
+    while window:
+        yield window.popleft().result()
+
+
+def walk_ordered(
+    fn: Callable[[Any], Tuple[Any, Iterable]], root: Any, concurrency: int = 1
+) -> Iterator:
+    """Depth-first walk of a tree discovered while walking: fn(item) returns
+    (result, child items). Results are yielded in pre-order. Up to
+    concurrency calls run in parallel, on siblings of the items on the path
+    to the current one, so only those levels are held in memory."""
+    if concurrency <= 1:
+        pool = nullcontext()
+    else:
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    with pool as executor:
+        stack = [map_ordered(fn, [root], concurrency, executor)]
+        while stack:
+            try:
+                result, children = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                continue
+            yield result
+            if children:
+                stack.append(map_ordered(fn, children, concurrency, executor))
+
+
+def _submit(executor: Executor, fn: Callable, *args: Any) -> Future:
+    """Submits fn to run in a copy of the current context, as asyncio tasks do,
+    so context variables of the caller are seen by fn"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _record_failure(failures: Dict[str, Exception], node: Node, e: Exception):
+    log.error("Failed to process node %s: %s", node.path, e)
+    if len(node.children) > 0:
+        log.error("Skipping subdirectories of %s", node.path)
+    failures[node.path] = e
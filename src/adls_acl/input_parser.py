@@ -1,24 +1,78 @@
+import contextlib
+import gc
 import logging
 import pkgutil
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, List
 
 import yamale
+import yaml
+
+from .nodes import ConfigError, Node, container_config_to_tree
+from .tracing import span
 
 log = logging.getLogger(__name__)
 
+# The C loader (libyaml) is an order of magnitude faster, if PyYAML has it
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-def config_from_yaml(config_str: str) -> Dict:
-    """Reads a yaml file into dictionary and validates."""
+
+@contextlib.contextmanager
+def _gc_paused():
+    """Pauses the cyclic garbage collector. Loading creates millions of
+    long-lived objects and no garbage, collections would only rescan them."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@lru_cache(maxsize=None)
+def _schema() -> yamale.schema.Schema:
     schema = pkgutil.get_data(__name__, "schema.yml").decode("utf-8")
-    config_schema = yamale.make_schema(None, parser="PyYAML", content=schema)
-    acls_config = yamale.make_data(None, parser="PyYAML", content=config_str)
+    return yamale.make_schema(None, parser="PyYAML", content=schema)
+
 
+def config_from_yaml(config_str: str) -> Dict:
+    """Reads a yaml file into dictionary. Only the top level is validated,
+    containers are validated while their trees are built, see
+    config_to_trees."""
+    with span("parse_config"), _gc_paused():
+        config = yaml.load(config_str, Loader=_Loader)
+    if (
+        not isinstance(config, dict)
+        or not isinstance(config.get("account"), str)
+        or not isinstance(config.get("containers"), list)
+        or len(config) != 2
+    ):
+        validate_schema(config)
+        raise ConfigError("Invalid input: expected 'account' and 'containers'")
+
+    return config
+
+
+def validate_schema(config: Dict) -> None:
+    """Validates the whole config with the schema, logs all errors and raises
+    YamaleError. Slow on large configs, used to report errors in detail."""
     try:
-        yamale.validate(config_schema, acls_config)
+        # yamale expects the dict from yaml in a tuple, in a list
+        yamale.validate(_schema(), [(config, None)])
     except yamale.YamaleError as e:
         for result in e.results:
             log.error(result)
         raise e
 
-    # yamale puts the dict from yaml into a tuple, into a list
-    return acls_config[0][0]
+
+def config_to_trees(config: Dict) -> List[Node]:
+    """Returns the trees of all containers of the config, validated while they
+    are built. On an invalid config, all errors are logged (see
+    validate_schema) before raising."""
+    try:
+        with span("build_trees"), _gc_paused():
+            return [container_config_to_tree(c) for c in config["containers"]]
+    except ConfigError:
+        validate_schema(config)
+        raise
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+from typing import Set, Tuple
+
+from .nodes import Node, dfs
+from .state import subtree_hashes
+
+log = logging.getLogger(__name__)
+
+# Steps of a node, one per pass of process_tree
+FIRST_PASS = "first"  # created, ACLs set
+RECURSIVE_PASS = "recursive"  # recursive ACLs applied
+
+
+class Journal:
+    """Append-only journal of completed steps of nodes, a JSON object per line:
+    {"account": ..., "config": hash, "step": ..., "path": node.path}.
+
+    "config" is the hash of the config of the whole container (see
+    subtree_hashes), a step is only done for the config it was done with. Each
+    line is flushed when written, it survives the process being killed. A
+    truncated last line, from a crash of the machine, is ignored.
+
+    A new journal is started unless resume is set, then the steps journaled
+    so far are loaded, to be skipped, and new ones are appended."""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: Set[Tuple[str, str, str, str]] = set()
+        if resume and os.path.exists(path):
+            self._done = self._load()
+            log.info("Journal: %d completed step(s) to skip", len(self._done))
+        elif not resume:
+            open(path, "w", encoding="utf-8").close()
+
+    def is_done(self, account: str, config: str, step: str, path: str) -> bool:
+        return (account, config, step, path) in self._done
+
+    def record(self, account: str, config: str, step: str, path: str) -> None:
+        entry = {"account": account, "config": config, "step": step, "path": path}
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def tracker(self, account: str, root: Node) -> "JournalTracker":
+        return JournalTracker(self, account, root)
+
+    def _load(self) -> Set[Tuple[str, str, str, str]]:
+        done = set()
+        line = "\n"
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done.add(
+                        (
+                            entry["account"],
+                            entry["config"],
+                            entry["step"],
+                            entry["path"],
+                        )
+                    )
+                except (ValueError, KeyError):
+                    log.warning(
+                        "Ignoring an incomplete line of the journal %s", self.path
+                    )
+        if not line.endswith("\n"):
+            # New entries start on a line of their own
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n")
+        return done
+
+
+class JournalTracker:
+    """Steps of nodes of a tree in the journal, during a single run of
+    process_tree on the tree"""
+
+    def __init__(self, journal: Journal, account: str, root: Node):
+        self.journal = journal
+        self.account = account
+        self.config = subtree_hashes(root)[root.path]
+        self._processed = set()  # nodes whose first pass is done in this run
+
+    def is_done(self, step: str, node: Node) -> bool:
+        """Checks if the step of the node is journaled. A recursive update is
+        only done if no directory of the subtree got its ACLs set in this run,
+        setting ACLs replaces entries set by the recursive update."""
+        if not self.journal.is_done(self.account, self.config, step, node.path):
+            return False
+        if step == RECURSIVE_PASS:
+            return not any([x.path in self._processed for x in dfs(node)])
+        return True
+
+    def record(self, step: str, node: Node) -> None:
+        if step == FIRST_PASS:
+            self._processed.add(node.path)
+        self.journal.record(self.account, self.config, step, node.path)
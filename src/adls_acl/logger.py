@@ -1,6 +1,12 @@
+import copy
+import json
 import logging
+from datetime import datetime, timezone
 from enum import Enum
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
 from sys import stdout
+from typing import Callable
 
 
 class EnumCallableMixin:
@@ -20,12 +26,52 @@ class FormatterStyleEnum(Enum):
     debug = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a JSON object on a line: time, level, logger and
+    message, and the structured fields of the record (passed with extra=) if
+    it has them: path of a node, operation, latency in seconds."""
+
+    fields = ("path", "operation", "latency")
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+class _QueueHandler(QueueHandler):
+    """Puts records on the queue with their message formatted, as arguments
+    may change before it is written. Unlike QueueHandler, exception info is
+    kept for the formatters of the handlers, the queue is not pickled."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
 def configure_logger(
     logger: logging.Logger,
     debug: bool = False,
     silent: bool = False,
     log_file: str = None,
-):
+    json_format: bool = False,
+) -> Callable[[], None]:
+    """Sets up handlers of the logger. Records are put on a queue, and written
+    by the handlers in a background thread, so logging threads don't wait on
+    I/O. Returns a function writing the queued records and removing the
+    handlers, to call at exit."""
     # Determine logging level, formatter, and filters
     filters = []
     if debug:
@@ -37,6 +83,8 @@ def configure_logger(
         filters.append(
             lambda record: "azure" not in record.name
         )  # Filters out logging from azure packages
+    if json_format:
+        fromatter = JsonFormatter()
 
     # Determine handlers
     handlers = []
@@ -45,12 +93,23 @@ def configure_logger(
     if log_file:
         handlers.append(HandlerEnum.file(filename=log_file, mode="w", encoding="utf-8"))
 
-    # Apply formatters, filters and register handlers
+    # Apply formatters and register handlers with the listener, records are
+    # filtered before they are queued
     for handler in handlers:
         handler.setFormatter(fromatter)
-        for filter in filters:
-            handler.addFilter(filter)
 
-        logger.addHandler(handler)
+    queue = SimpleQueue()
+    queue_handler = _QueueHandler(queue)
+    for filter in filters:
+        queue_handler.addFilter(filter)
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    logger.addHandler(queue_handler)
+
+    def stop():
+        logger.removeHandler(queue_handler)
+        listener.stop()
+        for handler in handlers:
+            handler.close()
 
-    return logger
+    return stop
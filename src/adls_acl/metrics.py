@@ -0,0 +1,292 @@
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Methods of the Azure SDK clients which are measured, a call of
+# update_access_control_recursive is measured as a whole, all of its batches,
+# and a call of get_paths with all its pages
+OPERATIONS = frozenset(
+    [
+        "create_file_system",
+        "create_directory",
+        "exists",
+        "get_access_control",
+        "get_paths",
+        "list_file_systems",
+        "set_access_control",
+        "update_access_control_recursive",
+    ]
+)
+# Methods returning clients of a container
+_CLIENT_FACTORIES = frozenset(
+    ["get_file_system_client", "get_directory_client", "_get_root_directory_client"]
+)
+
+# Pass of the run operations belong to, see Metrics.measure_pass. Threads of
+# the executor run in a copy of the context of the caller
+current_pass: ContextVar[str] = ContextVar("current_pass", default="")
+
+
+@dataclass
+class OperationStats:
+    count: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    # Number of operations per latency bucket, the last one is unbounded
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def add(self, seconds: float, error: bool) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(LATENCY_BUCKETS)
+        self.buckets[i] += 1
+
+    def cumulative_buckets(self) -> Dict[str, int]:
+        """Returns {upper bound: number of operations at most as slow}, as in
+        a Prometheus histogram"""
+        bounds = [f"{bound:g}" for bound in LATENCY_BUCKETS] + ["+Inf"]
+        counts, total = {}, 0
+        for bound, count in zip(bounds, self.buckets):
+            total += count
+            counts[bound] = total
+        return counts
+
+
+class Metrics:
+    """Counters and latency histograms of Azure operations, per account,
+    container, pass and operation, and durations of the passes. Safe to use
+    from multiple threads.
+
+    Operations are recorded by clients made with instrument. Passes are
+    measured with measure_pass, an empty container is a pass over all
+    containers of the account."""
+
+    def __init__(self):
+        self.operations: Dict[Tuple[str, str, str, str], OperationStats] = {}
+        self.passes: Dict[Tuple[str, str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, service_client: Any, account: str) -> "InstrumentedClient":
+        return InstrumentedClient(service_client, self, account)
+
+    def record(
+        self,
+        account: str,
+        container: str,
+        operation: str,
+        seconds: float,
+        error: bool = False,
+    ) -> None:
+        key = (account, container, current_pass.get(), operation)
+        with self._lock:
+            stats = self.operations.get(key)
+            if stats is None:
+                stats = self.operations[key] = OperationStats()
+            stats.add(seconds, error)
+
+    @contextmanager
+    def measure_pass(self, account: str, container: str, name: str) -> Iterator[None]:
+        """Operations in the block belong to the pass, its duration is added up"""
+        token = current_pass.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current_pass.reset(token)
+            key = (account, container, name)
+            with self._lock:
+                self.passes[key] = self.passes.get(key, 0.0) + elapsed
+
+    def to_json(self) -> Dict:
+        operations = []
+        for (account, container, name, operation), stats in sorted(
+            self.operations.items()
+        ):
+            operations.append(
+                {
+                    "account": account,
+                    "container": container,
+                    "pass": name,
+                    "operation": operation,
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "seconds": stats.seconds,
+                    "max_seconds": stats.max_seconds,
+                    "buckets": stats.cumulative_buckets(),
+                }
+            )
+        passes = [
+            {"account": account, "container": container, "pass": name, "seconds": s}
+            for (account, container, name), s in sorted(self.passes.items())
+        ]
+        return {"operations": operations, "passes": passes}
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text format"""
+        lines = [
+            "# HELP adls_acl_operations_total Azure operations made.",
+            "# TYPE adls_acl_operations_total counter",
+        ]
+        operations = sorted(self.operations.items())
+        for key, stats in operations:
+            lines.append(f"adls_acl_operations_total{_labels(key)} {stats.count}")
+        lines += [
+            "# HELP adls_acl_operation_errors_total Azure operations failed.",
+            "# TYPE adls_acl_operation_errors_total counter",
+        ]
+        for key, stats in operations:
+            lines.append(
+                f"adls_acl_operation_errors_total{_labels(key)} {stats.errors}"
+            )
+        lines += [
+            "# HELP adls_acl_operation_duration_seconds Latency of Azure operations.",
+            "# TYPE adls_acl_operation_duration_seconds histogram",
+        ]
+        for key, stats in operations:
+            name = "adls_acl_operation_duration_seconds"
+            for bound, count in stats.cumulative_buckets().items():
+                lines.append(f"{name}_bucket{_labels(key, bound)} {count}")
+            lines.append(f"{name}_sum{_labels(key)} {stats.seconds}")
+            lines.append(f"{name}_count{_labels(key)} {stats.count}")
+        lines += [
+            "# HELP adls_acl_pass_duration_seconds Duration of passes of the run.",
+            "# TYPE adls_acl_pass_duration_seconds gauge",
+        ]
+        for (account, container, name), seconds in sorted(self.passes.items()):
+            labels = _labels((account, container, name))
+            lines.append(f"adls_acl_pass_duration_seconds{labels} {seconds}")
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: str) -> None:
+        """Writes the metrics to a file, in the Prometheus text format if its
+        extension is .prom (as read by the textfile collector of the node
+        exporter), as JSON otherwise. The file is replaced only by a complete
+        one."""
+        with self._lock:
+            if path.endswith(".prom"):
+                data = self.to_prometheus()
+            else:
+                data = json.dumps(self.to_json(), indent=2) + "\n"
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def _labels(key: Tuple[str, ...], le: str = None) -> str:
+    names = ["account", "container", "pass", "operation"]
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, key)]
+    if le is not None:
+        labels.append(f'le="{le}"')
+    return "{" + ",".join(labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class InstrumentedClient:
+    """Proxy of an Azure SDK client, sync or async, recording calls of
+    OPERATIONS in metrics. Clients it returns are instrumented too. Other
+    attributes are the ones of the client."""
+
+    def __init__(self, client: Any, metrics: Metrics, account: str, container=""):
+        self._client = client
+        self._metrics = metrics
+        self._account = account
+        self._container = container
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name in _CLIENT_FACTORIES:
+            return self._client_factory(attr)
+        if name in OPERATIONS:
+            return self._operation(name, attr)
+        return attr
+
+    def _client_factory(self, fn):
+        def get_client(*args, **kwargs):
+            container = self._container
+            if "file_system" in kwargs:
+                container = kwargs["file_system"]
+            elif not self._container and args:
+                container = args[0]
+            return InstrumentedClient(
+                fn(*args, **kwargs), self._metrics, self._account, container
+            )
+
+        return get_client
+
+    def _operation(self, name, fn):
+        def call(*args, **kwargs):
+            container = self._container
+            if name == "create_file_system":
+                container = args[0] if args else kwargs["file_system"]
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                self._record(container, name, start, error=True)
+                raise
+            if inspect.isawaitable(result):
+                return self._awaited(result, container, name, start)
+            if name == "get_paths":
+                if hasattr(result, "__aiter__"):
+                    return self._iterated_async(result, container, start)
+                return self._iterated(result, container, start)
+            self._record(container, name, start)
+            return result
+
+        return call
+
+    def _record(self, container, name, start, error=False):
+        elapsed = time.perf_counter() - start
+        self._metrics.record(self._account, container, name, elapsed, error)
+
+    async def _awaited(self, awaitable, container, name, start):
+        try:
+            result = await awaitable
+        except Exception:
+            self._record(container, name, start, error=True)
+            raise
+        self._record(container, name, start)
+        return result
+
+    def _iterated(self, paths, container, start) -> Iterator:
+        """Pages of get_paths are requested while iterating"""
+        error = False
+        try:
+            yield from paths
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(container, "get_paths", start, error)
+
+    async def _iterated_async(self, paths, container, start) -> AsyncIterator:
+        error = False
+        try:
+            async for path in paths:
+                yield path
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(container, "get_paths", start, error)
@@ -1,14 +1,82 @@
-from dataclasses import dataclass
-from typing import Dict, Optional, Self
+import sys
+import threading
+import weakref
+from collections import deque
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, NoReturn, Optional, Self, Set
+
+
+class AclType(IntEnum):
+    user = 0
+    group = 1
+    mask = 2
+    other = 3
+
+
+class AclScope(IntEnum):
+    access = 0
+    default = 1
+
+
+_TYPES = {x.name: x for x in AclType}
+_SCOPES = {None: AclScope.access, "default": AclScope.default}
+_PERMISSIONS = ["---", "--x", "-w-", "-wx", "r--", "r-x", "rw-", "rwx"]
+_PERMISSION_BITS = {s: bits for bits, s in enumerate(_PERMISSIONS)}
 
 
-@dataclass
 class Acl:
-    p_type: str
-    oid: str
-    permissions: str
-    scope: Optional[str] = None
-    recursive: Optional[bool] = False
+    """An ACL entry. Permissions are kept as an rwx bitmask, type and scope as
+    small enums, and the canonical string is built once. Instances are
+    immutable (all attributes are read-only), equal and hashed by (type, oid,
+    scope): permissions and the recursive flag are not compared. They are
+    shared, see intern_acls: an entry with other permissions or recursive
+    flag is a new instance."""
+
+    __slots__ = ("_type", "_oid", "_bits", "_scope", "_recursive", "_str")
+
+    def __init__(
+        self,
+        p_type: str,
+        oid: str,
+        permissions: str,
+        scope: Optional[str] = None,
+        recursive: Optional[bool] = False,
+    ):
+        self._type = _TYPES.get(p_type)
+        self._scope = _SCOPES.get(scope)
+        self._bits = _PERMISSION_BITS.get(permissions)
+        if self._bits is None:
+            self._bits = _permission_bits(permissions)
+        if self._type is None or self._scope is None:
+            raise ValueError(f"Invalid ACL entry: {scope}:{p_type}:{oid}")
+        # The same few OIDs repeat across millions of entries
+        self._oid = sys.intern(oid)
+        self._recursive = recursive
+        if scope is None:
+            self._str = f"{p_type}:{oid}:{_PERMISSIONS[self._bits]}"
+        else:
+            self._str = f"{scope}:{p_type}:{oid}:{_PERMISSIONS[self._bits]}"
+
+    @property
+    def p_type(self) -> str:
+        return self._type.name
+
+    @property
+    def oid(self) -> str:
+        return self._oid
+
+    @property
+    def recursive(self) -> bool:
+        return self._recursive
+
+    @property
+    def scope(self) -> Optional[str]:
+        return None if self._scope == AclScope.access else self._scope.name
+
+    @property
+    def permissions(self) -> str:
+        return _PERMISSIONS[self._bits]
 
     @classmethod
     def from_str(cls, acl_str: str):
@@ -39,65 +107,61 @@ class Acl:
         return acl
 
     def __str__(self):
-        if self.scope is None:
-            s = f"{self.p_type}:{self.oid}:{self.permissions}"
-        else:
-            s = f"{self.scope}:{self.p_type}:{self.oid}:{self.permissions}"
-        return s
+        return self._str
+
+    def __repr__(self):
+        return f"Acl({self._str!r}, recursive={self._recursive})"
 
     def __eq__(self, other):
         return (
-            self.p_type == other.p_type
-            and self.oid == other.oid
-            and self.scope == other.scope
+            self._type == other._type
+            and self._oid == other._oid
+            and self._scope == other._scope
         )
 
     def __hash__(self):
-        return hash((self.p_type, self.oid, self.scope))
+        return hash((self._type, self._oid, self._scope))
 
     def is_owner(self):
         """Checks if it is object owner ACL"""
-        return True if (self.oid == "" and self.p_type == "user") else False
+        return self._type == AclType.user and self._oid == ""
 
     def is_owner_group(self):
         """Check if it is owner group ACL"""
-        return True if (self.oid == "" and self.p_type == "group") else False
+        return self._type == AclType.group and self._oid == ""
 
     def is_mask(self):
         """Check if mask"""
-        return True if (self.p_type == "mask") else False
+        return self._type == AclType.mask
 
     def is_other(self):
         """Check if it is ACL for other"""
-        return True if (self.p_type == "other") else False
+        return self._type == AclType.other
 
     def is_default(self):
         """Check if ACL is default"""
-        return True if (self.scope == "default") else False
+        return self._scope == AclScope.default
 
     def is_special(self):
         """check if any of: mask, other, owner, owner_group"""
-        return (
-            True
-            if any(
-                [
-                    self.is_owner(),
-                    self.is_owner_group(),
-                    self.is_mask(),
-                    self.is_other(),
-                ]
-            )
-            else False
-        )
+        # Entries without an oid are exactly these
+        return self._oid == ""
 
     def is_recursive(self):
         """Check if the ACL is supposed to be applied recursively"""
-        return self.recursive
+        return self._recursive
+
+    def sort_key(self):
+        """Key for the canonical order of entries in an ACL string: access
+        before default entries, then owner, named users, owner group, named
+        groups, mask, and other."""
+        rank = 2 * self._type + (self._oid != "")
+        return (self._scope, rank, self._oid)
 
     def to_yaml(self):
         """Returns a dict reprentaion"""
         data = {
-            "oid": self.oid,
+            "oid": self._oid,
             "type": self.p_type,
             "acl": self.permissions,
         }
@@ -107,12 +171,28 @@ class Acl:
         return data
 
 
+def _permission_bits(permissions: str) -> int:
+    """Returns the rwx bitmask of permissions not in the canonical order"""
+    bits = 0
+    for x in permissions:
+        if x not in "rwx-":
+            raise ValueError(f"Invalid ACL permissions: {permissions}")
+        bits |= _PERMISSION_BITS["r--"] if x == "r" else 0
+        bits |= _PERMISSION_BITS["-w-"] if x == "w" else 0
+        bits |= _PERMISSION_BITS["--x"] if x == "x" else 0
+    return bits
+
+
 class Node:
+    __slots__ = ("name", "children", "_children_by_name", "_parent", "_path", "acls")
+
     def __init__(self, name: str, parent=None):
-        self.name = name
+        self.name = _intern(name)
         self.children = []
+        self._children_by_name = None  # created with the first child
         self.parent = parent
-        self.acls = set()
+        # Immutable and shared by nodes with the same ACLs, see intern_acls
+        self.acls: FrozenSet[Acl] = frozenset()
 
     def __str__(self):
         """Print node nicely"""
@@ -127,18 +207,20 @@ class Node:
     @property
     def path_in_file_system(self):
         """Get the path from root of the container to the Node"""
-        if self.parent is not None and self.parent.parent is not None:
-            return f"{self.parent.path_in_file_system}/{self.name}"
-        else:
+        if self._parent is None:
             return self.name
+        # Container names can't contain "/"
+        return self._path.partition("/")[2]
 
     @property
     def path(self):
         """Get the path from root (including the root name)"""
-        if self.parent is not None:
-            return f"{self.parent.path}/{self.name}"
-        else:
-            return f"{self.name}"
+        return self._path
+
+    @property
+    def acl_str(self):
+        """Get the ACLs of the node as a canonical ACL string"""
+        return acls_to_str(self.acls)
 
     @property
     def is_root(self):
@@ -150,14 +232,17 @@ class Node:
 
     @parent.setter
     def parent(self, value: Self):
-        """Sets a parent node. Also registers the child @parent"""
+        """Sets a parent node. Also registers the child @parent.
+        Paths of the node are computed once, when the parent is set."""
         if value is not None:
             if not isinstance(value, Node):
                 raise TypeError(f"Parent must be of type, {type(self)}")
             self._parent = value
             self._parent.add_child(self)
+            self._path = f"{value.path}/{self.name}"
         else:
             self._parent = None
+            self._path = self.name
 
     def get_root(self):
         root = self
@@ -169,10 +254,19 @@ class Node:
         """Append Acl to the list of Acls"""
         if not isinstance(acl, Acl):
             raise TypeError(f"Acl must be of type, {type(Acl)}")
-        self.acls.update((acl,))
+        self.acls = intern_acls(self.acls | {acl})
 
-    def add_child(self, child: Acl):
+    def add_child(self, child: Self):
         self.children.append(child)
+        if self._children_by_name is None:
+            self._children_by_name = {}
+        self._children_by_name[child.name] = child
+
+    def get_child(self, name: str) -> Optional[Self]:
+        """Returns the child node with the name, None if there is none"""
+        if self._children_by_name is None:
+            return None
+        return self._children_by_name.get(name)
 
     def to_yaml(self):
         """Returns a dict reprentaion"""
@@ -183,55 +277,201 @@ class Node:
         return data
 
 
-def _add_folder_nodes(parent_node: Node | None, folder: Dict):
-    node = Node(folder["name"], parent=parent_node)
-    for acl in folder["acls"]:
-        node.add_acl(Acl.from_dict(acl))
+# Interned ACL sets, by their entries (permissions and recursive flag included)
+_acl_sets = weakref.WeakValueDictionary()
+_acl_sets_lock = threading.Lock()
 
-    if "folders" in folder:
-        for subfolder in folder["folders"]:
-            _ = _add_folder_nodes(node, subfolder)
 
-    return node  # The root node will be returend to the original caller
+def intern_acls(acls: Iterable[Acl]) -> FrozenSet[Acl]:
+    """Returns an immutable set of the ACLs. Equal sets are stored once: the
+    set interned first is returned while any node holds it."""
+    acls = frozenset(acls)
+    key = frozenset([(str(acl), acl.recursive) for acl in acls])
+    with _acl_sets_lock:
+        return _acl_sets.setdefault(key, acls)
 
 
-def find_node_by_name(root_node, full_name: str) -> Node:
-    """Return the node by its name (path in the filesystem: from container node)"""
-    """ Should i just have a Tree class instead with index by name for nodes?"""
-    # Names are path from contianer root: dir1/dir2/dir3
+@lru_cache(maxsize=4096)
+def acls_from_str(acls_str: str) -> FrozenSet[Acl]:
+    """Returns an interned set of ACLs from a whole ACL string, as returned
+    by get_access_control. Directories mostly have one of a few ACL strings,
+    each distinct string is parsed once."""
+    return intern_acls([_acl_from_entry(x) for x in acls_str.split(",") if x != ""])
 
-    path_arr = full_name.split("/")
-    # if the name of the node is only 1-level and the search is on the root level
-    # return root node immediatley
-    if path_arr[0] == "" and root_node.is_root:
-        return root_node
 
-    current_dir = path_arr[0]
-    path_reminder = ("/").join(path_arr[1:])
-    node = None
+# Entries repeat across directories with different ACL strings, Acl
+# instances are immutable and can be shared
+_acl_from_entry = lru_cache(maxsize=65536)(Acl.from_str)
 
-    for child_node in root_node.children:
-        if child_node.name == current_dir:
-            node = child_node
-            break
 
-    if len(path_reminder) > 0 and node is not None:
-        node = find_node_by_name(node, full_name=path_reminder)
+def _intern(s: Optional[str]) -> Optional[str]:
+    return sys.intern(s) if isinstance(s, str) else s
+
+
+def acls_to_str(acls: Iterable[Acl]) -> str:
+    """Returns a canonical ACL string, as accepted by set_access_control"""
+    return ",".join([str(acl) for acl in sorted(acls, key=Acl.sort_key)])
+
+
+def acls_to_pushdown(node: Node) -> Set[Acl]:
+    """Returns default ACLs of the node, which are inherited by its children"""
+    return set([acl for acl in node.acls if acl.is_default()])
+
+
+def pushdown_acls(node: Node, acls: Set[Acl]) -> None:
+    """Pushdown selected ACLs to the children of the node"""
+    # Siblings mostly share the same (interned) ACL set, merge it once
+    merged = {}
+    for child_node in node.children:
+        key = id(child_node.acls)
+        if key not in merged:
+            merged[key] = intern_acls(child_node.acls | acls)
+        child_node.acls = merged[key]
+
+
+class Tree:
+    """Nodes of a container indexed by their path in the file system: a
+    directory is found and added by its path in O(1). The root node has an
+    empty path, the parent of a node must be added before the node."""
+
+    def __init__(self, root: Node):
+        self.root = root
+        self._index = {}
+        for node in dfs(root):
+            self._index[_tree_key(node)] = node
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, path: str):
+        return path in self._index
+
+    def get(self, path: str) -> Optional[Node]:
+        """Returns the node by its path in the file system, None if missing"""
+        return self._index.get(path)
+
+    def add(self, path: str) -> Node:
+        """Adds a node by its path in the file system. Raises KeyError if
+        its parent is not in the tree."""
+        parent_path, _, name = path.rpartition("/")
+        return self.add_child(self._index[parent_path], name)
+
+    def add_child(self, parent: Node, name: str) -> Node:
+        node = Node(name, parent=parent)
+        self._index[node.path_in_file_system] = node
+        return node
+
+    @classmethod
+    def from_config(cls, container_config: Dict) -> Self:
+        """Returns a Tree from JSON configuration of a container. Folders and
+        ACLs are validated while the tree is built, raises ConfigError on the
+        first invalid one."""
+        _check_fields(container_config, _FOLDER_FIELDS, None)
+        tree = cls(Node(container_config["name"]))
+        stack = [(tree.root, container_config)]
+        while stack:
+            node, folder = stack.pop()
+            node.acls = intern_acls([_acl_from_config(x, node) for x in folder["acls"]])
+            for subfolder in folder.get("folders") or []:
+                _check_fields(subfolder, _FOLDER_FIELDS, node)
+                if node.get_child(subfolder["name"]) is not None:
+                    _config_error(node, f"duplicate folder {subfolder['name']!r}")
+                stack.append((tree.add_child(node, subfolder["name"]), subfolder))
+
+        return tree
+
+
+class ConfigError(ValueError):
+    """Invalid input configuration"""
+
+
+# Fields of the input: {name: (type, required)}, see schema.yml
+_FOLDER_FIELDS = {"name": (str, True), "acls": (list, True), "folders": (list, False)}
+_ACL_FIELDS = {
+    "oid": (str, True),
+    "type": (str, True),
+    "acl": (str, True),
+    "scope": (str, False),
+    "recursive": (bool, False),
+}
+_ACL_TYPES = tuple([x.name for x in AclType])
+
+
+def _check_fields(data: Any, fields: Dict, parent: Optional[Node]) -> None:
+    """Checks a folder or an ACL from the input, raises ConfigError"""
+    if not isinstance(data, dict):
+        _config_error(parent, f"expected a mapping, got {data!r}")
+    for key, (value_type, required) in fields.items():
+        value = data.get(key)
+        if value is None:
+            if required:
+                _config_error(parent, f"'{key}' is required in {data!r}")
+        elif not isinstance(value, value_type):
+            _config_error(parent, f"'{key}' is not a {value_type.__name__}: {value!r}")
+    if len(data) > len(fields):
+        extra = [key for key in data if key not in fields]
+        if extra:
+            _config_error(parent, f"unexpected keys {extra} in {data!r}")
+
+
+def _acl_from_config(data: Any, node: Node) -> Acl:
+    _check_fields(data, _ACL_FIELDS, node)
+    if data["type"] not in _ACL_TYPES:
+        _config_error(node, f"ACL type must be one of {_ACL_TYPES}: {data!r}")
+    if len(data["acl"]) != 3:
+        _config_error(node, f"ACL permissions must be 3 characters: {data!r}")
+    try:
+        return _cached_acl(
+            data["type"],
+            data["oid"],
+            data["acl"],
+            data.get("scope"),
+            data.get("recursive") or False,
+        )
+    except ValueError as e:
+        _config_error(node, str(e))
+
+
+# ACL entries repeat across folders of the input, Acl instances are immutable
+_cached_acl = lru_cache(maxsize=65536)(Acl)
+
+
+def _config_error(node: Optional[Node], message: str) -> NoReturn:
+    where = "containers" if node is None else node.path
+    raise ConfigError(f"Invalid input in {where}: {message}")
+
+
+def _tree_key(node: Node) -> str:
+    return "" if node.is_root else node.path_in_file_system
+
+
+def find_node_by_name(root_node, full_name: str) -> Node:
+    """Return the node by its name (path in the filesystem: from container node)"""
+    # Names are path from contianer root: dir1/dir2/dir3
+    # For repeated lookups in a large tree, use Tree.get
+    node = root_node
+    if full_name == "":
+        return node
+
+    for name in full_name.split("/"):
+        node = node.get_child(name)
+        if node is None:
+            break
 
     return node
 
 
 def container_config_to_tree(container_config) -> Node:
     """Returns a Tree from JSON configuration"""
-    return _add_folder_nodes(None, container_config)
+    return Tree.from_config(container_config).root
 
 
 def bfs(root: Node):
     """Breadth-first traversal of the tree"""
-    queue = [root]
+    queue = deque([root])
 
     while queue:
-        node = queue.pop(0)
+        node = queue.popleft()
         for child_node in node.children:
             queue.append(child_node)
         yield node
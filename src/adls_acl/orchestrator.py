@@ -1,70 +1,452 @@
 import logging
-from azure.storage.filedatalake import (
-    DataLakeServiceClient,
-    DataLakeDirectoryClient,
-)
-from azure.core.exceptions import ResourceExistsError
+import time
+from contextlib import nullcontext
+from functools import partial
+from azure.storage.filedatalake import DataLakeDirectoryClient, FileSystemClient
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
 from abc import ABC, abstractmethod
-from typing import Set, Dict, Any
-
-from .nodes import Node, bfs, Acl, find_node_by_name
-from .auth import get_service_client
+from typing import Set, Dict, Any, Iterator, List, Optional, Tuple
+
+from .nodes import (
+    Node,
+    Acl,
+    Tree,
+    acls_from_str,
+    acls_to_pushdown,
+    acls_to_str,
+    pushdown_acls,
+)
+from .auth import Credential, get_service_client
+from .clients import ClientCache, node_location
+from .compiler import ExecutionPlan, Operation, OpType, Stages
+from .executor import map_ordered, run_tree, walk_ordered
+from .journal import FIRST_PASS, RECURSIVE_PASS, Journal, JournalTracker
+from .metrics import Metrics
+from .plan import Action, Plan
+from .processing import (
+    acls_to_write,
+    create_request,
+    exists_request,
+    folders_to_list,
+    is_created_in_plan,
+    known_unchanged,
+    listed_directories,
+    log_action,
+    node_action,
+    parse_acls,
+    prefetch_targets,
+    pushdown_unread,
+    record_existing,
+    recursive_acls_to_apply,
+)
+from .recursive import (
+    RecursiveCoverage,
+    RecursiveOptions,
+    RecursivePlan,
+    RecursiveUpdate,
+    plan_recursive,
+)
+from .state import StateCache, StateTracker
+from .throttle import Throttle, ThrottledTransport, ThrottleOptions
+from .tracing import span
 
 log = logging.getLogger(__name__)
 
 
 class Orchestrator:
     def __init__(
-        self, account_name: str, auth_method: str = "default", **auth_kwargs: Any
+        self,
+        account_name: str,
+        auth_method: str = "default",
+        dry_run: bool = False,
+        state: Optional[StateCache] = None,
+        assume_no_drift: bool = False,
+        recursive_options: Optional[RecursiveOptions] = None,
+        prefetch: bool = True,
+        lazy_recursive: bool = False,
+        journal: Optional[Journal] = None,
+        throttle_options: Optional[ThrottleOptions] = None,
+        metrics: Optional[Metrics] = None,
+        credential: Optional[Credential] = None,
+        **auth_kwargs: Any,
     ):
-        self.sc = get_service_client(account_name, auth_method, **auth_kwargs)
+        # Requests to the account are scheduled by the throttle, if any
+        self.throttle = None
+        transport = None
+        if throttle_options is not None:
+            self.throttle = Throttle(throttle_options)
+            transport = ThrottledTransport(self.throttle)
+        self.sc = get_service_client(
+            account_name,
+            auth_method,
+            credential=credential,
+            transport=transport,
+            **auth_kwargs,
+        )
+        # Operations on the account are recorded in the metrics, if any
+        self.metrics = metrics
+        if metrics is not None:
+            self.sc = metrics.instrument(self.sc, account_name)
+        self.clients = ClientCache(self.sc)
         self.account_name = account_name
+        # In a dry run nothing is written, actions are only collected in the plan
+        self.dry_run = dry_run
+        self.plan = Plan()
+        # Subtrees unchanged since the last run recorded in the state are
+        # skipped. Without assume_no_drift, the ACLs on the top directory of
+        # the subtree are read first to check they were not changed meanwhile
+        self.state = state
+        self.assume_no_drift = assume_no_drift
+        self.recursive_options = recursive_options or RecursiveOptions()
+        # Existing directories are listed before processing a container,
+        # instead of a create (or exists) request per directory
+        self.prefetch = prefetch
+        # Recursive ACL updates are skipped where every directory of the
+        # input already has their entries. Files, and directories not in the
+        # input, then keep missing entries they may lack
+        self.lazy_recursive = lazy_recursive
+        # Completed steps of nodes are journaled, steps journaled for the
+        # same config by an interrupted run are skipped
+        self.journal = journal
+
+    def process_tree(self, root: Node, concurrency: int = 1) -> Dict[str, Exception]:
+        """Materializes the tree in the account and sets its ACLs. Up to
+        concurrency sibling nodes are processed in parallel, a parent node
+        is always finished before any of its children is started.
+
+        Returns failures collected per node: {node.path: exception}."""
+        with span("process_tree", container=root.name):
+            tracker = None
+            if self.state is not None:
+                tracker = self.state.tracker(self.account_name, root)
+            journal = None
+            if self.journal is not None and not self.dry_run:
+                journal = self.journal.tracker(self.account_name, root)
+
+            if self.prefetch:
+                with self._measure(root.name, "prefetch"), span("prefetch"):
+                    self.prefetch_existing(root, concurrency, tracker)
+
+            # First pass to set non-recursive ACLs and materialzie new nodes
+            # in the account
+            coverage = RecursiveCoverage() if self.lazy_recursive else None
+            process_node = partial(
+                self._process_node, tracker=tracker, journal=journal, coverage=coverage
+            )
+            with self._measure(root.name, FIRST_PASS), span("first_pass"):
+                failures = run_tree(root, process_node, concurrency)
+
+            # Second pass to set recursive ACLs
+            recursive_plan = plan_recursive(root)
+            self.plan.add_recursive_saved(recursive_plan.saved)
+            prune = set(failures).union(self.plan.actions[Action.skip])
+            if coverage is not None:
+                for path in failures:
+                    coverage.mark(path)
+            process_node_recursive = partial(
+                self._process_node_recursive,
+                recursive_plan=recursive_plan,
+                journal=journal,
+                coverage=coverage,
+            )
+            with self._measure(root.name, RECURSIVE_PASS), span("recursive_pass"):
+                failures.update(
+                    run_tree(root, process_node_recursive, concurrency, prune=prune)
+                )
+
+            if tracker is not None and not self.dry_run:
+                tracker.commit(failures)
+                self.state.save()
+
+            return failures
+
+    def _measure(self, container: str, name: str):
+        """Context of a pass over the container, see Metrics.measure_pass"""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.measure_pass(self.account_name, container, name)
+
+    def prefetch_existing(
+        self, root: Node, concurrency: int = 1, tracker: StateTracker = None
+    ) -> None:
+        """Records directories of the tree which already exist in the account.
+        The container is listed non-recursively, then top-level folders with
+        subfolders in the tree are listed recursively, up to concurrency
+        listings at a time. Subtrees the tracker finds unchanged are not
+        listed, they are skipped unless their ACLs drifted."""
+        if tracker is not None and tracker.is_unchanged(root):
+            return
+        paths, folders = prefetch_targets(root, tracker)
+        fs_client = self.clients.file_system_client(root.name)
+        top_level = _list_existing(fs_client, None, paths, recursive=False)
+        if top_level is None:
+            return  # the container does not exist
+
+        existing = list(top_level)
+        list_existing = partial(_list_existing, fs_client, paths=paths)
+        folders = folders_to_list(folders, top_level)
+        for listed in map_ordered(list_existing, folders, concurrency):
+            existing.extend(listed or [])
+        record_existing(self.clients, root, existing, paths)
+
+    def execute(
+        self, plan: ExecutionPlan, stages: Stages, concurrency: int = 1
+    ) -> Dict[str, Exception]:
+        """Runs operations of a compiled plan: the shared ones, then the units,
+        up to concurrency units in parallel, then the final ones. Operations
+        depending on a failed (or skipped) operation are skipped. Dependencies
+        on operations of other stages, not run here, are assumed to be done.
+
+        Returns failures collected per node: {node.path: exception}."""
+        failed = set()  # ids of failed and skipped operations
+        plan.trees  # built once, before any thread needs them
+
+        def run(operations):
+            failures = {}
+            for op in operations:
+                if any([dep in failed for dep in op.deps]):
+                    failed.add(op.id)
+                    continue
+                node = plan.node(op)
+                try:
+                    with span(op.op.value, path=node.path):
+                        self._execute_operation(op, node)
+                except Exception as e:
+                    log.error("Failed to run %s on %s: %s", op.op.value, node.path, e)
+                    failed.add(op.id)
+                    failures[node.path] = e
+            return failures
+
+        with self._measure("", "shared"):
+            failures = run(stages.shared)
+        with self._measure("", "units"):
+            for unit_failures in map_ordered(run, stages.units, concurrency):
+                failures.update(unit_failures)
+        with self._measure("", "final"):
+            failures.update(run(stages.final))
+        if len(failed) > len(failures):
+            log.warning("Skipped %d operation(s)", len(failed) - len(failures))
+
+        return failures
+
+    def _execute_operation(self, op: Operation, node: Node) -> None:
+        processor = processor_selector(node)
+        if op.op == OpType.create:
+            if processor.create(node, self.clients):
+                self.plan.add(Action.create, node)
+            return
+
+        dc = processor.get_dir_client(node, self.clients)
+        if op.op == OpType.set_acl:
+            changed = processor.set_acls(node, dc)
+            if not self.plan.has(Action.create, node):
+                self.plan.add(Action.update if changed else Action.noop, node)
+        else:
+            processor.update_acls_recursive(
+                node, dc, acls_from_str(op.acl), self.recursive_options
+            )
+            self.plan.add(Action.recursive, node)
+
+    def _process_node(
+        self,
+        node: Node,
+        tracker: StateTracker = None,
+        journal: JournalTracker = None,
+        coverage: Optional[RecursiveCoverage] = None,
+    ) -> bool:
+        """Processes the node, returns False if its subtree is skipped"""
+        with span("process_node", path=node.path):
+            start = time.perf_counter()
+            log.debug("Processing %s", node)
+            if journal is not None and journal.is_done(FIRST_PASS, node):
+                # Done in an interrupted run, children still inherit default
+                # ACLs from the input
+                pushdown_unread(node, coverage)
+                self._done(Action.resumed, node, start)
+                return True
 
-    def process_tree(self, root):
-        # First pass to set non-recursive ACLs and materialzie new nodes
-        # in the account
-        for node in bfs(root):
-            log.info("PROCESSING NODE ===========")
-            log.info(node)
-            processor = processor_selector(node)
-            dc = processor.get_dir_client(node, self.sc)
-            processor.set_acls(node, dc)
-
-        # Second pass to set recursive ACLs
-        for node in bfs(root):
             processor = processor_selector(node)
-            if any([acl.is_recursive() for acl in node.acls]):
-                log.info("Applying recursive ACLs")
-                log.info(f"Path to node: {node.path}")
-                dc = processor.get_dir_client(node, self.sc)
-                processor.update_acls_recursive(node, dc)
-
-    def read_account(self, omit_special: bool = False) -> Dict:
+            if tracker is not None and self._is_unchanged(node, processor, tracker):
+                # The whole subtree is skipped
+                self._done(Action.skip, node, start)
+                return False
+
+            if not self.dry_run:
+                with span("create"):
+                    created = processor.create(node, self.clients)
+            elif is_created_in_plan(self.plan, node):
+                created = True
+            else:
+                created = not processor.exists(node, self.clients)
+
+            if created and self.dry_run:
+                # Nothing to compare with, all ACLs from the input would be set
+                pushdown_unread(node, coverage)
+                self._done(Action.create, node, start)
+                return True
+
+            with span("get_client"):
+                dc = processor.get_dir_client(node, self.clients)
+            changed = processor.set_acls(node, dc, self.dry_run, coverage)
+            self._done(node_action(created, changed), node, start)
+            if tracker is not None:
+                tracker.applied(node)
+            if journal is not None:
+                journal.record(FIRST_PASS, node)
+
+            return True
+
+    def _done(self, action: Action, node: Node, start: float) -> None:
+        """Adds the action on the node to the plan, and logs it"""
+        self.plan.add(action, node)
+        log_action(action, node, start)
+
+    def _is_unchanged(
+        self, node: Node, processor: "Processor", tracker: StateTracker
+    ) -> bool:
+        """Checks if the subtree is unchanged since the last applied state"""
+        unchanged = known_unchanged(node, tracker, self.assume_no_drift)
+        if unchanged is not None:
+            return unchanged
+
+        dc = processor.get_dir_client(node, self.clients)
+        try:
+            current_acls = _get_current_acls(dc)
+        except ResourceNotFoundError:
+            return False
+
+        return not tracker.is_drifted(node, current_acls)
+
+    def _process_node_recursive(
+        self,
+        node: Node,
+        recursive_plan: RecursivePlan,
+        journal: JournalTracker = None,
+        coverage: Optional[RecursiveCoverage] = None,
+    ) -> None:
+        processor = processor_selector(node)
+        recursive_acls = recursive_acls_to_apply(node, recursive_plan, coverage)
+        if len(recursive_acls) > 0:
+            start = time.perf_counter()
+            if journal is not None and journal.is_done(RECURSIVE_PASS, node):
+                self._done(Action.resumed, node, start)
+                return
+            if not self.dry_run:
+                with span("update_recursive", path=node.path):
+                    dc = processor.get_dir_client(node, self.clients)
+                    processor.update_acls_recursive(
+                        node, dc, recursive_acls, self.recursive_options
+                    )
+            self._done(Action.recursive, node, start)
+            if journal is not None:
+                journal.record(RECURSIVE_PASS, node)
+
+    def read_account(
+        self,
+        omit_special: bool = False,
+        concurrency: int = 1,
+        list_per_directory: bool = False,
+    ) -> Dict:
+        """Reads directories and their ACLs in the account. The whole account
+        is held in memory, see walk_account for a streaming read."""
         data = {}
         data["account"] = self.account_name
         data["containers"] = []
+        tree = None
+        directories = self.walk_account(omit_special, concurrency, list_per_directory)
+        for container, path, acls in directories:
+            if path == "":
+                if tree is not None:
+                    data["containers"].append(tree.root.to_yaml())
+                tree = Tree(Node(name=container))
+                node = tree.root
+            else:
+                node = tree.add(path)
+            node.acls = acls
+        if tree is not None:
+            data["containers"].append(tree.root.to_yaml())
+
+        return data
+
+    def walk_account(
+        self,
+        omit_special: bool = False,
+        concurrency: int = 1,
+        list_per_directory: bool = False,
+    ) -> Iterator[Tuple[str, str, Set[Acl]]]:
+        """Yields (container, path in the file system, ACLs) of every
+        directory in the account, see walk_container."""
         for container in self.sc.list_file_systems():
-            # Create a root node
-            fc = self.sc.get_file_system_client(container)
-            dc = fc._get_root_directory_client()
-            root_node = Node(name=fc.file_system_name)
-            for acl in _get_current_acls(dc, omit_special):
-                root_node.add_acl(acl)
-
-            # Add nodes to the tree
-            path_list = fc.get_paths(recursive=True)
-            for path in filter(lambda x: x.is_directory == True, path_list):
-                dc = fc.get_directory_client(path.name)
-                parent_name = ("/").join(path.name.split("/")[:-1])
-                parent_node = find_node_by_name(root_node, parent_name)
-                node_name = path.name.split("/")[-1]
-                node = Node(name=node_name, parent=parent_node)
-                for acl in _get_current_acls(dc, omit_special):
-                    node.add_acl(acl)
+            with self._measure(container.name, "read"):
+                for path, acls in self.walk_container(
+                    container.name, omit_special, concurrency, list_per_directory
+                ):
+                    yield container.name, path, acls
+
+    def walk_container(
+        self,
+        container: str,
+        omit_special: bool = False,
+        concurrency: int = 1,
+        list_per_directory: bool = False,
+    ) -> Iterator[Tuple[str, Set[Acl]]]:
+        """Yields (path in the file system, ACLs) of every directory in the
+        container, in depth-first pre-order, the root directory first with an
+        empty path. ACLs of up to concurrency directories are read in
+        parallel, a request per directory.
+
+        Directories are found in a single recursive listing of the container,
+        streamed page by page, only directories on the path to the current
+        one are held in memory. With list_per_directory, each directory is
+        listed on its own (non-recursively), a request per directory, in
+        parallel with the ACLs."""
+        fc = self.clients.file_system_client(container)
+
+        def read_acls(path):
+            with span("read_directory", container=container, path=path):
+                if path == "":
+                    dc = fc._get_root_directory_client()
+                else:
+                    dc = fc.get_directory_client(path)
+                return path, _get_current_acls(dc, omit_special)
+
+        def read_directory(path):
+            result = read_acls(path)
+            subdirs = [
+                x.name
+                for x in fc.get_paths(path=path or None, recursive=False)
+                if x.is_directory
+            ]
+            return result, subdirs
+
+        if list_per_directory:
+            yield from walk_ordered(read_directory, "", concurrency)
+        else:
+            yield from map_ordered(
+                read_acls, _list_directories(fc, container), concurrency
+            )
 
-            data["containers"].append(root_node.to_yaml())
 
-            return data
+def _list_directories(fc: FileSystemClient, container: str) -> Iterator[str]:
+    """Yields the root directory (an empty path), then directories of a
+    recursive listing of the file system. The listing must be in depth-first
+    pre-order: the parent of each directory is on the path to the previous
+    one. The directories on that path are kept in a stack to check it."""
+    yield ""
+    stack = [""]
+    for item in fc.get_paths(path=None, recursive=True):
+        if not item.is_directory:
+            continue
+        parent = item.name.rpartition("/")[0]
+        while stack and stack[-1] != parent:
+            stack.pop()
+        if not stack:
+            raise ValueError(
+                f"Listing of {container} is not in depth-first order "
+                f"at {item.name}, list it per directory instead"
+            )
+        stack.append(item.name)
+        yield item.name
 
 
 class ClientWithACLSupport(ABC):
@@ -81,15 +463,17 @@ class ClientWithACLSupport(ABC):
     def update_access_control_recursive(): ...
 
 
-def _filter_acls_to_preserve(current_acls: Set[Acl]) -> Set[Acl]:
-    """Determines which ACLs in the current Node should be preserved in the update"""
-    acls_to_preserve = set()
-
-    for acl in current_acls:
-        if any([acl.is_mask(), acl.is_other(), acl.is_owner(), acl.is_owner_group()]):
-            acls_to_preserve.update((acl,))
-
-    return acls_to_preserve
+def _list_existing(
+    fs_client: Any, folder: Optional[str], paths: Set[str], recursive: bool = True
+) -> Optional[List[str]]:
+    """Lists directories under the folder (the whole container if None) and
+    returns the ones in paths. Returns None if the folder does not exist."""
+    try:
+        return listed_directories(
+            fs_client.get_paths(path=folder, recursive=recursive), paths
+        )
+    except ResourceNotFoundError:
+        return None
 
 
 def _get_current_acls(
@@ -97,122 +481,168 @@ def _get_current_acls(
 ) -> Set[Acl]:
     """Returns a set of ACLs currently set on the directory."""
     current_acls_str = client.get_access_control()["acl"]
-    acls = set([Acl.from_str(acl_str) for acl_str in current_acls_str.split(",")])
-    if omit_special:
-        acls = set([acl for acl in acls if not acl.is_special()])
-    return acls
+    return parse_acls(current_acls_str, omit_special)
 
 
 def _set_acls(client: DataLakeDirectoryClient, acls: Set[Acl]) -> None:
-    """Set ACLs from the set on the node"""
-    log.info("Setting new acls:")
-    for acl in acls:
-        log.info(f"\t{str(acl)}")
-        client.set_access_control(acl=acl)
-
-
-def _pushdown_acls(node: Node, acls: Set[Acl]) -> None:
-    """Pushdown selected ACLs to the children of the node"""
-    for child_node in node.children:
-        child_node.acls.update(acls)
+    """Set ACLs from the set on the node, in a single request"""
+    acl = acls_to_str(acls)
+    log.debug("Setting ACLs: %s", acl)
+    client.set_access_control(acl=acl)
 
 
 def _update_access_control_recursive(
-    client: DataLakeDirectoryClient, acls: Set[Acl], retries: int = 3
+    client: DataLakeDirectoryClient,
+    acls: Set[Acl],
+    options: RecursiveOptions,
+    key: str,
 ) -> None:
     """Update ACLs. The easiest way to apply ACLs recusively.
+    All ACLs are applied in a single recursive update, run until completion,
+    see RecursiveUpdate.
     https://learn.microsoft.com/en-us/python/api/azure-storage-file-datalake/azure.storage.filedatalake.datalakedirectoryclient?view=azure-python#azure-storage-filedatalake-datalakedirectoryclient-update-access-control-recursive
     """
-    for acl in acls:
-        continuation_token = None
-        for i in range(0, retries):
-            change_result = client.update_access_control_recursive(
-                acl=acl, continue_on_failure=True, continuation_token=continuation_token
-            )
-            continuation_token = change_result.get("continue")
-            if continuation_token is None:
-                break
+    update = RecursiveUpdate(acls_to_str(acls), options, key)
+    while not update.done:
+        change_result = client.update_access_control_recursive(
+            **update.kwargs(), progress_hook=update.progress
+        )
+        update.advance(change_result)
 
 
 class Processor(ABC):
     @staticmethod
     @abstractmethod
-    def set_acls(node: Node, client: DataLakeDirectoryClient):
+    def set_acls(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        dry_run: bool = False,
+        coverage: Optional[RecursiveCoverage] = None,
+    ) -> bool:
+        """Sets ACLs of the node, if they differ from the current ones.
+        Returns True if they differ. Current ACLs are checked for entries of
+        recursive ACLs in the coverage, if any."""
         # Get current ACLs to preseve ACLs for
         # Owner, Owner Group, mask, and other
         # they will only change if specifie in input
-        current_acls = _get_current_acls(client)
-        acls_to_preserve = _filter_acls_to_preserve(current_acls)
-        acls_to_pushdown = set([acl for acl in node.acls if acl.is_default()])
-
-        # Collect ACLs to set
-        new_acls = node.acls
-        new_acls.update(acls_to_preserve)
-
-        _set_acls(client, new_acls)
-        _pushdown_acls(node, acls_to_pushdown)
+        with span("read_acls"):
+            current_acls = _get_current_acls(client)
+        default_acls = acls_to_pushdown(node)
+        new_acls, changed = acls_to_write(node, current_acls, coverage)
+        if changed and not dry_run:
+            with span("write_acls"):
+                _set_acls(client, new_acls)
+        with span("pushdown"):
+            pushdown_acls(node, default_acls)
+
+        return changed
 
     @staticmethod
     @abstractmethod
     def get_dir_client() -> ClientWithACLSupport: ...
 
+    @staticmethod
+    def create(node: Node, clients: ClientCache) -> bool:
+        """Creates the container or directory if it doesn't exist. Returns
+        True if created. Skipped if it was created or seen earlier in the run."""
+        request = create_request(node, clients)
+        if request is None:
+            return False
+
+        try:
+            request()
+            created = True
+        except ResourceExistsError:
+            created = False
+        clients.mark_existing(*node_location(node))
+
+        return created
+
+    @staticmethod
+    def exists(node: Node, clients: ClientCache) -> bool:
+        request = exists_request(node, clients)
+        if request is None:
+            return True
+
+        exists = request()
+        if exists:
+            clients.mark_existing(*node_location(node))
+
+        return exists
+
     @staticmethod
     @abstractmethod
-    def update_acls_recursive(node: Node, client: DataLakeDirectoryClient) -> None:
-        recursive_acls = set([acl for acl in node.acls if acl.is_recursive()])
-        log.info("Recursive Acls:")
-        for acl in recursive_acls:
-            log.info(f"\t {acl}")
-        _update_access_control_recursive(client, recursive_acls, retries=3)
+    def update_acls_recursive(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        recursive_acls: Set[Acl],
+        options: RecursiveOptions,
+    ) -> None:
+        key = f"{client.account_name}/{node.path}"
+        _update_access_control_recursive(client, recursive_acls, options, key)
 
 
 class ProcessorRoot(Processor):
 
     @staticmethod
-    def get_dir_client(node: Node, client: DataLakeServiceClient):
-        """Creates a container if it doesn't exist and returns a file clietn
-        to its root directory."""
+    def get_dir_client(node: Node, clients: ClientCache):
+        """Returns a file client to the root directory of a container."""
         if node.is_root == False:
             raise ValueError("Node is not the root!")
 
-        try:
-            fs_client = client.create_file_system(node.name)
-        except ResourceExistsError:
-            fs_client = client.get_file_system_client(file_system=node.name)
-
-        return fs_client._get_root_directory_client()
+        return clients.directory_client(*node_location(node))
 
     @staticmethod
-    def set_acls(node: Node, client: DataLakeDirectoryClient):
-        super(ProcessorRoot, ProcessorRoot).set_acls(node, client)
-        client.close()
+    def set_acls(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        dry_run: bool = False,
+        coverage: Optional[RecursiveCoverage] = None,
+    ):
+        return super(ProcessorRoot, ProcessorRoot).set_acls(
+            node, client, dry_run, coverage
+        )
 
     @staticmethod
-    def update_acls_recursive(node: Node, client: DataLakeDirectoryClient):
-        super(ProcessorRoot, ProcessorRoot).update_acls_recursive(node, client)
-        client.close()
+    def update_acls_recursive(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        recursive_acls: Set[Acl],
+        options: RecursiveOptions,
+    ):
+        super(ProcessorRoot, ProcessorRoot).update_acls_recursive(
+            node, client, recursive_acls, options
+        )
 
 
 class ProcessorDir(Processor):
 
     @staticmethod
-    def get_dir_client(node: Node, client: DataLakeServiceClient):
-        """Creates a directory, if it doesn't exist and returns a directory
-        client."""
-        folder_client = client.get_file_system_client(file_system=node.get_root().name)
-        dir_client = folder_client.get_directory_client(node.path_in_file_system)
-        dir_client.create_directory()
-
-        return dir_client
+    def get_dir_client(node: Node, clients: ClientCache):
+        """Returns a directory client."""
+        return clients.directory_client(*node_location(node))
 
     @staticmethod
-    def set_acls(node: Node, client: DataLakeDirectoryClient):
-        super(ProcessorDir, ProcessorDir).set_acls(node, client)
+    def set_acls(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        dry_run: bool = False,
+        coverage: Optional[RecursiveCoverage] = None,
+    ):
+        return super(ProcessorDir, ProcessorDir).set_acls(
+            node, client, dry_run, coverage
+        )
 
     @staticmethod
-    def update_acls_recursive(node: Node, client: DataLakeDirectoryClient):
-        super(ProcessorDir, ProcessorDir).update_acls_recursive(node, client)
-        client.close()
+    def update_acls_recursive(
+        node: Node,
+        client: DataLakeDirectoryClient,
+        recursive_acls: Set[Acl],
+        options: RecursiveOptions,
+    ):
+        super(ProcessorDir, ProcessorDir).update_acls_recursive(
+            node, client, recursive_acls, options
+        )
 
 
 def processor_selector(node):
@@ -0,0 +1,55 @@
+import threading
+from enum import Enum
+from typing import Dict, List
+
+from .nodes import Node
+
+
+class Action(Enum):
+    create = "create"
+    update = "update"
+    noop = "no-op"
+    recursive = "recursive"
+    skip = "skip"  # unchanged subtree, skipped as a whole
+    resumed = "resumed"  # done by an interrupted run, see Journal
+
+
+class Plan:
+    """Collects actions on nodes: taken in a run, or to be taken in a dry run.
+    Safe to use from multiple threads."""
+
+    def __init__(self):
+        self.actions: Dict[Action, List[str]] = {action: [] for action in Action}
+        self._paths = {action: set() for action in Action}
+        self.recursive_saved = 0  # recursive sweeps saved by the planner
+        self._lock = threading.Lock()
+
+    def add(self, action: Action, node: Node) -> None:
+        with self._lock:
+            self.actions[action].append(node.path)
+            self._paths[action].add(node.path)
+
+    def add_recursive_saved(self, saved: int) -> None:
+        with self._lock:
+            self.recursive_saved += saved
+
+    def has(self, action: Action, node: Node) -> bool:
+        return node.path in self._paths[action]
+
+    def counts(self) -> Dict[str, int]:
+        return {action.value: len(paths) for action, paths in self.actions.items()}
+
+    def summary(self) -> str:
+        counts = [f"{k}: {v}" for k, v in self.counts().items()]
+        counts.append(f"recursive sweeps saved: {self.recursive_saved}")
+        return ", ".join(counts)
+
+    def report(self) -> str:
+        """Returns a listing of planned actions, unchanged nodes are omitted"""
+        lines = []
+        for action in [Action.create, Action.update, Action.recursive, Action.skip]:
+            for path in self.actions[action]:
+                lines.append(f"{action.value:>9}: {path}")
+        lines.append(f"Plan: {self.summary()}")
+
+        return "\n".join(lines)
@@ -0,0 +1,201 @@
+import logging
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from azure.core import MatchConditions
+
+from .clients import ClientCache, node_location
+from .nodes import (
+    Acl,
+    Node,
+    acls_from_str,
+    acls_to_pushdown,
+    dfs,
+    intern_acls,
+    pushdown_acls,
+)
+from .plan import Action, Plan
+from .recursive import RecursiveCoverage, RecursivePlan, inherited_recursive
+from .state import StateTracker
+
+log = logging.getLogger(__name__)
+
+# Decisions of Orchestrator and AsyncOrchestrator. They take the results of
+# requests to the account and return what to do next, the requests are made
+# (or awaited) by the orchestrators.
+
+
+def parse_acls(acls_str: str, omit_special: bool = False) -> Set[Acl]:
+    """Returns a set of ACLs from a string returned by get_access_control"""
+    acls = acls_from_str(acls_str)
+    if omit_special:
+        acls = intern_acls([acl for acl in acls if not acl.is_special()])
+    return acls
+
+
+def _filter_acls_to_preserve(current_acls: Set[Acl]) -> Set[Acl]:
+    """Determines which ACLs in the current Node should be preserved in the update"""
+    return set([acl for acl in current_acls if acl.is_special()])
+
+
+def acls_to_set(
+    node: Node, current_acls: Set[Acl], inherited: Optional[Dict[Acl, str]] = None
+) -> Set[Acl]:
+    """Returns ACLs from the node extended with current ACLs to preserve.
+    Owner, Owner Group, mask, and other are preserved, they will only change
+    if specified in input. So are entries for a recursive ACL of an ancestor
+    (inherited, see inherited_recursive): they are set by its recursive
+    update, removing them would only revoke access until it runs."""
+    acls_to_preserve = _filter_acls_to_preserve(current_acls)
+    if inherited:
+        acls_to_preserve |= set([acl for acl in current_acls if acl in inherited])
+    node.acls = intern_acls(node.acls | acls_to_preserve)
+
+    return node.acls
+
+
+def acls_differ(current_acls: Set[Acl], new_acls: Set[Acl]) -> bool:
+    """Checks if the new ACLs differ from the current ones, permissions included"""
+    # Same as comparing canonical ACL strings, without sorting
+    return set(map(str, current_acls)) != set(map(str, new_acls))
+
+
+def acls_to_write(
+    node: Node,
+    current_acls: Set[Acl],
+    coverage: Optional[RecursiveCoverage] = None,
+) -> Tuple[Set[Acl], bool]:
+    """Returns the ACLs to set on the node, see acls_to_set, and True if they
+    differ from the current ones. Current ACLs are checked for entries of
+    recursive ACLs in the coverage, if any."""
+    inherited = inherited_recursive(node)
+    if coverage is not None:
+        coverage.check(node, current_acls, inherited)
+    new_acls = acls_to_set(node, current_acls, inherited)
+
+    return new_acls, acls_differ(current_acls, new_acls)
+
+
+def pushdown_unread(node: Node, coverage: Optional[RecursiveCoverage] = None):
+    """Pushes default ACLs of the node from the input down to its children,
+    when its current ACLs are not read: resumed, or created in a dry run. What
+    it misses is unknown, it is marked in the coverage, if any."""
+    pushdown_acls(node, acls_to_pushdown(node))
+    if coverage is not None:
+        coverage.mark(node.path)
+
+
+def is_created_in_plan(plan: Plan, node: Node) -> bool:
+    """In a dry run, a node is created with its parent, without asking"""
+    return node.parent is not None and plan.has(Action.create, node.parent)
+
+
+def node_action(created: bool, changed: bool) -> Action:
+    """Action of the first pass on a node, once its ACLs are set"""
+    if created:
+        return Action.create
+    if changed:
+        return Action.update
+    return Action.noop
+
+
+def known_unchanged(
+    node: Node, tracker: StateTracker, assume_no_drift: bool
+) -> Optional[bool]:
+    """Checks if the subtree is unchanged since the last applied state.
+    Returns None if the current ACLs of the node must be read to tell, then
+    it is unchanged unless tracker.is_drifted."""
+    if not tracker.is_unchanged(node):
+        return False
+    if assume_no_drift:
+        return True
+    return None
+
+
+def recursive_acls_to_apply(
+    node: Node,
+    recursive_plan: RecursivePlan,
+    coverage: Optional[RecursiveCoverage] = None,
+) -> Set[Acl]:
+    """Returns recursive ACLs to apply on the node in the second pass, none
+    if the coverage, if any, finds the subtree already has their entries."""
+    if coverage is not None and coverage.is_covered(node):
+        return set()
+    return recursive_plan.get(node)
+
+
+def create_request(node: Node, clients: ClientCache) -> Optional[Callable]:
+    """Returns the request creating the container of a root node, or the
+    directory of the node. None if it was created or seen earlier in the run.
+    The request raises ResourceExistsError if it exists."""
+    if clients.is_existing(*node_location(node)):
+        return None
+    if node.is_root:
+        return partial(clients.sc.create_file_system, node.name)
+    dir_client = clients.directory_client(*node_location(node))
+    return partial(
+        dir_client.create_directory, match_condition=MatchConditions.IfMissing
+    )
+
+
+def exists_request(node: Node, clients: ClientCache) -> Optional[Callable]:
+    """Returns the request checking if the container of a root node, or the
+    directory of the node exists. None if it was created or seen earlier in
+    the run."""
+    if clients.is_existing(*node_location(node)):
+        return None
+    if node.is_root:
+        return clients.file_system_client(node.name).exists
+    return clients.directory_client(*node_location(node)).exists
+
+
+def prefetch_targets(
+    root: Node, tracker: StateTracker = None
+) -> Tuple[Set[str], List[str]]:
+    """Returns paths in the file system of all directories in the tree, and
+    names of top-level folders to list recursively: the ones with subfolders,
+    except unchanged ones if there is a tracker"""
+    paths = set([node.path_in_file_system for node in dfs(root) if not node.is_root])
+    folders = [
+        node.name
+        for node in root.children
+        if len(node.children) > 0
+        and (tracker is None or not tracker.is_unchanged(node))
+    ]
+
+    return paths, folders
+
+
+def listed_directories(listing: Iterable[Any], paths: Set[str]) -> List[str]:
+    """Returns directories of a get_paths listing which are in paths"""
+    return [path.name for path in listing if path.is_directory and path.name in paths]
+
+
+def folders_to_list(folders: List[str], top_level: List[str]) -> List[str]:
+    """Returns the top-level folders to list recursively which exist"""
+    top_level_names = set(top_level)
+    return [folder for folder in folders if folder in top_level_names]
+
+
+def record_existing(
+    clients: ClientCache, root: Node, existing: List[str], paths: Set[str]
+) -> None:
+    """Records the container of the tree, and the directories of the tree
+    found by the prefetch, as existing"""
+    clients.mark_existing(root.name, "")
+    for path in existing:
+        clients.mark_existing(root.name, path)
+    log.info("Prefetch: %d of %d directories exist", len(existing), len(paths))
+
+
+def log_action(action: Action, node: Node, start: float) -> None:
+    """Logs the action on the node, with structured fields for JSON logs"""
+    latency = time.perf_counter() - start
+    log.info(
+        "%s: %s (%.3f s)",
+        action.value,
+        node.path,
+        latency,
+        extra={"path": node.path, "operation": action.value, "latency": latency},
+    )
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set, Tuple
+
+from .nodes import Acl, Node, bfs
+
+if TYPE_CHECKING:
+    from azure.storage.filedatalake import (
+        AccessControlChangeResult,
+        AccessControlChanges,
+    )
+
+log = logging.getLogger(__name__)
+
+
+class RecursivePlan:
+    """Recursive ACL updates to apply to a tree: {node.path: set of ACLs}.
+    All recursive ACLs of a node are applied in a single recursive update."""
+
+    def __init__(self):
+        self.operations: Dict[str, Set[Acl]] = {}
+        self.requested = 0  # recursive ACLs on nodes, one sweep each
+
+    @property
+    def saved(self) -> int:
+        """Number of recursive sweeps saved by merging and de-duplication"""
+        return self.requested - len(self.operations)
+
+    def get(self, node: Node) -> Set[Acl]:
+        return self.operations.get(node.path, set())
+
+
+class RecursiveCheckpoint:
+    """Continuation tokens of recursive updates in progress, persisted in a
+    JSON file: {key: {"acl": acl string, "continuation": token}}. An update is
+    resumed from its token, only if it is run again with the same ACL string.
+    The entry is removed when the update completes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def get(self, key: str, acl: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None or entry["acl"] != acl:
+            return None
+        return entry["continuation"]
+
+    def save(self, key: str, acl: str, continuation: str) -> None:
+        with self._lock:
+            self._data[key] = {"acl": acl, "continuation": continuation}
+            self._write()
+
+    def done(self, key: str) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._write()
+
+    def _write(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class RecursiveOptions:
+    """Options of recursive updates. batch_size and max_batches are passed to
+    update_access_control_recursive, a recursive update is always run until
+    completion, in as many calls as needed."""
+
+    batch_size: Optional[int] = None
+    max_batches: Optional[int] = None
+    checkpoint: Optional[RecursiveCheckpoint] = None
+
+
+class RecursiveUpdate:
+    """A recursive update of the ACL string on the directory with the key,
+    run until completion. The caller makes the calls to
+    update_access_control_recursive, with kwargs() and progress as the
+    progress hook, and passes each result to advance, until done is set.
+
+    With a checkpoint, the continuation token is saved after every batch under
+    the key, and an interrupted update is resumed from the saved token."""
+
+    def __init__(self, acl: str, options: RecursiveOptions, key: str):
+        self.acl = acl
+        self.options = options
+        self.key = key
+        self.done = False
+        self.continuation = None
+        log.debug("Recursive update of %s: %s", key, acl)
+        if options.checkpoint is not None:
+            self.continuation = options.checkpoint.get(key, acl)
+            if self.continuation is not None:
+                log.info("Resuming recursive update of %s from a checkpoint", key)
+
+    def kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments of the next call, but the progress hook"""
+        return dict(
+            acl=self.acl,
+            continue_on_failure=True,
+            continuation_token=self.continuation,
+            batch_size=self.options.batch_size,
+            max_batches=self.options.max_batches,
+        )
+
+    def progress(self, changes: "AccessControlChanges") -> None:
+        for failure in changes.batch_failures:
+            log.debug(
+                "Failed to update ACLs on %s: %s", failure.name, failure.error_message
+            )
+        checkpoint = self.options.checkpoint
+        if checkpoint is not None and changes.continuation is not None:
+            checkpoint.save(self.key, self.acl, changes.continuation)
+
+    def advance(self, change_result: "AccessControlChangeResult") -> None:
+        failure_count = change_result.counters.failure_count
+        if failure_count > 0:
+            log.warning(
+                "Recursive update of %s: failed on %d path(s)", self.key, failure_count
+            )
+        self.continuation = change_result.continuation
+        if self.continuation is None:
+            self.done = True
+            if self.options.checkpoint is not None:
+                self.options.checkpoint.done(self.key)
+
+
+class RecursiveCoverage:
+    """Directories of a tree whose current ACLs miss an entry of a recursive
+    ACL applying to them (of the directory or of an ancestor), and their
+    ancestors. With lazy recursive updates, a recursive update of a directory
+    is only run if it is one of them. Only directories of the tree are
+    checked, in the first pass."""
+
+    def __init__(self):
+        self._paths = set()
+        self._lock = threading.Lock()
+
+    def check(
+        self, node: Node, current_acls: Set[Acl], inherited: Dict[Acl, str]
+    ) -> None:
+        """Marks the node if its current ACLs miss a recursive entry"""
+        entries = dict(inherited)
+        entries.update([(acl, str(acl)) for acl in node.acls if acl.is_recursive()])
+        current = set(map(str, current_acls))
+        if any([entry not in current for entry in entries.values()]):
+            self.mark(node.path)
+
+    def mark(self, path: str) -> None:
+        """Marks the directory and its ancestors, e.g. when its ACLs are not
+        known: created in a dry run, or failed"""
+        with self._lock:
+            while path and path not in self._paths:
+                self._paths.add(path)
+                path = path.rpartition("/")[0]
+
+    def is_covered(self, node: Node) -> bool:
+        return node.path not in self._paths
+
+
+def inherited_recursive(node: Node) -> Dict[Acl, str]:
+    """Returns entries the ancestors of the node apply recursively:
+    {acl: str(acl)}, by scope, type and id (as Acl instances are
+    compared). The entry of the nearest ancestor wins, its recursive update
+    runs last."""
+    inherited = {}
+    parent = node.parent
+    while parent is not None:
+        for acl in parent.acls:
+            if acl.is_recursive():
+                inherited.setdefault(acl, str(acl))
+        parent = parent.parent
+    return inherited
+
+
+def plan_recursive(root: Node) -> RecursivePlan:
+    """Plans recursive updates of the tree. An ACL is dropped from a node, if
+    an ancestor applies the same entry (with the same permissions) recursively,
+    as the recursive update of the ancestor has already covered the subtree.
+    Must be called after the first pass, when default ACLs are pushed down."""
+    plan = RecursivePlan()
+    # Entries applied recursively by the ancestors of a node: {key: str(acl)}
+    covered = {root.path: {}}
+    for node in bfs(root):
+        acls = set([acl for acl in node.acls if acl.is_recursive()])
+        plan.requested += len(acls)
+        node_covered = covered.pop(node.path)
+        acls_to_apply = set(
+            [acl for acl in acls if node_covered.get(_key(acl)) != str(acl)]
+        )
+        if len(acls_to_apply) > 0:
+            plan.operations[node.path] = acls_to_apply
+            node_covered = dict(node_covered)
+            node_covered.update([(_key(acl), str(acl)) for acl in acls_to_apply])
+        for child_node in node.children:
+            covered[child_node.path] = node_covered
+
+    if plan.saved > 0:
+        log.info("Recursive updates: %d sweep(s) saved", plan.saved)
+
+    return plan
+
+
+def _key(acl: Acl) -> Tuple:
+    return (acl.scope, acl.p_type, acl.oid)
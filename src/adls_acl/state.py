@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from .nodes import Acl, Node, acls_to_str, dfs
+
+log = logging.getLogger(__name__)
+
+
+class StateCache:
+    """Last applied state of nodes, persisted in a JSON file:
+    {account: {container: {path_in_file_system: {"acl": hash, "subtree": hash}}}}
+
+    "acl" is the hash of the ACL string last set on (or read from) the directory,
+    "subtree" is a Merkle-style hash of the input config of the node and all
+    nodes below it. The root directory of a container has an empty path."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def get(self, account: str, container: str, path: str) -> Optional[Dict]:
+        return self._data.get(account, {}).get(container, {}).get(path)
+
+    def set(self, account: str, container: str, path: str, entry: Dict) -> None:
+        with self._lock:
+            containers = self._data.setdefault(account, {})
+            containers.setdefault(container, {})[path] = entry
+
+    def save(self) -> None:
+        """Writes the state to a temporary file first, the state file is
+        replaced only by a complete one."""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.path)
+
+    def tracker(self, account: str, root: Node) -> "StateTracker":
+        return StateTracker(self, account, root)
+
+
+class StateTracker:
+    """Compares a tree from the input with the state cache and collects the
+    state to record, during a single run of process_tree on the tree."""
+
+    def __init__(self, cache: StateCache, account: str, root: Node):
+        self.cache = cache
+        self.account = account
+        self.container = root.name
+        self.root = root
+        self.subtree_hashes = subtree_hashes(root)
+        self._applied = {}
+
+    def is_unchanged(self, node: Node) -> bool:
+        """Checks if the config of the subtree is the same as last applied"""
+        entry = self.cache.get(self.account, self.container, _state_key(node))
+        return entry is not None and entry["subtree"] == self.subtree_hashes[node.path]
+
+    def is_drifted(self, node: Node, current_acls: Set[Acl]) -> bool:
+        """Checks if the ACLs in the account differ from the last applied"""
+        entry = self.cache.get(self.account, self.container, _state_key(node))
+        return entry is None or entry["acl"] != _hash(acls_to_str(current_acls))
+
+    def applied(self, node: Node) -> None:
+        """Registers that the ACLs on the node are set as in node.acls"""
+        self._applied[node.path] = _hash(node.acl_str)
+
+    def commit(self, failures: Iterable[str]) -> None:
+        """Records nodes in the cache. Nodes with a failure in their subtree
+        (or not processed at all) are not recorded."""
+        tainted = set()
+        for path in failures:
+            parts = path.split("/")
+            tainted.update(["/".join(parts[:i]) for i in range(1, len(parts) + 1)])
+
+        for node in dfs(self.root):
+            if node.path in tainted or node.path not in self._applied:
+                continue
+            entry = {
+                "acl": self._applied[node.path],
+                "subtree": self.subtree_hashes[node.path],
+            }
+            self.cache.set(self.account, self.container, _state_key(node), entry)
+
+
+def subtree_hashes(root: Node) -> Dict[str, str]:
+    """Returns a Merkle-style hash of the config of every subtree of the tree:
+    {node.path: hash}. The hash of a node covers its ACLs (including default
+    ACLs inherited from the parents, and the recursive flag) and the names and
+    hashes of its children."""
+    inherited = {root.path: set()}
+    nodes = []
+    for node in dfs(root):
+        nodes.append(node)
+        acls = set(node.acls)
+        acls.update(inherited[node.path])
+        inherited[node.path] = acls
+        for child_node in node.children:
+            inherited[child_node.path] = set([acl for acl in acls if acl.is_default()])
+
+    hashes = {}
+    for node in reversed(nodes):
+        acls = inherited[node.path]
+        recursive = [acl for acl in acls if acl.is_recursive()]
+        children = sorted([(x.name, hashes[x.path]) for x in node.children])
+        hashes[node.path] = _hash(
+            "|".join(
+                [acls_to_str(acls), acls_to_str(recursive)]
+                + [f"{name}:{h}" for name, h in children]
+            )
+        )
+
+    return hashes
+
+
+def _state_key(node: Node) -> str:
+    return "" if node.is_root else node.path_in_file_system
+
+
+def _hash(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
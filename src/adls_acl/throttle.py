@@ -0,0 +1,148 @@
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from azure.core.pipeline.transport import HttpTransport, RequestsTransport
+
+log = logging.getLogger(__name__)
+
+# Responses of an account over its request rate or bandwidth limits
+THROTTLED_STATUSES = (429, 503)
+# Settings the storage SDK makes its own transport with (see its
+# _shared/constants.py), when a transport is passed in it is used instead
+CONNECTION_TIMEOUT = 20
+READ_TIMEOUT = 60
+DATA_BLOCK_SIZE = 256 * 1024
+
+
+@dataclass
+class ThrottleOptions:
+    """Options of the requests to an account. With adaptive, the number of
+    requests in flight is limited when the account starts throttling, see
+    Throttle. max_tps is a budget of requests per second."""
+
+    adaptive: bool = True
+    max_tps: Optional[float] = None
+
+
+class Throttle:
+    """Schedules requests to an account, AIMD-style. Safe to use from
+    multiple threads.
+
+    The limit of requests in flight is unbounded until a request is throttled
+    (429 or 503), then it is cut to half of the requests in flight, at most
+    once per decrease_interval. It grows by one per round of successful
+    requests, while it is reached and the latency stays within
+    latency_tolerance of the lowest latency seen. Requests waiting for a
+    retry don't count as in flight."""
+
+    decrease_factor = 0.5
+    decrease_interval = 1.0  # seconds
+    latency_tolerance = 2.0
+    latency_weight = 0.1  # of a new request in the moving average
+
+    def __init__(self, options: ThrottleOptions):
+        self.options = options
+        self.limit = math.inf
+        self.in_flight = 0
+        self.throttled = 0  # throttled responses
+        self._cond = threading.Condition()
+        self._decreased_at = -math.inf
+        self._next_send = 0.0
+        self._latency = None  # moving average of successful requests
+        self._min_latency = math.inf
+
+    def acquire(self) -> None:
+        """Waits for a free slot and, with max_tps, for the turn of the request"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight + 1 <= self.limit)
+            self.in_flight += 1
+            if self.options.max_tps is None:
+                return
+            now = time.monotonic()
+            send_at = max(now, self._next_send)
+            self._next_send = send_at + 1 / self.options.max_tps
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def release(self, status: Optional[int], latency: float) -> None:
+        """Frees the slot of a request, with the status of its response (None
+        if it failed without one) and its latency in seconds"""
+        with self._cond:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if status in THROTTLED_STATUSES:
+                self.throttled += 1
+                self._decrease(in_flight)
+            elif status is not None:
+                self._increase(in_flight, latency)
+            self._cond.notify_all()
+
+    def _decrease(self, in_flight: int) -> None:
+        now = time.monotonic()
+        if (
+            not self.options.adaptive
+            or now - self._decreased_at < self.decrease_interval
+        ):
+            return
+        limit = max(1.0, min(self.limit, in_flight) * self.decrease_factor)
+        log.info(
+            "Throttled by the account, requests in flight: %d -> %.0f", in_flight, limit
+        )
+        self.limit = limit
+        self._decreased_at = now
+
+    def _increase(self, in_flight: int, latency: float) -> None:
+        if self._latency is None:
+            self._latency = latency
+        else:
+            w = self.latency_weight
+            self._latency = (1 - w) * self._latency + w * latency
+        self._min_latency = min(self._min_latency, self._latency)
+        if not self.options.adaptive or in_flight + 1 <= self.limit:
+            return  # the limit was not reached, no need for more
+        if self._latency <= self.latency_tolerance * self._min_latency:
+            self.limit += 1 / self.limit
+
+
+class ThrottledTransport(HttpTransport):
+    """HTTP transport sending every request, retries included, through the
+    throttle. Pass it to a service client, clients derived from it share it.
+    By default, requests are sent with the timeouts of the storage SDK."""
+
+    def __init__(self, throttle: Throttle, transport: Optional[HttpTransport] = None):
+        self.throttle = throttle
+        if transport is None:
+            transport = RequestsTransport(
+                connection_timeout=CONNECTION_TIMEOUT,
+                read_timeout=READ_TIMEOUT,
+                connection_data_block_size=DATA_BLOCK_SIZE,
+            )
+        self._transport = transport
+
+    def __enter__(self) -> "ThrottledTransport":
+        self._transport.__enter__()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._transport.__exit__(*args)
+
+    def open(self) -> None:
+        self._transport.open()
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def send(self, request: Any, **kwargs: Any) -> Any:
+        self.throttle.acquire()
+        start = time.monotonic()
+        status = None
+        try:
+            response = self._transport.send(request, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self.throttle.release(status, time.monotonic() - start)
@@ -0,0 +1,96 @@
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, ContextManager, Dict, Iterator, Optional
+
+# Spans are only made while a tracer is set, see set_tracer
+_tracer = None
+_NO_SPAN = nullcontext()
+
+
+def set_tracer(tracer: Optional[Any]) -> None:
+    """Sets the tracer spans are made with: a SpanRecorder, an
+    OpenTelemetryTracer, or any object with a span(name, attributes) method
+    returning a context manager. None disables tracing."""
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, **attributes: Any) -> ContextManager:
+    """Returns a context manager timing the block as a span of the current
+    tracer, a child of the span it runs in. Without a tracer, it does
+    nothing."""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, attributes)
+
+
+# Id of the span the code runs in, threads of the executor run in a copy of
+# the context of the caller, see executor._submit
+_current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+
+
+class SpanRecorder:
+    """Writes spans to a file, a JSON object per line, when they end:
+    {"id": ..., "parent": id or null, "name": ..., "start": seconds,
+    "duration": seconds, "thread": name, "error": exception type (only if
+    the block raised), **attributes}. start is relative to the creation of
+    the recorder. Safe to use from multiple threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, attributes: Dict[str, Any]) -> Iterator[None]:
+        span_id = next(self._ids)
+        parent = _current_span.get()
+        token = _current_span.set(span_id)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _current_span.reset(token)
+            record = {
+                "id": span_id,
+                "parent": parent,
+                "name": name,
+                "start": start - self._start,
+                "duration": duration,
+                "thread": threading.current_thread().name,
+            }
+            if error is not None:
+                record["error"] = error
+            record.update(attributes)
+            line = json.dumps(record) + "\n"
+            with self._lock:
+                self._file.write(line)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetryTracer:
+    """Makes spans with OpenTelemetry (the opentelemetry-api package), they
+    are exported by the tracer provider set up by the application, e.g. with
+    opentelemetry-instrument. Raises ImportError if it is not installed."""
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        self._tracer = trace.get_tracer("adls_acl")
+
+    def span(self, name: str, attributes: Dict[str, Any]) -> ContextManager:
+        return self._tracer.start_as_current_span(name, attributes=attributes)
@@ -0,0 +1,48 @@
+from typing import Iterable, Set, TextIO, Tuple
+
+import yaml
+
+from .nodes import Acl
+
+
+def dump_account(
+    out: TextIO,
+    account_name: str,
+    directories: Iterable[Tuple[str, str, Set[Acl]]],
+) -> None:
+    """Writes the account to out as YAML, in the format of the input file,
+    one directory at a time. directories are (container, path in the file
+    system, ACLs) in depth-first pre-order, the root directory of a container
+    first, with an empty path. Nothing but the last depth is kept, so memory
+    doesn't grow with the size of the account."""
+    _write_block(out, {"account": account_name}, "", "")
+
+    last_depth = None
+    for container, path, acls in directories:
+        depth = 0 if path == "" else path.count("/") + 1
+        if last_depth is None:
+            out.write("containers:\n")
+        elif depth == last_depth + 1:
+            # The previous directory is the parent
+            out.write(f"{'  ' * last_depth}  folders:\n")
+
+        name = container if path == "" else path.rpartition("/")[2]
+        folder = {
+            "name": name,
+            "acls": [acl.to_yaml() for acl in sorted(acls, key=Acl.sort_key)],
+        }
+        indent = "  " * depth
+        _write_block(out, folder, f"{indent}- ", f"{indent}  ")
+        last_depth = depth
+
+    if last_depth is None:
+        out.write("containers: []\n")
+
+
+def _write_block(out: TextIO, data: dict, first_prefix: str, prefix: str) -> None:
+    """Writes data as a YAML block, the first line prefixed with first_prefix
+    and the following ones with prefix"""
+    lines = yaml.dump(data, sort_keys=False, indent=2).splitlines()
+    out.write(f"{first_prefix}{lines[0]}\n")
+    for line in lines[1:]:
+        out.write(f"{prefix}{line}\n")
@@ -0,0 +1,133 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from azure.storage.filedatalake import (
+    AccessControlChangeCounters,
+    AccessControlChangeResult,
+)
+
+from adls_acl import aio
+from adls_acl.nodes import Acl, Node
+
+
+def _change_result(continuation=None, failure_count=0):
+    return AccessControlChangeResult(
+        counters=AccessControlChangeCounters(
+            directories_successful=1, files_successful=1, failure_count=failure_count
+        ),
+        continuation=continuation,
+    )
+
+
+@pytest.fixture
+def mock_client():
+    """Mock async DataLakeDirectoryClient"""
+    mock_client = AsyncMock()
+    mock_client.get_access_control.return_value = {"acl": "user::rwx,user:xxxx:rwx"}
+    mock_client.update_access_control_recursive.return_value = _change_result()
+
+    return mock_client
+
+
+@pytest.fixture
+def mock_service_client(mocker, mock_client):
+    """Mock async DataLakeServiceClient returning mock_client for every dir"""
+    sc = MagicMock()
+    sc.create_file_system = AsyncMock(return_value=sc)
+    sc.exists = AsyncMock(return_value=True)
+    sc.close = AsyncMock()
+    sc.credential.close = AsyncMock()
+    sc.get_file_system_client.return_value = sc
+    sc._get_root_directory_client.return_value = mock_client
+    sc.get_directory_client.return_value = mock_client
+    mocker.patch("adls_acl.aio.get_async_service_client", return_value=sc)
+
+    return sc
+
+
+@pytest.fixture
+def test_tree():
+    root = Node("root")
+    root.add_acl(Acl.from_str("default:group:yyyy:r-x"))
+    for i in range(3):
+        child = Node(f"dir{i}", root)
+        child.add_acl(Acl("user", "zzzz", "rwx", recursive=True))
+
+    return root
+
+
+def test__get_current_acls(mock_client):
+    current_acls = asyncio.run(aio._get_current_acls(mock_client, True))
+
+    assert current_acls == {Acl.from_str("user:xxxx:rwx")}
+
+
+def test_process_tree(mock_service_client, mock_client, test_tree):
+    async def run():
+        async with aio.AsyncOrchestrator("test", concurrency=2) as o:
+            return await o.process_tree(test_tree)
+
+    failures = asyncio.run(run())
+
+    assert failures == {}
+    assert mock_client.create_directory.await_count == 3
+    assert mock_client.update_access_control_recursive.await_count == 3
+    assert Acl.from_str("default:group:yyyy:r-x") in test_tree.children[0].acls
+    mock_service_client.close.assert_awaited_once()
+
+
+def test_process_tree_failure(mock_service_client, mock_client, test_tree):
+    mock_client.create_directory.side_effect = [None, RuntimeError("boom"), None]
+
+    async def run():
+        async with aio.AsyncOrchestrator("test") as o:
+            return await o.process_tree(test_tree)
+
+    failures = asyncio.run(run())
+
+    assert len(failures) == 1
+    assert mock_client.update_access_control_recursive.await_count == 2
+
+
+def test_process_tree_dry_run(mock_service_client, mock_client, test_tree):
+    async def run():
+        async with aio.AsyncOrchestrator("test", dry_run=True) as o:
+            failures = await o.process_tree(test_tree)
+            return failures, o.plan
+
+    failures, plan = asyncio.run(run())
+
+    assert failures == {}
+    assert plan.counts() == {
+        "create": 0,
+        "update": 4,
+        "no-op": 0,
+        "recursive": 3,
+        "skip": 0,
+        "resumed": 0,
+    }
+    mock_client.set_access_control.assert_not_awaited()
+    mock_client.update_access_control_recursive.assert_not_awaited()
+
+
+def test_process_tree_prefetch(mock_service_client, mock_client, test_tree):
+    async def get_paths(path, recursive):
+        for name in ["dir0", "dir2", "other"]:
+            path = MagicMock(is_directory=True)
+            path.name = name
+            yield path
+
+    mock_service_client.get_paths = MagicMock(side_effect=get_paths)
+
+    async def run():
+        async with aio.AsyncOrchestrator("test") as o:
+            return await o.process_tree(test_tree)
+
+    failures = asyncio.run(run())
+
+    assert failures == {}
+    # Top-level folders have no subfolders, a single listing is enough
+    mock_service_client.get_paths.assert_called_once_with(path=None, recursive=False)
+    mock_service_client.create_file_system.assert_not_awaited()
+    assert mock_client.create_directory.await_count == 1
@@ -1,5 +1,12 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import azure.identity
 import pytest
+from azure.core.credentials import AccessToken
 from adls_acl import auth as a
 
 import azure.storage.filedatalake
@@ -22,3 +29,156 @@ def test_token_credential_strategy_default():
 def test_token_credential_strategy_err():
     with pytest.raises(ValueError):
         _ = a.token_credential_strategy("WRONG")
+
+
+def test_get_service_client_shared_credential():
+    credential = a.get_credential("default")
+    sc_one = a.get_service_client("one", "default", credential=credential)
+    sc_two = a.get_service_client("two", "default", credential=credential)
+
+    assert sc_one.credential is credential
+    assert sc_two.credential is credential
+
+
+class FakeCredential:
+    """Stand-in for an azure.identity credential, counts token acquisitions"""
+
+    def __init__(self, lifetime=3600):
+        self.lifetime = lifetime
+        self.acquired = 0
+        self.closed = False
+
+    def get_token(self, *scopes, **kwargs):
+        self.acquired += 1
+        return AccessToken(f"token{self.acquired}", int(time.time()) + self.lifetime)
+
+    def close(self):
+        self.closed = True
+
+
+SCOPE = "https://storage.azure.com/.default"
+
+
+def test_cached_credential_single_acquisition():
+    fake = FakeCredential()
+    credential = a.CachedCredential(lambda: fake)
+
+    def get_token(_):
+        return credential.get_token(SCOPE).token
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(executor.map(get_token, range(32)))
+    credential.close()
+
+    assert fake.acquired == 1
+    assert set(tokens) == {"token1"}
+    assert fake.closed
+
+
+def test_cached_credential_file(tmp_path):
+    cache_path = str(tmp_path / "tokens.json")
+    first, second, other = FakeCredential(), FakeCredential(), FakeCredential()
+
+    credential = a.CachedCredential(lambda: first, cache_path, cache_key="key")
+    assert credential.get_token(SCOPE).token == "token1"
+    credential.close()
+    # A later run with the same key: no acquisition, not even a credential
+    credential = a.CachedCredential(lambda: second, cache_path, cache_key="key")
+    assert credential.get_token(SCOPE).token == "token1"
+    credential.close()
+    credential = a.CachedCredential(lambda: other, cache_path, cache_key="other")
+    credential.get_token(SCOPE)
+    credential.close()
+
+    assert (first.acquired, second.acquired, other.acquired) == (1, 0, 1)
+    assert os.stat(cache_path).st_mode & 0o777 == 0o600
+
+
+def test_cached_credential_expired_in_file(tmp_path):
+    cache_path = str(tmp_path / "tokens.json")
+    expired = FakeCredential(lifetime=-1)
+    a.CachedCredential(lambda: expired, cache_path).get_token(SCOPE)
+
+    fake = FakeCredential()
+    credential = a.CachedCredential(lambda: fake, cache_path)
+    credential.get_token(SCOPE)
+    credential.close()
+
+    assert fake.acquired == 1
+
+
+def test_cached_credential_background_refresh(mocker):
+    mocker.patch.object(a.CachedCredential, "min_refresh_interval", 0.01)
+    fake = FakeCredential(lifetime=2)
+    credential = a.CachedCredential(lambda: fake, refresh_margin=1.9)
+
+    credential.get_token(SCOPE)
+    deadline = time.time() + 5
+    while fake.acquired < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    credential.close()
+
+    assert fake.acquired >= 2
+
+
+def test_cached_credential_refresh_without_lock(mocker):
+    mocker.patch.object(a.CachedCredential, "min_refresh_interval", 0.01)
+    fake = FakeCredential(lifetime=3600)
+    credential = a.CachedCredential(lambda: fake, refresh_margin=3599.9)
+    token = credential.get_token(SCOPE)
+    refreshing, release = threading.Event(), threading.Event()
+
+    def get_token(*scopes, **kwargs):
+        refreshing.set()
+        release.wait(5)
+        return AccessToken("refreshed", int(time.time()) + 3600)
+
+    fake.get_token = get_token
+    assert refreshing.wait(5)
+    # The current token is returned while the refresh is in progress
+    start = time.time()
+    assert credential.get_token(SCOPE) is token
+    assert time.time() - start < 1
+    release.set()
+    credential.close()
+
+    assert credential.get_token(SCOPE).token == "refreshed"
+
+
+def test_get_credential_key():
+    default = a.get_credential("default")
+    with_options = a.get_credential("default", managed_identity_client_id="x")
+
+    assert isinstance(default, a.CachedCredential)
+    assert default.cache_key != with_options.cache_key
+    assert "x" not in with_options.cache_key
+
+
+def _cli_profile(path, user):
+    subscriptions = [
+        {"isDefault": False, "tenantId": "t0", "user": {"name": "other"}},
+        {"isDefault": True, "tenantId": "t1", "user": {"name": user}},
+    ]
+    # The Azure CLI writes it with a byte order mark
+    path.write_text(json.dumps({"subscriptions": subscriptions}), encoding="utf-8-sig")
+
+
+def test_get_credential_key_identity(monkeypatch, tmp_path):
+    monkeypatch.setenv("AZURE_CONFIG_DIR", str(tmp_path))
+    for name in a._IDENTITY_VARIABLES:
+        monkeypatch.delenv(name, raising=False)
+    assert a._cli_account() is None
+    profile = tmp_path / "azureProfile.json"
+    _cli_profile(profile, "first@example.com")
+    assert a._cli_account() == ["t1", "first@example.com"]
+    cli = a.get_credential("azurecli").cache_key
+    environment = a.get_credential("environment").cache_key
+
+    # Logged in as another user in the Azure CLI
+    _cli_profile(profile, "second@example.com")
+    assert a.get_credential("azurecli").cache_key != cli
+    assert a.get_credential("environment").cache_key == environment
+
+    # Another service principal
+    monkeypatch.setenv("AZURE_CLIENT_ID", "other")
+    assert a.get_credential("environment").cache_key != environment
@@ -0,0 +1,81 @@
+import pytest
+
+from adls_acl import batch as b
+
+
+def test_config_paths(tmp_path):
+    (tmp_path / "b.yml").write_text("")
+    (tmp_path / "a.yaml").write_text("")
+    (tmp_path / "notes.txt").write_text("")
+    (tmp_path / "sub.yml").mkdir()
+    other = tmp_path / "other.yml"
+    other.write_text("")
+
+    assert b.config_paths([str(tmp_path / "sub.yml"), str(other)]) == [str(other)]
+    assert b.config_paths([str(tmp_path)]) == [
+        str(tmp_path / "a.yaml"),
+        str(tmp_path / "b.yml"),
+        str(other),
+    ]
+
+
+@pytest.fixture
+def mock_get_service_client(mocker):
+    def get_service_client(account_name, auth_method, credential=None, transport=None):
+        sc = mocker.MagicMock()
+        dc = sc.get_file_system_client.return_value.get_directory_client.return_value
+        dc.get_access_control.return_value = {"acl": "user::rwx"}
+        sc.get_file_system_client.return_value._get_root_directory_client.return_value = (
+            dc
+        )
+        return sc
+
+    return mocker.patch(
+        "adls_acl.orchestrator.get_service_client", side_effect=get_service_client
+    )
+
+
+def _config(account, containers):
+    return {
+        "account": account,
+        "containers": [
+            {
+                "name": name,
+                "acls": [],
+                "folders": [{"name": "dir", "acls": []}],
+            }
+            for name in containers
+        ],
+    }
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_batch(mocker, mock_get_service_client, workers):
+    credential = mocker.MagicMock()
+    configs = [
+        _config("one", ["c1", "c2"]),
+        _config("two", ["c1"]),
+        _config("one", ["c3"]),
+    ]
+
+    results = b.run_batch(configs, credential, workers=workers, prefetch=False)
+
+    assert sorted(results) == ["one", "two"]
+    assert mock_get_service_client.call_count == 2
+    for call in mock_get_service_client.call_args_list:
+        assert call.kwargs["credential"] is credential
+    assert results["one"].failures == {}
+    assert results["one"].plan.counts()["create"] == 6
+    assert results["two"].plan.counts()["create"] == 2
+
+
+def test_run_batch_failures(mocker, mock_get_service_client):
+    configs = [_config("one", ["c1"]), _config("two", ["c1"])]
+    mock_get_service_client.side_effect = None
+    sc = mock_get_service_client.return_value
+    sc.create_file_system.side_effect = RuntimeError("boom")
+
+    results = b.run_batch(configs, mocker.MagicMock(), prefetch=False)
+
+    assert list(results["one"].failures) == ["c1"]
+    assert list(results["two"].failures) == ["c1"]
@@ -0,0 +1,123 @@
+import json
+import os
+import pstats
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+from adls_acl import tracing
+from adls_acl.cli import cli
+
+# Generous, importing adls_acl.cli takes well under 100 ms without the Azure SDK
+IMPORT_BUDGET_US = 300_000
+
+
+def _import_times(*args):
+    """Runs the CLI with -X importtime, returns {module: cumulative µs}"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    code = f"from adls_acl.cli import cli; cli({list(args)!r})"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["--help"], ["set-acl", "--help"], ["batch", "--help"], ["compile", "--help"]],
+)
+def test_help_does_not_import_azure(args):
+    times = _import_times(*args)
+
+    assert "adls_acl.cli" in times
+    assert [m for m in times if m.startswith("azure")] == []
+    assert "adls_acl.orchestrator" not in times
+    assert times["adls_acl.cli"] < IMPORT_BUDGET_US
+
+
+def _config_file(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text(
+        "account: account\ncontainers:\n  - name: container\n    acls: []\n",
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def test_trace_and_profile(tmp_path):
+    trace_file, profile_file = tmp_path / "spans.jsonl", tmp_path / "run.prof"
+    args = ["--silent", "--trace-file", str(trace_file), "--profile", str(profile_file)]
+    args += ["compile", _config_file(tmp_path), str(tmp_path / "plan.json")]
+
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == 0, result.output
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["parse_config", "build_trees"]
+    assert pstats.Stats(str(profile_file)).total_calls > 0
+    assert tracing._tracer is None
+
+
+def test_otel_not_installed(tmp_path, mocker):
+    mocker.patch.dict(sys.modules, {"opentelemetry": None})
+    args = ["--silent", "--otel", "compile", _config_file(tmp_path), "plan.json"]
+
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == 2
+    assert "pip install adls-acl[otel]" in result.output
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        ([], 100),
+        (["--concurrency", "8"], 8),
+    ],
+)
+def test_set_acl_async_concurrency(tmp_path, mocker, args, expected):
+    from adls_acl import aio
+
+    mocker.patch.object(aio, "get_async_service_client")
+    init = mocker.spy(aio.AsyncOrchestrator, "__init__")
+    mocker.patch.object(aio.AsyncOrchestrator, "__aenter__")
+    mocker.patch.object(aio.AsyncOrchestrator, "__aexit__", return_value=False)
+    mocker.patch.object(aio.AsyncOrchestrator, "process_tree", return_value={})
+    args = ["--silent", "set-acl", _config_file(tmp_path), "--engine", "async"] + args
+
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == 0, result.output
+    (o,) = [call.args[0] for call in init.call_args_list]
+    assert o._semaphore._value == expected
+
+
+@pytest.mark.parametrize("command", ["set-acl", "batch"])
+def test_plan_keeps_journal(tmp_path, mocker, command):
+    from adls_acl import batch, orchestrator
+
+    mocker.patch.object(orchestrator, "get_service_client")
+    mocker.patch.object(orchestrator.Orchestrator, "process_tree", return_value={})
+    mocker.patch("adls_acl.cli.get_credential")
+    mocker.patch.object(batch, "run_batch", return_value={})
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text('{"step": "first"}\n', encoding="utf-8")
+    args = ["--silent", command, _config_file(tmp_path), "--plan"]
+
+    result = CliRunner().invoke(cli, args + ["--journal", str(journal)])
+
+    assert result.exit_code == 0, result.output
+    assert journal.read_text(encoding="utf-8") == '{"step": "first"}\n'
@@ -0,0 +1,67 @@
+import pytest
+
+from adls_acl.clients import ClientCache, node_location
+from adls_acl.nodes import Node
+
+
+@pytest.fixture
+def mock_service_client(mocker):
+    sc = mocker.MagicMock()
+    sc.get_file_system_client.side_effect = lambda file_system: mocker.MagicMock(
+        name=file_system
+    )
+    return sc
+
+
+def test_file_system_client(mock_service_client):
+    clients = ClientCache(mock_service_client)
+
+    assert clients.file_system_client("a") is clients.file_system_client("a")
+    assert clients.file_system_client("a") is not clients.file_system_client("b")
+    assert mock_service_client.get_file_system_client.call_count == 2
+
+
+def test_directory_client(mock_service_client):
+    clients = ClientCache(mock_service_client)
+    fc = clients.file_system_client("a")
+
+    assert clients.directory_client("a", "") is fc._get_root_directory_client()
+    assert clients.directory_client("a", "x/y") is clients.directory_client("a", "x/y")
+    fc.get_directory_client.assert_called_once_with("x/y")
+
+
+def test_directory_client_lru(mock_service_client):
+    clients = ClientCache(mock_service_client, max_dir_clients=2)
+    fc = clients.file_system_client("a")
+    fc.get_directory_client.side_effect = lambda path: path
+
+    clients.directory_client("a", "x")
+    clients.directory_client("a", "y")
+    clients.directory_client("a", "x")
+    clients.directory_client("a", "z")  # evicts y, the least recently used
+    clients.directory_client("a", "x")
+    clients.directory_client("a", "y")
+
+    assert [c.args[0] for c in fc.get_directory_client.call_args_list] == [
+        "x",
+        "y",
+        "z",
+        "y",
+    ]
+
+
+def test_existing(mock_service_client):
+    clients = ClientCache(mock_service_client)
+
+    assert not clients.is_existing("a", "x")
+    clients.mark_existing("a", "x")
+    assert clients.is_existing("a", "x")
+    assert not clients.is_existing("b", "x")
+
+
+def test_node_location():
+    root = Node("container")
+    child = Node("child", Node("parent", root))
+
+    assert node_location(root) == ("container", "")
+    assert node_location(child) == ("container", "parent/child")
@@ -0,0 +1,121 @@
+import io
+
+import pytest
+
+from adls_acl import compiler as c
+from adls_acl.nodes import Acl, Node
+
+
+@pytest.fixture
+def tree():
+    root = Node("container")
+    root.add_acl(Acl.from_str("default:user:xxxx:r-x"))
+    root.add_acl(Acl("group", "gggg", "r-x", recursive=True))
+    a = Node("a", root)
+    Node("a1", a).add_acl(Acl("group", "gggg", "rwx", recursive=True))
+    b = Node("b", root)
+    b.add_acl(Acl("user", "yyyy", "rwx", recursive=True))
+    Node("b1", b)
+    Node("c", root)
+
+    return root
+
+
+def _ops(plan, op_type):
+    return [(op.path, op.acl) for op in plan.operations if op.op == op_type]
+
+
+def test_compile_trees(tree):
+    plan = c.compile_trees("account", [tree])
+
+    assert plan.account == "account"
+    creates = [path for path, _ in _ops(plan, c.OpType.create)]
+    assert creates[0] == ""
+    assert sorted(creates) == ["", "a", "a/a1", "b", "b/b1", "c"]
+    set_acls = dict(_ops(plan, c.OpType.set_acl))
+    # Default ACLs are pushed down
+    assert set_acls["b/b1"] == "default:user:xxxx:r-x"
+    assert _ops(plan, c.OpType.recursive) == [
+        ("", "group:gggg:r-x"),
+        ("b", "user:yyyy:rwx"),
+        ("a/a1", "group:gggg:rwx"),
+    ]
+
+
+def test_compile_trees_deps(tree):
+    plan = c.compile_trees("account", [tree])
+    ops = {(op.op, op.path): op for op in plan.operations}
+
+    for op in plan.operations:
+        assert all([dep < op.id for dep in op.deps])
+    assert ops[(c.OpType.create, "a/a1")].deps == [ops[(c.OpType.create, "a")].id]
+    assert ops[(c.OpType.recursive, "b")].deps == [ops[(c.OpType.set_acl, "b")].id]
+    # Runs after the ACLs of its subtree are set, by the order of the plan
+    assert ops[(c.OpType.recursive, "b")].id > ops[(c.OpType.set_acl, "b/b1")].id
+    # The same entry as a recursive update of the root, which it overrides
+    assert ops[(c.OpType.recursive, "")].id in ops[(c.OpType.recursive, "a/a1")].deps
+
+
+def test_compile_trees_deps_wide():
+    root = Node("container")
+    root.add_acl(Acl("group", "gggg", "r-x", recursive=True))
+    for i in range(100):
+        Node(f"d{i}", Node(f"d{i}", root))
+
+    plan = c.compile_trees("account", [root])
+
+    (op,) = [op for op in plan.operations if op.op == c.OpType.recursive]
+    assert len(op.deps) == 1
+
+
+def test_stages(tree):
+    plan = c.compile_trees("account", [tree])
+    stages = plan.stages()
+
+    assert len(stages) == len(plan.operations)
+    assert [(op.op, op.path) for op in stages.shared] == [
+        (c.OpType.create, ""),
+        (c.OpType.set_acl, ""),
+    ]
+    assert [(op.op, op.path) for op in stages.final] == [
+        (c.OpType.recursive, ""),
+        (c.OpType.recursive, "a/a1"),
+    ]
+    assert sorted([ops[0].path for ops in stages.units]) == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("n", [1, 2, 5])
+def test_stages_shards(tree, n):
+    plan = c.compile_trees("account", [tree])
+    shards = [plan.stages((i, n)) for i in range(1, n + 1)]
+    final = plan.stages(final=True)
+
+    ids = [op.id for stages in shards for ops in stages.units for op in ops]
+    ids.extend([op.id for op in final.final])
+    ids.extend([op.id for op in shards[0].shared])
+    assert sorted(ids) == list(range(len(plan.operations)))
+    assert all([stages.shared == shards[0].shared for stages in shards])
+    assert all([stages.final == [] for stages in shards])
+
+
+def test_shard_units():
+    units = {("c", "a"): [0] * 5, ("c", "b"): [0] * 3, ("c", "d"): [0] * 3}
+
+    assert c.shard_units(units, 2) == {("c", "a"): 1, ("c", "b"): 2, ("c", "d"): 2}
+
+
+def test_dump_load_plan(tree):
+    plan = c.compile_trees("account", [tree, Node("other")])
+    out = io.StringIO()
+
+    c.dump_plan(out, plan)
+    loaded = c.load_plan(io.StringIO(out.getvalue()))
+
+    assert loaded == plan
+    assert loaded.node(loaded.operations[-1]).path == "other"
+    assert loaded.trees["container"].get("b/b1").acl_str == "default:user:xxxx:r-x"
+
+
+def test_load_plan_version():
+    with pytest.raises(ValueError):
+        c.load_plan(io.StringIO('{"version": 0, "account": "a", "operations": []}'))
@@ -0,0 +1,141 @@
+"""Runs of the orchestrators against the in-memory account of the benchmarks"""
+
+import asyncio
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_adls import FakeAccount  # noqa: E402
+
+from adls_acl.input_parser import config_to_trees  # noqa: E402
+from adls_acl.orchestrator import Orchestrator  # noqa: E402
+from adls_acl.state import StateCache  # noqa: E402
+
+
+def _config(permissions="r-x"):
+    def folder(name, subfolders=(), recursive=False):
+        acl = {"oid": "xxxx", "type": "group", "acl": "r-x"}
+        acls = [acl]
+        if recursive:
+            acls.append(
+                {"oid": "yyyy", "type": "user", "acl": permissions, "recursive": True}
+            )
+        return {"name": name, "acls": acls, "folders": list(subfolders)}
+
+    root = folder(
+        "c", [folder(f"d{i}", [folder("e"), folder("f")], True) for i in range(3)]
+    )
+    root["acls"].append(
+        {"oid": "zzzz", "type": "group", "acl": "r-x", "scope": "default"}
+    )
+    return {"account": "account", "containers": [root]}
+
+
+def _set_acl(account, config, engine, **kwargs):
+    (root,) = config_to_trees(config)
+    if engine == "async":
+        from adls_acl.aio import AsyncOrchestrator
+
+        async def run():
+            with mock.patch(
+                "adls_acl.aio.get_async_service_client", account.async_service_client
+            ):
+                o = AsyncOrchestrator("account", **kwargs)
+            async with o:
+                return await o.process_tree(root)
+
+        return asyncio.run(run())
+
+    with mock.patch("adls_acl.orchestrator.get_service_client", account.service_client):
+        o = Orchestrator("account", **kwargs)
+    return o.process_tree(root, concurrency=4)
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_set_acl_again_writes_nothing(engine):
+    account = FakeAccount()
+    assert _set_acl(account, _config(), engine) == {}
+    assert account.calls["update_access_control_recursive"] == 3
+    account.calls.clear()
+
+    assert _set_acl(account, _config(), engine) == {}
+
+    assert account.calls["set_access_control"] == 0
+    assert account.calls["update_access_control_recursive"] == 3
+    assert "user:yyyy:r-x" in account.get_acl("c", "d0/e")["acl"]
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_set_acl_again_lazy_recursive(engine):
+    account = FakeAccount()
+    _set_acl(account, _config(), engine, lazy_recursive=True)
+    account.create_directory("c", "d0/unmanaged", None)
+    account.calls.clear()
+
+    assert _set_acl(account, _config(), engine, lazy_recursive=True) == {}
+
+    # Directories of the input have all entries, the recursive updates are
+    # skipped and the directory not in the input doesn't get them
+    assert account.calls["update_access_control_recursive"] == 0
+    assert "user:yyyy" not in account.get_acl("c", "d0/unmanaged")["acl"]
+
+    assert _set_acl(account, _config(), engine) == {}
+    assert account.calls["update_access_control_recursive"] == 3
+    assert "user:yyyy:r-x" in account.get_acl("c", "d0/unmanaged")["acl"]
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_set_acl_recursive_change_keeps_entries(engine):
+    account = FakeAccount()
+    _set_acl(account, _config(), engine)
+    account.calls.clear()
+
+    with mock.patch.object(account, "set_acl", wraps=account.set_acl) as set_acl:
+        assert _set_acl(account, _config("rwx"), engine) == {}
+
+    # Descendants keep the entry until the recursive update changes it
+    written = [call.args[2] for call in set_acl.call_args_list]
+    assert len(written) == 3  # the folders with the recursive ACL
+    assert all(["user:yyyy:" in acl for acl in written])
+    assert account.calls["update_access_control_recursive"] == 3
+    assert "user:yyyy:rwx" in account.get_acl("c", "d0/e")["acl"]
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_set_acl_unchanged_state_offline(engine, tmp_path):
+    account = FakeAccount()
+    state = StateCache(str(tmp_path / "state.json"))
+    _set_acl(account, _config(), engine, state=state, assume_no_drift=True)
+    account.calls.clear()
+
+    _set_acl(account, _config(), engine, state=state, assume_no_drift=True)
+    assert sum(account.calls.values()) == 0
+
+    # Only the changed folder is listed by the prefetch
+    config = _config()
+    config["containers"][0]["folders"][1]["folders"].append({"name": "g", "acls": []})
+    _set_acl(account, config, engine, state=state, assume_no_drift=True)
+    assert account.calls["get_paths"] == 2
+
+
+def test_execute_again_keeps_recursive_entries():
+    from adls_acl.compiler import compile_trees
+
+    account = FakeAccount()
+    with mock.patch("adls_acl.orchestrator.get_service_client", account.service_client):
+        for _ in range(2):
+            account.calls.clear()
+            plan = compile_trees("account", config_to_trees(_config()))
+            o = Orchestrator("account")
+            with mock.patch.object(
+                account, "set_acl", wraps=account.set_acl
+            ) as set_acl:
+                assert o.execute(plan, plan.stages(), concurrency=2) == {}
+
+    # Nothing differs on the second run, the entries of the recursive ACLs on
+    # subdirectories are kept
+    assert set_acl.call_count == 0
+    assert "user:yyyy:r-x" in account.get_acl("c", "d0/e")["acl"]
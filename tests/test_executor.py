@@ -0,0 +1,117 @@
+import threading
+from contextvars import ContextVar
+
+import pytest
+
+from adls_acl import executor as e
+from adls_acl.nodes import Node
+
+
+@pytest.fixture
+def tree():
+    root = Node("root")
+    sub_node1 = Node("subn1", root)
+    sub_node2 = Node("subn2", root)
+    _ = Node("subn3", sub_node1)
+    _ = Node("subn4", sub_node2)
+
+    return root
+
+
+def _recorder():
+    lock = threading.Lock()
+    finished = []
+
+    def fn(node):
+        if node.parent is not None:
+            assert node.parent.path in finished
+        with lock:
+            finished.append(node.path)
+
+    return fn, finished
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_run_tree_parent_first(tree, concurrency):
+    fn, finished = _recorder()
+    failures = e.run_tree(tree, fn, concurrency)
+
+    assert failures == {}
+    assert len(finished) == 5
+    assert finished[0] == "root"
+
+
+def test_run_tree_sequential_is_bfs(tree):
+    fn, finished = _recorder()
+    e.run_tree(tree, fn)
+
+    assert finished == [
+        "root",
+        "root/subn1",
+        "root/subn2",
+        "root/subn1/subn3",
+        "root/subn2/subn4",
+    ]
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_run_tree_collects_failures(tree, concurrency):
+    fn, finished = _recorder()
+
+    def failing_fn(node):
+        if node.name == "subn1":
+            raise RuntimeError("boom")
+        fn(node)
+
+    failures = e.run_tree(tree, failing_fn, concurrency)
+
+    assert list(failures) == ["root/subn1"]
+    assert isinstance(failures["root/subn1"], RuntimeError)
+    assert "root/subn1/subn3" not in finished
+    assert "root/subn2/subn4" in finished
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_run_tree_prune(tree, concurrency):
+    fn, finished = _recorder()
+    e.run_tree(tree, fn, concurrency, prune=["root/subn2"])
+
+    assert sorted(finished) == ["root", "root/subn1", "root/subn1/subn3"]
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_run_tree_context(tree, concurrency):
+    var = ContextVar("var", default=None)
+    seen = []
+    var.set("set by the caller")
+
+    e.run_tree(tree, lambda node: seen.append(var.get()), concurrency)
+    results = e.map_ordered(lambda x: var.get(), range(3), concurrency)
+
+    assert seen == ["set by the caller"] * 5
+    assert list(results) == ["set by the caller"] * 3
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_map_ordered(concurrency):
+    consumed = []
+
+    def items():
+        for i in range(20):
+            consumed.append(i)
+            yield i
+
+    results = e.map_ordered(lambda x: x * 2, items(), concurrency)
+
+    assert next(results) == 0
+    assert len(consumed) <= 2 * concurrency
+    assert list(results) == [x * 2 for x in range(1, 20)]
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_walk_ordered(concurrency):
+    tree = {"": ["a", "b"], "a": ["a/x", "a/y"], "a/x": ["a/x/z"], "b": ["b/x"]}
+
+    results = e.walk_ordered(lambda x: (x, tree.get(x, [])), "", concurrency)
+
+    assert list(results) == ["", "a", "a/x", "a/x/z", "a/y", "b", "b/x"]
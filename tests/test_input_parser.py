@@ -0,0 +1,56 @@
+import pytest
+import yamale
+
+from adls_acl import input_parser
+from adls_acl.nodes import ConfigError
+
+CONFIG = """
+account: account
+containers:
+  - name: container
+    acls:
+      - oid: aaaa
+        type: user
+        acl: r-x
+    folders:
+      - name: folder
+        acls:
+          - oid: bbbb
+            type: group
+            acl: rwx
+            scope: default
+"""
+
+
+def test_config_from_yaml():
+    config = input_parser.config_from_yaml(CONFIG)
+
+    assert config["account"] == "account"
+    (root,) = input_parser.config_to_trees(config)
+    assert root.name == "container"
+    assert root.children[0].path == "container/folder"
+
+
+@pytest.mark.parametrize(
+    "config_str",
+    ["[]", "account: account", "account: 1\ncontainers: []", CONFIG + "extra: 1\n"],
+)
+def test_config_from_yaml_invalid(config_str):
+    with pytest.raises((ConfigError, yamale.YamaleError)):
+        input_parser.config_from_yaml(config_str)
+
+
+def test_config_to_trees_reports_all_errors(caplog):
+    config = input_parser.config_from_yaml(
+        CONFIG.replace("acl: r-x", "acl: r-xx").replace("acl: rwx", "acl: rw")
+    )
+
+    with pytest.raises(yamale.YamaleError):
+        input_parser.config_to_trees(config)
+    errors = [r.getMessage() for r in caplog.records]
+    assert "Length of r-xx" in str(errors)
+    assert "Length of rw" in str(errors)
+
+
+def test_schema_cached():
+    assert input_parser._schema() is input_parser._schema()
@@ -0,0 +1,135 @@
+import pytest
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.filedatalake import (
+    AccessControlChangeCounters,
+    AccessControlChangeResult,
+)
+
+from adls_acl import journal as j
+from adls_acl import orchestrator as o
+from adls_acl.nodes import Acl, Node
+
+
+def _tree():
+    root = Node("container")
+    root.add_acl(Acl.from_str("default:group:yyyy:r-x"))
+    dir_a = Node("a", root)
+    dir_a.add_acl(Acl("user", "xxxx", "rwx", recursive=True))
+    _ = Node("b", dir_a)
+    _ = Node("c", root)
+
+    return root
+
+
+def test_journal_resume(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    j.Journal(path).record("account", "hash", j.FIRST_PASS, "container/a")
+
+    resumed = j.Journal(path, resume=True)
+    j.Journal(path)  # starts a new journal
+
+    assert resumed.is_done("account", "hash", j.FIRST_PASS, "container/a")
+    assert not resumed.is_done("account", "other", j.FIRST_PASS, "container/a")
+    assert not resumed.is_done("account", "hash", j.RECURSIVE_PASS, "container/a")
+    assert not j.Journal(path, resume=True).is_done(
+        "account", "hash", j.FIRST_PASS, "container/a"
+    )
+
+
+def test_journal_truncated_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    j.Journal(str(path)).record("account", "hash", j.FIRST_PASS, "container")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"account": "acc')
+
+    journal = j.Journal(str(path), resume=True)
+    journal.record("account", "hash", j.FIRST_PASS, "container/a")
+
+    resumed = j.Journal(str(path), resume=True)
+    assert resumed.is_done("account", "hash", j.FIRST_PASS, "container")
+    assert resumed.is_done("account", "hash", j.FIRST_PASS, "container/a")
+
+
+def test_journal_tracker_config_hash(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    tree = _tree()
+    j.Journal(path).tracker("account", tree).record(j.FIRST_PASS, tree)
+
+    journal = j.Journal(path, resume=True)
+    changed = _tree()
+    changed.children[1].add_acl(Acl.from_str("user:zzzz:r--"))
+
+    assert journal.tracker("account", _tree()).is_done(j.FIRST_PASS, tree)
+    assert not journal.tracker("account", changed).is_done(j.FIRST_PASS, changed)
+
+
+@pytest.fixture
+def mock_dir_clients(mocker):
+    sc = mocker.MagicMock()
+    mocker.patch("adls_acl.orchestrator.get_service_client", return_value=sc)
+    sc.create_file_system.side_effect = ResourceExistsError()
+    fc = sc.get_file_system_client.return_value
+    dir_clients = {}
+
+    def get_directory_client(path):
+        dc = dir_clients.setdefault(path, mocker.MagicMock())
+        dc.create_directory.side_effect = ResourceExistsError()
+        dc.get_access_control.return_value = {"acl": "user::rwx"}
+        dc.update_access_control_recursive.return_value = AccessControlChangeResult(
+            counters=AccessControlChangeCounters(
+                directories_successful=1, files_successful=0, failure_count=0
+            ),
+            continuation=None,
+        )
+        return dc
+
+    fc._get_root_directory_client.side_effect = lambda: get_directory_client("")
+    fc.get_directory_client.side_effect = get_directory_client
+
+    return dir_clients
+
+
+def test_process_tree_resume(tmp_path, mock_dir_clients):
+    path = str(tmp_path / "journal.jsonl")
+    first = o.Orchestrator("test", prefetch=False, journal=j.Journal(path))
+    first.clients.directory_client("container", "a/b")
+    mock_dir_clients["a/b"].set_access_control.side_effect = RuntimeError("evicted")
+    failures = first.process_tree(_tree())
+    assert list(failures) == ["container/a/b"]
+
+    for dc in mock_dir_clients.values():
+        dc.reset_mock()
+    mock_dir_clients["a/b"].set_access_control.side_effect = None
+    second = o.Orchestrator(
+        "test", prefetch=False, journal=j.Journal(path, resume=True)
+    )
+    failures = second.process_tree(_tree())
+
+    assert failures == {}
+    assert second.plan.actions[o.Action.resumed] == [
+        "container",
+        "container/a",
+        "container/c",
+    ]
+    assert second.plan.actions[o.Action.update] == ["container/a/b"]
+    # b still gets the default ACL of the container, from the input
+    mock_dir_clients["a/b"].set_access_control.assert_called_once()
+    assert "default:group:yyyy:r-x" in (
+        mock_dir_clients["a/b"].set_access_control.call_args.kwargs["acl"]
+    )
+    # Setting ACLs of b replaced the entry of the recursive update of a
+    assert second.plan.actions[o.Action.recursive] == ["container/a"]
+
+
+def test_process_tree_resume_skips_recursive(tmp_path, mock_dir_clients):
+    path = str(tmp_path / "journal.jsonl")
+    o.Orchestrator("test", prefetch=False, journal=j.Journal(path)).process_tree(
+        _tree()
+    )
+    second = o.Orchestrator(
+        "test", prefetch=False, journal=j.Journal(path, resume=True)
+    )
+    second.process_tree(_tree())
+
+    assert len(second.plan.actions[o.Action.resumed]) == 5
+    assert second.plan.actions[o.Action.recursive] == []
@@ -0,0 +1,104 @@
+import json
+import logging
+from logging.handlers import QueueHandler
+
+import pytest
+
+from adls_acl import logger as logger_module
+from adls_acl.logger import JsonFormatter, configure_logger
+from adls_acl.nodes import Node
+from adls_acl.plan import Action
+from adls_acl.processing import log_action
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("adls_acl.test_logger")
+    logger.propagate = False
+    yield logger
+    logger.handlers.clear()
+
+
+def _record(msg, *args, **extra):
+    record = logging.LogRecord("adls_acl", logging.INFO, "", 0, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter():
+    data = json.loads(JsonFormatter().format(_record("a %s", "b")))
+    assert data["message"] == "a b"
+    assert data["level"] == "INFO"
+    assert data["logger"] == "adls_acl"
+    assert data["time"].endswith("+00:00")
+    assert "path" not in data and "exception" not in data
+
+    record = _record("m", path="c/a", operation="update", latency=0.5)
+    data = json.loads(JsonFormatter().format(record))
+    assert (data["path"], data["operation"], data["latency"]) == ("c/a", "update", 0.5)
+
+
+def test_configure_logger(logger, tmp_path):
+    log_file = tmp_path / "log.jsonl"
+    formatted = []
+
+    class Arg:
+        def __init__(self, name):
+            self.name = name
+
+        def __str__(self):
+            formatted.append(self.name)
+            return self.name
+
+    stop = configure_logger(
+        logger, silent=True, log_file=str(log_file), json_format=True
+    )
+    logger.info("message %s", Arg("arg"))
+    logger.debug("filtered %s", Arg("debug"))
+    stop()
+
+    assert not any(isinstance(h, QueueHandler) for h in logger.handlers)
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["message"] for line in lines] == ["message arg"]
+    # Arguments of records below the level are not formatted
+    assert "debug" not in formatted
+
+
+def test_configure_logger_text(logger, tmp_path, mocker):
+    log_file = tmp_path / "log.txt"
+    prepare = mocker.spy(logger_module._QueueHandler, "prepare")
+    stop = configure_logger(logger, silent=True, log_file=str(log_file))
+    logger.info("message")
+    logging.getLogger(f"{logger.name}.azure").info("filtered")
+    stop()
+
+    assert log_file.read_text(encoding="utf-8") == "message\n"
+    # Dropped before it is queued
+    assert prepare.call_count == 1
+
+
+def test_configure_logger_exception(logger, tmp_path):
+    log_file = tmp_path / "log.jsonl"
+    stop = configure_logger(
+        logger, silent=True, log_file=str(log_file), json_format=True
+    )
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed")
+    stop()
+
+    data = json.loads(log_file.read_text(encoding="utf-8"))
+    assert data["message"] == "failed"
+    assert "ValueError: boom" in data["exception"]
+
+
+def test_log_action(caplog):
+    caplog.set_level(logging.INFO)
+    root = Node("container")
+    log_action(Action.update, Node("a", root), 0.0)
+
+    (record,) = caplog.records
+    assert record.getMessage().startswith("update: container/a (")
+    assert (record.path, record.operation) == ("container/a", "update")
+    assert record.latency > 0
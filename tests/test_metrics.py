@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+from adls_acl import metrics as m
+from adls_acl.nodes import Node
+from adls_acl.orchestrator import Orchestrator
+
+
+def test_operation_stats():
+    stats = m.OperationStats()
+    for seconds in [0.001, 0.005, 0.02, 20.0]:
+        stats.add(seconds, error=seconds > 10)
+
+    assert (stats.count, stats.errors, stats.max_seconds) == (4, 1, 20.0)
+    buckets = stats.cumulative_buckets()
+    assert buckets["0.005"] == 2
+    assert buckets["0.025"] == 3
+    assert buckets["10"] == 3
+    assert buckets["+Inf"] == 4
+
+
+def test_instrumented_client(mocker):
+    metrics = m.Metrics()
+    sc = mocker.MagicMock()
+    sc.create_file_system.side_effect = ResourceExistsError()
+    fc = sc.get_file_system_client.return_value
+    fc.get_paths.return_value = iter(["a", "b"])
+    client = metrics.instrument(sc, "account")
+
+    with pytest.raises(ResourceExistsError):
+        client.create_file_system("container")
+    fs_client = client.get_file_system_client(file_system="container")
+    with metrics.measure_pass("account", "container", "first"):
+        fs_client.get_directory_client("a").set_access_control(acl="user::rwx")
+        paths = fs_client.get_paths(path=None)
+        assert fc.get_paths.call_count == 1
+        assert list(paths) == ["a", "b"]
+    client.list_file_systems()
+
+    fc.get_directory_client.return_value.set_access_control.assert_called_once_with(
+        acl="user::rwx"
+    )
+    assert client.account_name == sc.account_name
+    assert {k: (v.count, v.errors) for k, v in metrics.operations.items()} == {
+        ("account", "container", "", "create_file_system"): (1, 1),
+        ("account", "container", "first", "set_access_control"): (1, 0),
+        ("account", "container", "first", "get_paths"): (1, 0),
+        ("account", "", "", "list_file_systems"): (1, 0),
+    }
+    assert list(metrics.passes) == [("account", "container", "first")]
+
+
+def test_instrumented_async_client(mocker):
+    metrics = m.Metrics()
+    dc = mocker.MagicMock()
+    dc.get_access_control = mocker.AsyncMock(return_value={"acl": "user::rwx"})
+    dc.set_access_control = mocker.AsyncMock(side_effect=ResourceNotFoundError())
+    client = m.InstrumentedClient(dc, metrics, "account", "container")
+
+    async def run():
+        with metrics.measure_pass("account", "container", "first"):
+            assert await client.get_access_control() == {"acl": "user::rwx"}
+            with pytest.raises(ResourceNotFoundError):
+                await client.set_access_control(acl="user::rwx")
+
+    asyncio.run(run())
+
+    assert {k[3]: (v.count, v.errors) for k, v in metrics.operations.items()} == {
+        "get_access_control": (1, 0),
+        "set_access_control": (1, 1),
+    }
+
+
+def test_process_tree_passes(mocker):
+    sc = mocker.MagicMock()
+    mocker.patch("adls_acl.orchestrator.get_service_client", return_value=sc)
+    sc.create_file_system.side_effect = ResourceExistsError()
+    fc = sc.get_file_system_client.return_value
+    fc.get_paths.side_effect = ResourceNotFoundError()
+    dc = fc.get_directory_client.return_value
+    dc.create_directory.side_effect = ResourceExistsError()
+    for client in [dc, fc._get_root_directory_client.return_value]:
+        client.get_access_control.return_value = {"acl": "user::rwx"}
+    root = Node("container")
+    for name in ["a", "b", "c"]:
+        Node(name, root)
+
+    metrics = m.Metrics()
+    o = Orchestrator("account", metrics=metrics)
+    assert o.process_tree(root, concurrency=4) == {}
+
+    counts = {k[2:]: v.count for k, v in metrics.operations.items()}
+    assert counts == {
+        ("prefetch", "get_paths"): 1,
+        ("first", "create_file_system"): 1,
+        ("first", "create_directory"): 3,
+        ("first", "get_access_control"): 4,
+    }
+    assert [k[2] for k in metrics.passes] == ["prefetch", "first", "recursive"]
+
+
+def _metrics():
+    metrics = m.Metrics()
+    with metrics.measure_pass("account", 'con"tainer', "first"):
+        metrics.record("account", 'con"tainer', "get_access_control", 0.02)
+    return metrics
+
+
+def test_save_json(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    _metrics().save(path)
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["operations"][0]["operation"] == "get_access_control"
+    assert data["operations"][0]["pass"] == "first"
+    assert data["operations"][0]["buckets"]["0.025"] == 1
+    assert data["passes"][0]["container"] == 'con"tainer'
+
+
+def test_save_prometheus(tmp_path):
+    path = tmp_path / "metrics.prom"
+    _metrics().save(str(path))
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    labels = 'account="account",container="con\\"tainer",pass="first"'
+    assert (
+        f'adls_acl_operations_total{{{labels},operation="get_access_control"}} 1'
+        in lines
+    )
+    assert (
+        f"adls_acl_operation_duration_seconds_bucket{{{labels},"
+        'operation="get_access_control",le="0.01"} 0'
+    ) in lines
+    assert any(
+        [x.startswith(f"adls_acl_pass_duration_seconds{{{labels}}} ") for x in lines]
+    )
+    assert not (tmp_path / "metrics.prom.tmp").exists()
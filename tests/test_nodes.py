@@ -65,6 +65,97 @@ def test_container_config_to_tree(container_dict):
     assert all([isinstance(x, nodes.Acl) for x in root.children[0].acls])
 
 
+class TestTree:
+    @pytest.fixture
+    def tree(self, container_dict):
+        return nodes.Tree.from_config(container_dict)
+
+    def test_from_config(self, tree):
+        assert len(tree) == 3
+        assert tree.get("") is tree.root
+        assert tree.get("test_folder/test_subfolder_one").path == (
+            "test_container/test_folder/test_subfolder_one"
+        )
+        assert len(tree.get("test_folder").acls) == 1
+
+    def test_add(self, tree):
+        node = tree.add("test_folder/new")
+
+        assert "test_folder/new" in tree
+        assert node.parent is tree.get("test_folder")
+        assert tree.get("test_folder").get_child("new") is node
+        assert node.path_in_file_system == "test_folder/new"
+
+    def test_add_missing_parent(self, tree):
+        with pytest.raises(KeyError):
+            tree.add("missing/new")
+
+    def test_index_existing_nodes(self, container_dict):
+        tree = nodes.Tree(_dict_to_tree(container_dict))
+
+        assert tree.get("test_folder/test_subfolder_one").name == "test_subfolder_one"
+
+    @pytest.mark.parametrize(
+        "change, path",
+        [
+            (lambda c: c.pop("acls"), "containers"),
+            (lambda c: c.update(extra=1), "containers"),
+            (lambda c: c["folders"].append("folder"), "test_container"),
+            (lambda c: c["folders"][0].update(name=1), "test_container"),
+            (lambda c: c["acls"][0].update(type="owner"), "test_container"),
+            (lambda c: c["acls"][0].update(acl="rw"), "test_container"),
+            (lambda c: c["acls"][0].update(acl="rwt"), "test_container"),
+            (lambda c: c["acls"][0].update(scope="x"), "test_container"),
+            (lambda c: c["acls"][0].update(recursive="yes"), "test_container"),
+            (
+                lambda c: c["folders"][0]["acls"][0].pop("oid"),
+                "test_container/test_folder",
+            ),
+            (
+                lambda c: c["folders"].append(copy.deepcopy(c["folders"][0])),
+                "test_container",
+            ),
+        ],
+    )
+    def test_from_config_invalid(self, container_dict, change, path):
+        container_dict = copy.deepcopy(container_dict)
+        change(container_dict)
+
+        with pytest.raises(nodes.ConfigError, match=f"Invalid input in {path}:"):
+            nodes.Tree.from_config(container_dict)
+
+    @pytest.mark.parametrize("acl_type", ["user", "group", "mask", "other"])
+    def test_from_config_acl_types(self, container_dict, acl_type):
+        container_dict = copy.deepcopy(container_dict)
+        container_dict["acls"][0].update(type=acl_type, oid="")
+
+        tree = nodes.Tree.from_config(container_dict)
+
+        (acl,) = tree.root.acls
+        assert acl.p_type == acl_type
+
+    def test_from_config_optional(self, container_dict):
+        container_dict = copy.deepcopy(container_dict)
+        container_dict["folders"][0]["folders"] = None
+        container_dict["acls"][0].update(scope="default", recursive=True)
+
+        tree = nodes.Tree.from_config(container_dict)
+
+        assert len(tree) == 2
+        (acl,) = tree.root.acls
+        assert acl.scope == "default" and acl.is_recursive()
+
+
+def test_find_node_by_name(container_dict):
+    root = _dict_to_tree(container_dict)
+
+    assert nodes.find_node_by_name(root, "") is root
+    assert nodes.find_node_by_name(root, "test_folder/test_subfolder_one").name == (
+        "test_subfolder_one"
+    )
+    assert nodes.find_node_by_name(root, "test_folder/missing") is None
+
+
 class TestTraversal:
     @pytest.fixture(scope="class")
     def tree(self):
@@ -250,3 +341,114 @@ class TestAcl:
 
         assert acl.is_other()
         assert acl.is_special()
+
+    def test_acls_to_str(self):
+        acls = [
+            nodes.Acl.from_str(x)
+            for x in [
+                "default:user:bbbb:r-x",
+                "other::---",
+                "group:aaaa:rwx",
+                "mask::rwx",
+                "user:bbbb:r--",
+                "group::r-x",
+                "user:aaaa:r--",
+                "user::rwx",
+            ]
+        ]
+
+        assert nodes.acls_to_str(acls) == (
+            "user::rwx,user:aaaa:r--,user:bbbb:r--,group::r-x,group:aaaa:rwx,"
+            "mask::rwx,other::---,default:user:bbbb:r-x"
+        )
+
+
+def test_intern_acls():
+    acls = nodes.intern_acls([nodes.Acl.from_str("user:aaaa:r-x")])
+    same = nodes.intern_acls({nodes.Acl.from_str("user:aaaa:r-x")})
+    other_permissions = nodes.intern_acls([nodes.Acl.from_str("user:aaaa:rwx")])
+
+    assert isinstance(acls, frozenset)
+    assert same is acls
+    assert other_permissions is not acls
+    assert next(iter(other_permissions)).permissions == "rwx"
+
+
+def test_add_acl_shares_sets():
+    root = nodes.Node("root")
+    first, second = nodes.Node("first", root), nodes.Node("second", root)
+    for node in [first, second]:
+        node.add_acl(nodes.Acl.from_str("user:aaaa:r-x"))
+
+    assert first.acls is second.acls
+    assert not hasattr(first, "__dict__")
+
+
+def test_acl_permissions_bitmask():
+    acl = nodes.Acl("group", "aaaa", "xr-", scope="default")
+
+    assert acl.permissions == "r-x"
+    assert str(acl) == "default:group:aaaa:r-x"
+    assert acl.to_yaml() == {
+        "oid": "aaaa",
+        "type": "group",
+        "acl": "r-x",
+        "scope": "default",
+    }
+
+
+@pytest.mark.parametrize("name", ["oid", "recursive", "permissions", "scope"])
+def test_acl_immutable(name):
+    acl = nodes.Acl.from_str("user:aaaa:r-x")
+
+    with pytest.raises(AttributeError):
+        setattr(acl, name, "bbbb")
+    assert str(acl) == "user:aaaa:r-x" and not acl.recursive
+
+
+@pytest.mark.parametrize(
+    "args",
+    [("owner", "aaaa", "rwx"), ("user", "aaaa", "rwt"), ("user", "aaaa", "r-x", "x")],
+)
+def test_acl_invalid(args):
+    with pytest.raises(ValueError):
+        nodes.Acl(*args)
+
+
+def test_acls_from_str():
+    acls = nodes.acls_from_str("user::rwx,user:aaaa:r-x,default:user:aaaa:rwx")
+
+    assert acls == {
+        nodes.Acl.from_str("user::rwx"),
+        nodes.Acl.from_str("user:aaaa:r-x"),
+        nodes.Acl.from_str("default:user:aaaa:rwx"),
+    }
+    assert nodes.acls_from_str("user::rwx,user:aaaa:r-x,default:user:aaaa:rwx") is acls
+    assert nodes.acls_from_str("") == frozenset()
+
+
+def test_pushdown_acls():
+    acls = {nodes.Acl.from_str("user::rwx"), nodes.Acl.from_str("user:xxxx:rwx")}
+    root = nodes.Node("test1")
+    nodes.Node("test2", root)
+
+    nodes.pushdown_acls(root, acls)
+
+    assert root.children[0].acls == acls
+
+
+def test_pushdown_acls_shared():
+    acls = {nodes.Acl.from_str("user::rwx"), nodes.Acl.from_str("user:xxxx:rwx")}
+    root = nodes.Node("root")
+    children = [nodes.Node(f"dir{i}", root) for i in range(3)]
+
+    nodes.pushdown_acls(root, acls)
+
+    assert all([child.acls is children[0].acls for child in children])
+
+
+def test_acls_to_pushdown():
+    root = nodes.Node("root")
+    root.acls = nodes.acls_from_str("user:aaaa:r-x,default:user:aaaa:r-x")
+
+    assert nodes.acls_to_pushdown(root) == {nodes.Acl.from_str("default:user:aaaa:r-x")}
@@ -1,11 +1,28 @@
-from unittest.mock import call
+import itertools
 
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
 import azure.identity
 import azure.storage.filedatalake
+from azure.storage.filedatalake import (
+    AccessControlChangeCounters,
+    AccessControlChangeResult,
+    AccessControlChanges,
+)
 import pytest
 
 from adls_acl import orchestrator as o
+from adls_acl.compiler import compile_trees
 from adls_acl.nodes import Acl, Node
+from adls_acl.recursive import RecursiveCheckpoint, RecursiveOptions
+
+
+def _change_result(continuation=None, failure_count=0):
+    return AccessControlChangeResult(
+        counters=AccessControlChangeCounters(
+            directories_successful=1, files_successful=1, failure_count=failure_count
+        ),
+        continuation=continuation,
+    )
 
 
 def test_processor_selector():
@@ -49,18 +66,374 @@ def test__get_current_acl_no_special(mock_client):
     assert len(curent_acls) == 1
 
 
-def test__filter_acls_to_preserve(test_acl_set):
-    acls_to_preserve = o._filter_acls_to_preserve(test_acl_set)
+def test__set_acls(mock_client, test_acl_set):
+    o._set_acls(mock_client, test_acl_set)
+    mock_client.set_access_control.assert_called_once_with(
+        acl="user::rwx,user:xxxx:rwx"
+    )
 
-    assert len(acls_to_preserve) == 1
 
+def test_processor_set_acls_request_count(mock_client):
+    node = Node("test1", None)
+    child_node = Node("test2", node)
+    node.add_acl(Acl.from_str("group:yyyy:r-x"))
+    node.add_acl(Acl.from_str("default:group:yyyy:r-x"))
 
-def test__set_acls(mock_client, test_acl_set):
-    o._set_acls(mock_client, test_acl_set)
-    calls = [call(acl=x) for x in test_acl_set]
-    mock_client.set_access_control.assert_has_calls(calls, any_order=True)
+    o.ProcessorDir.set_acls(node, mock_client)
+
+    assert mock_client.get_access_control.call_count == 1
+    assert mock_client.set_access_control.call_count == 1
+    mock_client.set_access_control.assert_called_with(
+        acl="user::rwx,group:yyyy:r-x,default:group:yyyy:r-x"
+    )
+    assert Acl.from_str("default:group:yyyy:r-x") in child_node.acls
+
+
+def test_processor_set_acls_up_to_date(mock_client):
+    node = Node("test1", None)
+    node.add_acl(Acl.from_str("user:xxxx:rwx"))
+
+    changed = o.ProcessorDir.set_acls(node, mock_client)
+
+    assert changed == False
+    mock_client.set_access_control.assert_not_called()
+
+
+def test_processor_set_acls_dry_run(mock_client):
+    node = Node("test1", None)
+    node.add_acl(Acl.from_str("user:xxxx:r-x"))
+
+    changed = o.ProcessorDir.set_acls(node, mock_client, dry_run=True)
+
+    assert changed == True
+    mock_client.set_access_control.assert_not_called()
+
+
+@pytest.fixture
+def mock_service_client(mocker):
+    """Mock DataLakeServiceClient with two containers with the same three dirs"""
+    sc = mocker.MagicMock()
+    fc = sc.get_file_system_client.return_value
+    containers = [mocker.MagicMock(), mocker.MagicMock()]
+    containers[0].name, containers[1].name = "container", "other"
+    sc.list_file_systems.return_value = containers
+    fc._get_root_directory_client.return_value.get_access_control.return_value = {
+        "acl": "user::rwx"
+    }
+    paths = []
+    for name, is_directory in [("a", True), ("a/b", True), ("a/f", False), ("c", True)]:
+        path = mocker.MagicMock(is_directory=is_directory)
+        path.name = name
+        paths.append(path)
+
+    def get_paths(path=None, recursive=True):
+        if recursive:
+            return iter(paths)
+        prefix = "" if path is None else f"{path}/"
+        return iter(
+            [
+                x
+                for x in paths
+                if x.name.startswith(prefix) and "/" not in x.name[len(prefix) :]
+            ]
+        )
+
+    fc.get_paths.side_effect = get_paths
+
+    def get_directory_client(name):
+        dc = mocker.MagicMock()
+        dc.get_access_control.return_value = {"acl": f"user::rwx,user:{name}:r-x"}
+        return dc
+
+    fc.get_directory_client.side_effect = get_directory_client
+    mocker.patch("adls_acl.orchestrator.get_service_client", return_value=sc)
+
+    return sc
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+@pytest.mark.parametrize("list_per_directory", [False, True])
+def test_read_account(mock_service_client, concurrency, list_per_directory):
+    orchestrator = o.Orchestrator("test")
+    data = orchestrator.read_account(
+        omit_special=True,
+        concurrency=concurrency,
+        list_per_directory=list_per_directory,
+    )
+
+    assert [x["name"] for x in data["containers"]] == ["container", "other"]
+    container = data["containers"][0]
+    assert container["name"] == "container"
+    assert container["acls"] == []
+    assert [x["name"] for x in container["folders"]] == ["a", "c"]
+    assert container["folders"][0]["folders"][0] == {
+        "name": "b",
+        "acls": [{"oid": "a/b", "type": "user", "acl": "r-x"}],
+    }
+    fc = mock_service_client.get_file_system_client.return_value
+    # A listing per container, or per directory: the root, a, a/b and c
+    assert fc.get_paths.call_count == (8 if list_per_directory else 2)
+
+
+def test_walk_container_out_of_order(mocker, mock_service_client):
+    fc = mock_service_client.get_file_system_client.return_value
+    paths = []
+    for name in ["a", "a-b", "a/b"]:
+        paths.append(mocker.MagicMock(is_directory=True))
+        paths[-1].name = name
+    fc.get_paths.side_effect = None
+    fc.get_paths.return_value = iter(paths)
+
+    walk = o.Orchestrator("test").walk_container("container")
+
+    assert [path for path, _ in itertools.islice(walk, 3)] == ["", "a", "a-b"]
+    with pytest.raises(ValueError, match="not in depth-first order at a/b"):
+        next(walk)
+
+
+@pytest.fixture
+def plan_tree():
+    root = Node("container")
+    root.add_acl(Acl.from_str("user:xxxx:rwx"))
+    existing = Node("existing", root)
+    existing.add_acl(Acl.from_str("user:xxxx:rwx"))
+    new = Node("new", existing)
+    _ = Node("newer", new)
+    Node("changed", root).add_acl(Acl("group", "yyyy", "r-x", recursive=True))
+
+    return root
+
+
+def test_process_tree_dry_run(mocker, mock_service_client, plan_tree):
+    dc = mocker.MagicMock()
+    dc.get_access_control.return_value = {"acl": "user::rwx,user:xxxx:rwx"}
+    dc.exists.side_effect = lambda: dc.path != "existing/new"
+    fc = mock_service_client.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+
+    def get_directory_client(path):
+        dc.path = path
+        return dc
+
+    fc.get_directory_client.side_effect = get_directory_client
+
+    orchestrator = o.Orchestrator("test", dry_run=True)
+    failures = orchestrator.process_tree(plan_tree)
+    plan = orchestrator.plan
+
+    assert failures == {}
+    assert plan.actions[o.Action.create] == [
+        "container/existing/new",
+        "container/existing/new/newer",
+    ]
+    assert plan.actions[o.Action.update] == ["container/changed"]
+    assert plan.actions[o.Action.noop] == ["container", "container/existing"]
+    assert plan.actions[o.Action.recursive] == ["container/changed"]
+    assert dc.exists.call_count == 3  # newer is known to be missing
+    dc.create_directory.assert_not_called()
+    dc.set_access_control.assert_not_called()
+    dc.update_access_control_recursive.assert_not_called()
+
+
+def test_process_tree_writes_only_on_diff(mocker, mock_service_client, plan_tree):
+    dc = mocker.MagicMock()
+    dc.get_access_control.return_value = {"acl": "user::rwx,user:xxxx:rwx"}
+    dc.create_directory.side_effect = ResourceExistsError()
+    dc.update_access_control_recursive.return_value = _change_result()
+    mock_service_client.create_file_system.side_effect = ResourceExistsError()
+    fc = mock_service_client.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+    fc.get_directory_client.side_effect = None
+    fc.get_directory_client.return_value = dc
+
+    orchestrator = o.Orchestrator("test")
+    orchestrator.process_tree(plan_tree)
+
+    assert orchestrator.plan.counts() == {
+        "create": 0,
+        "update": 3,
+        "no-op": 2,
+        "recursive": 1,
+        "skip": 0,
+        "resumed": 0,
+    }
+    assert dc.set_access_control.call_count == 3
+
+
+def test__update_access_control_recursive_until_done(mock_client):
+    mock_client.update_access_control_recursive.side_effect = [
+        _change_result("token1"),
+        _change_result("token2", failure_count=2),
+        _change_result(),
+    ]
+    options = RecursiveOptions(batch_size=100, max_batches=5)
+
+    o._update_access_control_recursive(
+        mock_client, {Acl.from_str("user:xxxx:r-x")}, options, "key"
+    )
+
+    assert mock_client.update_access_control_recursive.call_count == 3
+    _, kwargs = mock_client.update_access_control_recursive.call_args
+    assert kwargs["acl"] == "user:xxxx:r-x"
+    assert kwargs["continuation_token"] == "token2"
+    assert kwargs["batch_size"] == 100
+    assert kwargs["max_batches"] == 5
+
+
+def test__update_access_control_recursive_checkpoint(mock_client, tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    acls = {Acl.from_str("user:xxxx:r-x")}
+
+    def interrupted(**kwargs):
+        changes = _changes("token1")
+        kwargs["progress_hook"](changes)
+        raise RuntimeError("killed")
+
+    mock_client.update_access_control_recursive.side_effect = interrupted
+    options = RecursiveOptions(checkpoint=RecursiveCheckpoint(path))
+    with pytest.raises(RuntimeError):
+        o._update_access_control_recursive(mock_client, acls, options, "key")
+
+    mock_client.update_access_control_recursive.side_effect = None
+    mock_client.update_access_control_recursive.return_value = _change_result()
+    options = RecursiveOptions(checkpoint=RecursiveCheckpoint(path))
+    o._update_access_control_recursive(mock_client, acls, options, "key")
+
+    _, kwargs = mock_client.update_access_control_recursive.call_args
+    assert kwargs["continuation_token"] == "token1"
+    assert RecursiveCheckpoint(path).get("key", "user:xxxx:r-x") is None
+
+
+def _changes(continuation):
+    return AccessControlChanges(
+        batch_counters=AccessControlChangeCounters(1, 1, 0),
+        aggregate_counters=AccessControlChangeCounters(1, 1, 0),
+        batch_failures=[],
+        continuation=continuation,
+    )
+
+
+def test_process_tree_creates_once(mocker, mock_service_client, plan_tree):
+    dc = mocker.MagicMock()
+    dc.get_access_control.return_value = {"acl": "user::rwx,user:xxxx:rwx"}
+    dc.update_access_control_recursive.return_value = _change_result()
+    fc = mock_service_client.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+    fc.get_directory_client.side_effect = None
+    fc.get_directory_client.return_value = dc
+
+    orchestrator = o.Orchestrator("test", prefetch=False)
+    orchestrator.process_tree(plan_tree)
+    orchestrator.process_tree(plan_tree)
+
+    assert mock_service_client.create_file_system.call_count == 1
+    assert dc.create_directory.call_count == 4
+    assert mock_service_client.get_file_system_client.call_count == 1
+    assert fc.get_directory_client.call_count == 4
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_process_tree_prefetch(mocker, mock_service_client, plan_tree, concurrency):
+    dc = mocker.MagicMock()
+    dc.get_access_control.return_value = {"acl": "user::rwx,user:xxxx:rwx"}
+    dc.update_access_control_recursive.return_value = _change_result()
+    fc = mock_service_client.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+    fc.get_directory_client.side_effect = None
+    fc.get_directory_client.return_value = dc
+
+    def get_paths(path, recursive):
+        names = {None: ["existing", "other", "f"], "existing": ["existing/new"]}
+        result = []
+        for name in names[path]:
+            result.append(mocker.MagicMock(is_directory=name != "f"))
+            result[-1].name = name
+        return iter(result)
+
+    fc.get_paths.side_effect = get_paths
+
+    orchestrator = o.Orchestrator("test")
+    orchestrator.process_tree(plan_tree, concurrency=concurrency)
+
+    assert [c.kwargs for c in fc.get_paths.call_args_list] == [
+        {"path": None, "recursive": False},
+        {"path": "existing", "recursive": True},
+    ]
+    mock_service_client.create_file_system.assert_not_called()
+    # Only the missing ones: newer and changed
+    assert dc.create_directory.call_count == 2
+    assert sorted(orchestrator.plan.actions[o.Action.create]) == [
+        "container/changed",
+        "container/existing/new/newer",
+    ]
+
+
+def test_prefetch_missing_container(mocker, mock_service_client, plan_tree):
+    fc = mock_service_client.get_file_system_client.return_value
+    fc.get_paths.side_effect = ResourceNotFoundError()
+
+    orchestrator = o.Orchestrator("test")
+    orchestrator.prefetch_existing(plan_tree)
+
+    fc.get_paths.assert_called_once_with(path=None, recursive=False)
+    assert not orchestrator.clients.is_existing("container", "")
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_execute_compiled_plan(mocker, mock_service_client, plan_tree, concurrency):
+    dc = mocker.MagicMock()
+    dc.get_access_control.return_value = {"acl": "user::rwx,user:xxxx:rwx"}
+    dc.create_directory.side_effect = ResourceExistsError()
+    dc.update_access_control_recursive.return_value = _change_result()
+    mock_service_client.create_file_system.side_effect = ResourceExistsError()
+    fc = mock_service_client.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+    fc.get_directory_client.side_effect = None
+    fc.get_directory_client.return_value = dc
+    plan = compile_trees("test", [plan_tree])
+
+    orchestrator = o.Orchestrator("test")
+    failures = orchestrator.execute(plan, plan.stages(), concurrency)
+
+    # Same as process_tree on the tree
+    assert failures == {}
+    assert orchestrator.plan.counts() == {
+        "create": 0,
+        "update": 3,
+        "no-op": 2,
+        "recursive": 1,
+        "skip": 0,
+        "resumed": 0,
+    }
+    assert dc.set_access_control.call_count == 3
+
+
+def test_execute_skips_dependents(mocker, mock_service_client, plan_tree):
+    dc = mocker.MagicMock()
+    dc.get_access_control.return_value = {"acl": "user::rwx"}
+    dc.update_access_control_recursive.return_value = _change_result()
+    dc.create_directory.side_effect = lambda **kwargs: (
+        _raise(RuntimeError("boom")) if dc.path == "existing" else None
+    )
+    fc = mock_service_client.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+
+    def get_directory_client(path):
+        dc.path = path
+        return dc
+
+    fc.get_directory_client.side_effect = get_directory_client
+    plan = compile_trees("test", [plan_tree])
+
+    orchestrator = o.Orchestrator("test")
+    failures = orchestrator.execute(plan, plan.stages())
+
+    assert list(failures) == ["container/existing"]
+    assert orchestrator.plan.actions[o.Action.create] == [
+        "container",
+        "container/changed",
+    ]
 
 
-def test__pushdown_acls(test_node, test_acl_set):
-    o._pushdown_acls(test_node, test_acl_set)
-    assert test_node.children[0].acls == test_acl_set
+def _raise(e):
+    raise e
@@ -0,0 +1,135 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from adls_acl import processing as p
+from adls_acl.clients import ClientCache
+from adls_acl.nodes import Acl, Node
+from adls_acl.plan import Action, Plan
+from adls_acl.recursive import RecursiveCoverage, RecursivePlan
+
+
+@pytest.fixture
+def test_acl_set():
+    return {Acl.from_str("user::rwx"), Acl.from_str("user:xxxx:rwx")}
+
+
+def test__filter_acls_to_preserve(test_acl_set):
+    acls_to_preserve = p._filter_acls_to_preserve(test_acl_set)
+
+    assert len(acls_to_preserve) == 1
+
+
+def test_parse_acls():
+    acls = p.parse_acls("user::rwx,user:xxxx:r-x", omit_special=True)
+
+    assert acls == {Acl.from_str("user:xxxx:r-x")}
+
+
+def test_acls_to_write():
+    root = Node("container")
+    root.add_acl(Acl("user", "yyyy", "r-x", recursive=True))
+    node = Node("a", root)
+    node.add_acl(Acl.from_str("user:xxxx:r-x"))
+    current = p.parse_acls("user::rwx,user:xxxx:r-x,user:yyyy:r-x,user:zzzz:r-x")
+    coverage = RecursiveCoverage()
+
+    new_acls, changed = p.acls_to_write(node, current, coverage)
+
+    # The special entry and the entry of the recursive ACL are kept
+    assert set(map(str, new_acls)) == {"user::rwx", "user:xxxx:r-x", "user:yyyy:r-x"}
+    assert changed
+    assert coverage.is_covered(node)
+
+    _, changed = p.acls_to_write(node, new_acls)
+    assert not changed
+
+
+@pytest.mark.parametrize(
+    "created, changed, expected",
+    [
+        (True, True, Action.create),
+        (True, False, Action.create),
+        (False, True, Action.update),
+        (False, False, Action.noop),
+    ],
+)
+def test_node_action(created, changed, expected):
+    assert p.node_action(created, changed) == expected
+
+
+def test_pushdown_unread():
+    root = Node("container")
+    root.add_acl(Acl.from_str("default:user:xxxx:r-x"))
+    child = Node("a", root)
+    coverage = RecursiveCoverage()
+
+    p.pushdown_unread(root, coverage)
+
+    assert Acl.from_str("default:user:xxxx:r-x") in child.acls
+    assert not coverage.is_covered(root)
+
+
+def test_is_created_in_plan():
+    root = Node("container")
+    child = Node("a", root)
+    plan = Plan()
+    assert not p.is_created_in_plan(plan, child)
+
+    plan.add(Action.create, root)
+    assert p.is_created_in_plan(plan, child)
+    assert not p.is_created_in_plan(plan, root)
+
+
+@pytest.mark.parametrize(
+    "unchanged, assume_no_drift, expected",
+    [
+        (False, False, False),
+        (False, True, False),
+        (True, True, True),
+        (True, False, None),
+    ],
+)
+def test_known_unchanged(unchanged, assume_no_drift, expected):
+    tracker = MagicMock()
+    tracker.is_unchanged.return_value = unchanged
+
+    assert p.known_unchanged(Node("a"), tracker, assume_no_drift) == expected
+
+
+def test_recursive_acls_to_apply():
+    node = Node("container")
+    plan = RecursivePlan()
+    plan.operations[node.path] = {Acl("user", "xxxx", "r-x", recursive=True)}
+    coverage = RecursiveCoverage()
+
+    assert p.recursive_acls_to_apply(node, plan) == plan.operations[node.path]
+    assert p.recursive_acls_to_apply(node, plan, coverage) == set()
+    coverage.mark(node.path)
+    assert p.recursive_acls_to_apply(node, plan, coverage) == plan.operations[node.path]
+
+
+def test_create_request():
+    root = Node("container")
+    child = Node("a", root)
+    clients = ClientCache(MagicMock())
+
+    p.create_request(root, clients)()
+    clients.sc.create_file_system.assert_called_once_with("container")
+    p.create_request(child, clients)()
+    dc = clients.sc.get_file_system_client.return_value.get_directory_client
+    dc.return_value.create_directory.assert_called_once()
+
+    clients.mark_existing("container", "a")
+    assert p.create_request(child, clients) is None
+    assert p.exists_request(child, clients) is None
+
+
+def test_listed_directories():
+    listing = []
+    for name, is_directory in [("a", True), ("b", True), ("f", False)]:
+        listing.append(MagicMock(is_directory=is_directory))
+        listing[-1].name = name
+
+    assert p.listed_directories(listing, {"a", "f"}) == ["a"]
+    assert p.folders_to_list(["a", "c"], ["a", "b"]) == ["a"]
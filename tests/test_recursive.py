@@ -0,0 +1,86 @@
+from adls_acl import recursive as r
+from adls_acl.nodes import Acl, Node
+
+
+def _recursive(acl_str):
+    acl = Acl.from_str(acl_str)
+    return Acl(acl.p_type, acl.oid, acl.permissions, acl.scope, recursive=True)
+
+
+def test_plan_recursive_merges_node_acls():
+    root = Node("root")
+    root.add_acl(_recursive("user:xxxx:r-x"))
+    root.add_acl(_recursive("default:user:xxxx:r-x"))
+    root.add_acl(Acl.from_str("user:yyyy:r-x"))
+
+    plan = r.plan_recursive(root)
+
+    assert plan.get(root) == {
+        Acl.from_str("user:xxxx:r-x"),
+        Acl.from_str("default:user:xxxx:r-x"),
+    }
+    assert len(plan.operations) == 1
+    assert plan.saved == 1
+
+
+def test_plan_recursive_drops_covered_acls():
+    root = Node("root")
+    root.add_acl(_recursive("default:user:xxxx:r-x"))
+    child = Node("child", root)
+    child.add_acl(_recursive("default:user:xxxx:r-x"))  # as pushed down
+    grandchild = Node("grandchild", child)
+    grandchild.add_acl(_recursive("default:user:xxxx:r-x"))
+    grandchild.add_acl(_recursive("user:yyyy:rwx"))
+
+    plan = r.plan_recursive(root)
+
+    assert list(plan.operations) == ["root", "root/child/grandchild"]
+    assert plan.get(grandchild) == {Acl.from_str("user:yyyy:rwx")}
+    assert plan.saved == 2
+
+
+def test_plan_recursive_keeps_overrides():
+    root = Node("root")
+    root.add_acl(_recursive("user:xxxx:r-x"))
+    child = Node("child", root)
+    child.add_acl(_recursive("user:xxxx:rwx"))
+    grandchild = Node("grandchild", child)
+    grandchild.add_acl(_recursive("user:xxxx:r-x"))
+
+    plan = r.plan_recursive(root)
+
+    assert list(plan.operations) == ["root", "root/child", "root/child/grandchild"]
+    assert plan.saved == 0
+
+
+def test_inherited_recursive():
+    root = Node("root")
+    root.add_acl(_recursive("user:xxxx:r-x"))
+    root.add_acl(_recursive("user:yyyy:r-x"))
+    child = Node("child", root)
+    child.add_acl(_recursive("user:xxxx:rwx"))
+    grandchild = Node("grandchild", child)
+
+    inherited = r.inherited_recursive(grandchild)
+
+    assert sorted(inherited.values()) == ["user:xxxx:rwx", "user:yyyy:r-x"]
+    assert r.inherited_recursive(root) == {}
+
+
+def test_recursive_coverage():
+    root = Node("root")
+    root.add_acl(_recursive("user:xxxx:r-x"))
+    a, b = Node("a", root), Node("b", root)
+    a1 = Node("a1", a)
+    coverage = r.RecursiveCoverage()
+
+    for node in (root, a, b):
+        acls = {Acl.from_str("user:xxxx:r-x")}
+        coverage.check(node, acls, r.inherited_recursive(node))
+    coverage.check(a1, {Acl.from_str("user:xxxx:r--")}, r.inherited_recursive(a1))
+
+    assert not coverage.is_covered(root)
+    assert not coverage.is_covered(a) and not coverage.is_covered(a1)
+    assert coverage.is_covered(b)
+    coverage.mark("root/b")
+    assert not coverage.is_covered(b)
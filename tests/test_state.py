@@ -0,0 +1,94 @@
+import pytest
+from azure.core.exceptions import ResourceExistsError
+
+from adls_acl import state as st
+from adls_acl import orchestrator as o
+from adls_acl.nodes import Acl, Node
+
+
+def _tree(permissions="r-x"):
+    root = Node("container")
+    root.add_acl(Acl.from_str(f"default:group:yyyy:{permissions}"))
+    dir_a = Node("a", root)
+    dir_a.add_acl(Acl.from_str("user:xxxx:rwx"))
+    _ = Node("b", dir_a)
+    _ = Node("c", root)
+
+    return root
+
+
+def test_subtree_hashes_stable():
+    assert st.subtree_hashes(_tree()) == st.subtree_hashes(_tree())
+
+
+def test_subtree_hashes_propagate():
+    hashes = st.subtree_hashes(_tree())
+    changed_tree = _tree()
+    changed_tree.children[0].children[0].add_acl(Acl.from_str("user:zzzz:r--"))
+    changed = st.subtree_hashes(changed_tree)
+
+    assert changed["container/a/b"] != hashes["container/a/b"]
+    assert changed["container/a"] != hashes["container/a"]
+    assert changed["container"] != hashes["container"]
+    assert changed["container/c"] == hashes["container/c"]
+
+
+def test_subtree_hashes_inherited_defaults():
+    hashes = st.subtree_hashes(_tree())
+    changed = st.subtree_hashes(_tree(permissions="rwx"))
+
+    assert changed["container/c"] != hashes["container/c"]
+
+
+def test_state_cache_roundtrip(tmp_path):
+    path = tmp_path / "state.json"
+    cache = st.StateCache(str(path))
+    cache.set("account", "container", "a/b", {"acl": "x", "subtree": "y"})
+    cache.save()
+
+    assert st.StateCache(str(path)).get("account", "container", "a/b") == {
+        "acl": "x",
+        "subtree": "y",
+    }
+
+
+@pytest.fixture
+def mock_dir_client(mocker):
+    sc = mocker.MagicMock()
+    mocker.patch("adls_acl.orchestrator.get_service_client", return_value=sc)
+    sc.create_file_system.side_effect = ResourceExistsError()
+    dc = mocker.MagicMock()
+    dc.create_directory.side_effect = ResourceExistsError()
+    dc.get_access_control.return_value = {"acl": "user::rwx"}
+    fc = sc.get_file_system_client.return_value
+    fc._get_root_directory_client.return_value = dc
+    fc.get_directory_client.return_value = dc
+
+    return dc
+
+
+def test_process_tree_skips_unchanged(tmp_path, mock_dir_client):
+    path = str(tmp_path / "state.json")
+    first = o.Orchestrator("test", state=st.StateCache(path))
+    first.process_tree(_tree())
+    calls = mock_dir_client.get_access_control.call_count
+
+    second = o.Orchestrator("test", state=st.StateCache(path), assume_no_drift=True)
+    second.process_tree(_tree())
+
+    assert calls == 4
+    assert mock_dir_client.get_access_control.call_count == calls
+    assert second.plan.actions[o.Action.skip] == ["container"]
+
+
+def test_process_tree_processes_changed(tmp_path, mock_dir_client):
+    path = str(tmp_path / "state.json")
+    o.Orchestrator("test", state=st.StateCache(path)).process_tree(_tree())
+
+    tree = _tree()
+    tree.children[1].add_acl(Acl.from_str("user:zzzz:r--"))
+    second = o.Orchestrator("test", state=st.StateCache(path), assume_no_drift=True)
+    second.process_tree(tree)
+
+    assert second.plan.actions[o.Action.skip] == ["container/a"]
+    assert second.plan.actions[o.Action.update] == ["container", "container/c"]
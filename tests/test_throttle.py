@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+from adls_acl import throttle as t
+
+
+def _throttle(adaptive=True, max_tps=None, in_flight=0):
+    throttle = t.Throttle(t.ThrottleOptions(adaptive=adaptive, max_tps=max_tps))
+    for _ in range(in_flight):
+        throttle.acquire()
+    return throttle
+
+
+def test_decrease_on_throttled():
+    throttle = _throttle(in_flight=8)
+
+    throttle.release(429, 0.1)
+    throttle.release(503, 0.1)  # within decrease_interval
+
+    assert throttle.limit == 4
+    assert throttle.in_flight == 6
+    assert throttle.throttled == 2
+
+
+def test_decrease_interval(mocker):
+    now = mocker.patch("adls_acl.throttle.time.monotonic", return_value=100.0)
+    throttle = _throttle(in_flight=8)
+    throttle.release(429, 0.1)
+    throttle.in_flight = 8
+
+    now.return_value = 101.0
+    throttle.release(429, 0.1)
+
+    assert throttle.limit == 2
+
+
+def test_decrease_floor():
+    throttle = _throttle(in_flight=1)
+
+    throttle.release(429, 0.1)
+
+    assert throttle.limit == 1
+
+
+def test_increase_when_limit_reached():
+    throttle = _throttle()
+    throttle.limit = 2
+    throttle.acquire()
+    throttle.release(200, 0.1)
+    assert throttle.limit == 2  # below the limit
+
+    throttle.acquire()
+    throttle.acquire()
+    throttle.release(200, 0.1)
+    assert throttle.limit == 2.5
+
+    throttle.release(200, 1.0)  # slower than latency_tolerance
+    assert throttle.limit == 2.5
+
+
+def test_not_adaptive():
+    throttle = _throttle(adaptive=False, in_flight=8)
+
+    throttle.release(429, 0.1)
+    throttle.release(None, 0.1)
+
+    assert throttle.limit == float("inf")
+    assert throttle.in_flight == 6
+    assert throttle.throttled == 1
+
+
+def test_acquire_waits_for_slot():
+    throttle = _throttle()
+    throttle.limit = 1
+    throttle.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        throttle.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.05)
+
+    throttle.release(200, 0.1)
+    assert acquired.wait(1)
+    thread.join()
+    assert throttle.in_flight == 1
+
+
+def test_max_tps():
+    throttle = _throttle(adaptive=False, max_tps=100)
+
+    start = time.monotonic()
+    for _ in range(6):
+        throttle.acquire()
+
+    assert time.monotonic() - start >= 0.05
+
+
+class FakeTransport:
+    def __init__(self, status=None, error=None):
+        self.status = status
+        self.error = error
+
+    def send(self, request, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return type("Response", (), {"status_code": self.status})()
+
+
+def test_transport_records_status():
+    throttle = _throttle(in_flight=3)
+    transport = t.ThrottledTransport(throttle, FakeTransport(status=429))
+
+    response = transport.send("request")
+
+    assert response.status_code == 429
+    assert throttle.in_flight == 3
+    assert throttle.limit == 2
+
+
+def test_transport_releases_on_error():
+    throttle = _throttle()
+    transport = t.ThrottledTransport(throttle, FakeTransport(error=OSError()))
+
+    with pytest.raises(OSError):
+        transport.send("request")
+
+    assert throttle.in_flight == 0
+    assert throttle.limit == float("inf")
+
+
+def test_transport_sdk_timeouts():
+    from azure.storage.filedatalake._shared import constants
+
+    transport = t.ThrottledTransport(_throttle())
+
+    config = transport._transport.connection_config
+    assert config.timeout == constants.CONNECTION_TIMEOUT
+    assert config.read_timeout == constants.READ_TIMEOUT
+    assert config.data_block_size == constants.DATA_BLOCK_SIZE
@@ -0,0 +1,81 @@
+import json
+import sys
+import types
+
+import pytest
+
+from adls_acl import tracing as t
+from adls_acl.executor import run_tree
+from adls_acl.nodes import Node
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = t.SpanRecorder(str(tmp_path / "spans.jsonl"))
+    t.set_tracer(recorder)
+    yield recorder
+    t.set_tracer(None)
+
+
+def _spans(recorder):
+    recorder.close()
+    with open(recorder.path, encoding="utf-8") as f:
+        return {span["name"]: span for span in map(json.loads, f)}
+
+
+def test_span_without_tracer():
+    assert t.span("a", path="x") is t.span("b")
+    with t.span("a"):
+        pass
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_span_recorder(recorder, concurrency):
+    root = Node("root")
+    Node("a", root)
+
+    def process_node(node):
+        with t.span(f"node {node.path}", path=node.path):
+            with t.span(f"write {node.path}"):
+                pass
+
+    with t.span("pass", container="root"):
+        run_tree(root, process_node, concurrency)
+    with pytest.raises(ValueError):
+        with t.span("failed"):
+            raise ValueError()
+
+    spans = _spans(recorder)
+    assert spans["pass"]["parent"] is None
+    assert spans["pass"]["container"] == "root"
+    assert spans["node root/a"]["parent"] == spans["pass"]["id"]
+    assert spans["node root/a"]["path"] == "root/a"
+    assert spans["write root/a"]["parent"] == spans["node root/a"]["id"]
+    assert spans["pass"]["duration"] >= spans["node root/a"]["duration"]
+    assert spans["failed"]["error"] == "ValueError"
+    assert "error" not in spans["pass"]
+
+
+def test_opentelemetry_tracer(mocker):
+    trace = mocker.MagicMock()
+    module = types.ModuleType("opentelemetry")
+    module.trace = trace
+    mocker.patch.dict(sys.modules, {"opentelemetry": module})
+
+    t.set_tracer(t.OpenTelemetryTracer())
+    try:
+        t.span("process_node", path="root/a")
+    finally:
+        t.set_tracer(None)
+
+    trace.get_tracer.assert_called_once_with("adls_acl")
+    trace.get_tracer.return_value.start_as_current_span.assert_called_once_with(
+        "process_node", attributes={"path": "root/a"}
+    )
+
+
+def test_opentelemetry_tracer_not_installed(mocker):
+    mocker.patch.dict(sys.modules, {"opentelemetry": None})
+
+    with pytest.raises(ImportError):
+        t.OpenTelemetryTracer()
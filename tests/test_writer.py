@@ -0,0 +1,118 @@
+import io
+
+import yaml
+
+from adls_acl.nodes import Acl
+from adls_acl.writer import dump_account
+
+
+def _acls(*acls_str):
+    return set([Acl.from_str(x) for x in acls_str])
+
+
+def test_dump_account():
+    directories = [
+        ("container", "", _acls("user::rwx")),
+        ("container", "a", _acls("user:xxxx:r-x", "default:user:xxxx:r-x")),
+        ("container", "a/b", set()),
+        ("container", "a/b/c", _acls("group:yyyy:rwx")),
+        ("container", "d", set()),
+        ("other", "", set()),
+        ("other", "e", _acls("user:xxxx:r-x")),
+    ]
+    out = io.StringIO()
+    dump_account(out, "account", iter(directories))
+
+    assert yaml.safe_load(out.getvalue()) == {
+        "account": "account",
+        "containers": [
+            {
+                "name": "container",
+                "acls": [{"oid": "", "type": "user", "acl": "rwx"}],
+                "folders": [
+                    {
+                        "name": "a",
+                        "acls": [
+                            {"oid": "xxxx", "type": "user", "acl": "r-x"},
+                            {
+                                "oid": "xxxx",
+                                "type": "user",
+                                "acl": "r-x",
+                                "scope": "default",
+                            },
+                        ],
+                        "folders": [
+                            {
+                                "name": "b",
+                                "acls": [],
+                                "folders": [
+                                    {
+                                        "name": "c",
+                                        "acls": [
+                                            {
+                                                "oid": "yyyy",
+                                                "type": "group",
+                                                "acl": "rwx",
+                                            }
+                                        ],
+                                    }
+                                ],
+                            }
+                        ],
+                    },
+                    {"name": "d", "acls": []},
+                ],
+            },
+            {
+                "name": "other",
+                "acls": [],
+                "folders": [
+                    {
+                        "name": "e",
+                        "acls": [{"oid": "xxxx", "type": "user", "acl": "r-x"}],
+                    }
+                ],
+            },
+        ],
+    }
+
+
+def test_dump_account_format():
+    """Same output as dumping the whole account at once"""
+    directories = [
+        ("container", "", _acls("user::rwx")),
+        ("container", "a", _acls("user:xxxx:r-x")),
+        ("container", "a/b", set()),
+        ("container", "c", set()),
+    ]
+    data = {
+        "account": "account",
+        "containers": [
+            {
+                "name": "container",
+                "acls": [{"oid": "", "type": "user", "acl": "rwx"}],
+                "folders": [
+                    {
+                        "name": "a",
+                        "acls": [{"oid": "xxxx", "type": "user", "acl": "r-x"}],
+                        "folders": [{"name": "b", "acls": []}],
+                    },
+                    {"name": "c", "acls": []},
+                ],
+            }
+        ],
+    }
+
+    out = io.StringIO()
+    dump_account(out, "account", directories)
+
+    assert out.getvalue() == yaml.dump(data, sort_keys=False, indent=2)
+
+
+def test_dump_account_empty():
+    out = io.StringIO()
+    dump_account(out, "account", [])
+
+    assert out.getvalue() == yaml.dump(
+        {"account": "account", "containers": []}, sort_keys=False, indent=2
+    )